@@ -0,0 +1,98 @@
+"""Bounded, non-blocking execution of agent requests for the FastAPI backend"""
+import asyncio
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+
+class AgentBusyError(Exception):
+    """Raised when every worker slot is taken and the wait queue is full."""
+
+
+class AgentTimeoutError(Exception):
+    """Raised when a request does not finish within the configured timeout."""
+
+
+class AgentRunner:
+    """Runs agent calls on the event loop with a concurrency limit, a bounded wait queue and a timeout.
+
+    At most `max_concurrency` requests execute at once, at most `max_queue` more wait for
+    a slot, and anything beyond that is rejected immediately with AgentBusyError so the
+    endpoint can answer 429 instead of piling up work.
+    """
+    def __init__(self, max_concurrency: int = None, max_queue: int = None, timeout: float = None):
+        self.max_concurrency = max_concurrency or int(os.getenv("AGENT_MAX_CONCURRENCY", "8"))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("AGENT_MAX_QUEUE", "32"))
+        self.timeout = timeout or float(os.getenv("AGENT_REQUEST_TIMEOUT", "120"))
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._running = 0
+        self._waiting = 0
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "running": self._running,
+            "waiting": self._waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+    @property
+    def saturated(self) -> bool:
+        return self._semaphore.locked() and self._waiting >= self.max_queue
+
+    async def run(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Await `func(*args, **kwargs)` once a slot is free, subject to the timeout."""
+        if self.saturated:
+            raise AgentBusyError("Too many requests in progress, try again later.")
+
+        try:
+            return await asyncio.wait_for(self._run_in_slot(func, *args, **kwargs), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise AgentTimeoutError(f"Request did not complete within {self.timeout:g} seconds.")
+
+    async def stream(self, func: Callable[..., AsyncIterator[Any]], *args, **kwargs) -> AsyncIterator[Any]:
+        """Iterate `func(*args, **kwargs)` once a slot is free; the timeout covers the whole stream."""
+        if self.saturated:
+            raise AgentBusyError("Too many requests in progress, try again later.")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        try:
+            await asyncio.wait_for(self._acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise AgentTimeoutError(f"Request did not start within {self.timeout:g} seconds.")
+
+        self._running += 1
+        iterator = func(*args, **kwargs)
+        try:
+            while True:
+                # timeout_at rather than wait_for: every step runs in this task, so context
+                # variables the stream sets (e.g. its telemetry trace) carry across items
+                try:
+                    async with asyncio.timeout_at(deadline):
+                        item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                except TimeoutError:
+                    raise AgentTimeoutError(f"Request did not complete within {self.timeout:g} seconds.")
+                yield item
+        finally:
+            await iterator.aclose()
+            self._running -= 1
+            self._semaphore.release()
+
+    async def _acquire(self):
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+    async def _run_in_slot(self, func, *args, **kwargs):
+        await self._acquire()
+        self._running += 1
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            self._running -= 1
+            self._semaphore.release()
@@ -1,41 +1,68 @@
 """Simple Question Fetcher and Display App"""
 import gradio as gr
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk
+from context_budget import message_text
 from my_agent import build_agent
+from telemetry import get_telemetry
 import os
 
-langchain_formatted_history = []
-
 class BasicAgent:
     """A langgraph agent."""
     def __init__(self):
         print("BasicAgent initialized.")
         self.graph = build_agent()
 
-    def __call__(self, conversation_messages: list) -> str:
-        print(f"Agent received {len(conversation_messages)} messages.")
-        if conversation_messages:
-            pass
-
-        response_data = self.graph.invoke({"messages": conversation_messages})
-        
-        for m in response_data["messages"]:
-            m.pretty_print()
-            
-        answer = response_data['messages'][-1].content
-        return answer
-
-def agent_response(current_user_message: str, _):
-    agent = BasicAgent()
-    langchain_formatted_history.append(HumanMessage(content=current_user_message))
-    response_content = agent(langchain_formatted_history)
-    langchain_formatted_history.append(AIMessage(content=response_content))
-    yield response_content
-    # yield "Hello"
+    def stream(self, conversation_messages: list):
+        """Yield the reply as it grows: LLM tokens, a note while tools run, then the final answer."""
+        if telemetry.debug:
+            print(f"Agent received {len(conversation_messages)} messages (streaming).")
+        partial = ""
+        with telemetry.trace("chat_stream"):
+            for mode, payload in self.graph.stream(
+                {"messages": conversation_messages}, stream_mode=["messages", "updates"]
+            ):
+                if mode == "messages":
+                    chunk, metadata = payload
+                    if (
+                        metadata.get("langgraph_node") == "assistant"
+                        and isinstance(chunk, AIMessageChunk)
+                        and isinstance(chunk.content, str)
+                        and chunk.content
+                    ):
+                        partial += chunk.content
+                        yield partial
+                    continue
+
+                for update in payload.values():
+                    for m in (update or {}).get("messages", []):
+                        if not isinstance(m, AIMessage):
+                            continue
+                        if m.tool_calls:
+                            partial = ""
+                            yield f"_Running {', '.join(call['name'] for call in m.tool_calls)}..._"
+                        else:
+                            # Gemini may return the answer as a list of content parts
+                            yield message_text(m)
+
+# Built once per process and shared by every session; the compiled graph is stateless
+telemetry = get_telemetry()
+agent = BasicAgent()
+
+def agent_response(current_user_message: str, _, session_history: list):
+    # session_history is this browser session's gr.State, so users never see each other's turns
+    session_history = session_history + [HumanMessage(content=current_user_message)]
+    response_content = ""
+    for response_content in agent.stream(session_history):
+        yield response_content, session_history
+    session_history = session_history + [AIMessage(content=response_content)]
+    yield response_content, session_history
 
 with gr.Blocks(css_paths="./style.css") as demo:
+    session_history = gr.State([])
     gr.ChatInterface(
         agent_response,
+        additional_inputs=[session_history],
+        additional_outputs=[session_history],
         chatbot=gr.Chatbot(height=600, type='messages', elem_id="chatbot-container"),
         textbox=gr.Textbox(placeholder="Ask a question...", container=False, scale=7, elem_id="textbox-container"),
         title="Rae",
@@ -46,6 +73,12 @@ with gr.Blocks(css_paths="./style.css") as demo:
         # additional_inputs=[gr.UploadButton(label="Upload File", file_types=["any"])],
     )
 
+# Bound how many agent runs execute at once and how many requests may wait
+demo.queue(
+    default_concurrency_limit=int(os.getenv("GRADIO_CONCURRENCY_LIMIT", "4")),
+    max_size=int(os.getenv("GRADIO_QUEUE_SIZE", "32")),
+)
+
 if __name__ == "__main__":
     print("\n" + "-"*30 + "Rae" + "-"*30)
     server_name = os.getenv("GRADIO_SERVER_NAME", "0.0.0.0")
@@ -1,14 +1,42 @@
 """FastAPI Backend for Rae Chatbot"""
 import os
+
+if __name__ == "__main__":
+    # Hand over before any server state is built here: the server (or each worker) imports
+    # this module as `backend` and builds it there, after the worker environment is set
+    from server import run_server
+    print("\n" + "-"*30 + "Rae Backend" + "-"*30)
+    run_server()
+    raise SystemExit
+
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any
-from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
-from my_agent import build_agent
-import uvicorn
+import asyncio
+import json
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import List, Dict, AsyncIterator, Optional, Tuple
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+from my_agent import build_agent, preload_tool_modules, tool_cache
+from llm_router import ProviderUnavailableError
+from agent_runner import AgentRunner, AgentBusyError, AgentTimeoutError
+from conversation_store import build_checkpointer
+from semantic_cache import SemanticCache
+from context_budget import message_text
+from telemetry import get_telemetry
+from warmup import Warmup
 
-app = FastAPI(title="Rae Chat API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Serve liveness checks right away; the agent and anything else configured warm up behind them
+    warmup.start()
+    yield
+
+app = FastAPI(title="Rae Chat API", version="1.0.0", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -26,31 +54,188 @@ class ChatMessage(BaseModel):
 
 class ChatRequest(BaseModel):
     message: str
+    # Send conversation_id to continue a server-side conversation; conversation_history
+    # is only used to seed a conversation the server does not know yet.
+    conversation_id: Optional[str] = None
     conversation_history: List[ChatMessage] = []
+    # Skip the semantic answer cache for this request
+    bypass_cache: bool = False
 
 class ChatResponse(BaseModel):
     response: str
     conversation_id: str = None
+    # Prompt tokens before/after context budgeting, summed over this turn's LLM calls
+    context: Optional[Dict[str, int]] = None
+    cached: bool = False
 
 class BasicAgent:
-    """A langgraph agent."""
-    def __init__(self):
-        print("BasicAgent initialized.")
-        self.graph = build_agent()
+    """A langgraph agent whose graph is built on first use, or earlier by the warm-up."""
+    def __init__(self, checkpointer=None):
+        self.checkpointer = checkpointer
+        self._graph = None
+        self._graph_lock = threading.Lock()
+
+    @property
+    def graph(self):
+        if self._graph is None:
+            with self._graph_lock:
+                if self._graph is None:
+                    self._graph = build_agent(checkpointer=self.checkpointer)
+                    print("BasicAgent initialized.")
+        return self._graph
+
+    @graph.setter
+    def graph(self, graph):
+        self._graph = graph
+
+    async def aget_graph(self):
+        """The graph, built on a worker thread if the warm-up has not built it yet."""
+        if self._graph is None:
+            return await asyncio.to_thread(lambda: self.graph)
+        return self._graph
 
     def __call__(self, conversation_messages: list) -> str:
-        print(f"Agent received {len(conversation_messages)} messages.")
-        
-        response_data = self.graph.invoke({"messages": conversation_messages})
-        
-        for m in response_data["messages"]:
-            m.pretty_print()
-            
-        answer = response_data['messages'][-1].content
+        if telemetry.debug:
+            print(f"Agent received {len(conversation_messages)} messages.")
+
+        with telemetry.trace("chat"):
+            response_data = self.graph.invoke({"messages": conversation_messages})
+
+        telemetry.debug_messages(response_data["messages"])
+
+        answer = message_text(response_data['messages'][-1])
         return answer
 
+    async def ainvoke(self, conversation_messages: list, conversation_id: str = None) -> Tuple[str, dict]:
+        """Async variant of __call__ that does not block the event loop.
+
+        With a conversation_id, `conversation_messages` holds only the new messages and
+        are appended to the stored conversation. Returns the answer and the context report.
+        """
+        if telemetry.debug:
+            print(f"Agent received {len(conversation_messages)} messages.")
+
+        graph = await self.aget_graph()
+        with telemetry.trace("chat"):
+            response_data = await graph.ainvoke(
+                {"messages": conversation_messages}, config=thread_config(conversation_id)
+            )
+
+        turn = current_turn(response_data["messages"])
+        telemetry.debug_messages(turn)
+
+        context = context_usage(turn)
+        if telemetry.debug:
+            print(f"Context budget: {context}")
+        answer = message_text(response_data['messages'][-1])
+        return answer, context
+
+    async def astream(self, conversation_messages: list, conversation_id: str = None) -> AsyncIterator[dict]:
+        """Stream the run as events: LLM tokens, tool calls, live tool output, tool results and the final answer."""
+        if telemetry.debug:
+            print(f"Agent received {len(conversation_messages)} messages (streaming).")
+        graph = await self.aget_graph()
+        with telemetry.trace("chat_stream"):
+            answer = ""
+            turn = []
+
+            async for mode, payload in graph.astream(
+                {"messages": conversation_messages},
+                config=thread_config(conversation_id),
+                stream_mode=["messages", "updates", "custom"],
+            ):
+                if mode == "custom":
+                    if isinstance(payload, dict) and payload.get("type") == "tool_output":
+                        yield {"event": "tool_output", "data": {"tool": payload["tool"], **payload["event"]}}
+                    continue
+                if mode == "messages":
+                    chunk, metadata = payload
+                    if (
+                        metadata.get("langgraph_node") == "assistant"
+                        and isinstance(chunk, AIMessageChunk)
+                        and isinstance(chunk.content, str)
+                        and chunk.content
+                    ):
+                        yield {"event": "token", "data": {"content": chunk.content}}
+                    continue
+
+                for node, update in payload.items():
+                    for m in (update or {}).get("messages", []):
+                        turn.append(m)
+                        if isinstance(m, AIMessage):
+                            for call in m.tool_calls:
+                                yield {"event": "tool_call", "data": {"id": call["id"], "name": call["name"], "args": call["args"]}}
+                            if not m.tool_calls:
+                                answer = message_text(m)
+                        elif isinstance(m, ToolMessage):
+                            yield {"event": "tool_result", "data": {
+                                "id": m.tool_call_id,
+                                "name": m.name,
+                                "status": m.status,
+                                "chars": len(str(m.content)),
+                            }}
+
+        yield {"event": "done", "data": {
+            "response": answer,
+            "conversation_id": conversation_id,
+            "context": context_usage(turn),
+        }}
+
+    async def record_turn(self, conversation_id: str, messages: List[BaseMessage]) -> None:
+        """Append messages to a stored conversation without running the graph."""
+        if self.checkpointer is not None:
+            graph = await self.aget_graph()
+            await graph.aupdate_state(thread_config(conversation_id), {"messages": messages}, as_node="assistant")
+
+    async def has_conversation(self, conversation_id: str) -> bool:
+        if self.checkpointer is None:
+            return False
+        return await self.checkpointer.aget_tuple(thread_config(conversation_id)) is not None
+
+def thread_config(conversation_id: Optional[str]) -> Optional[dict]:
+    if conversation_id is None:
+        return None
+    return {"configurable": {"thread_id": conversation_id}}
+
+def current_turn(messages: List[BaseMessage]) -> List[BaseMessage]:
+    """Messages from the latest user message onwards."""
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return messages[i:]
+    return messages
+
+def context_usage(messages: List[BaseMessage]) -> dict:
+    """Sum the context budget reports attached to the AI messages of one turn."""
+    usage = {"llm_calls": 0, "original_tokens": 0, "final_tokens": 0, "saved_tokens": 0}
+    for m in messages:
+        report = m.response_metadata.get("context_budget") if isinstance(m, AIMessage) else None
+        if report:
+            usage["llm_calls"] += 1
+            for key in ("original_tokens", "final_tokens", "saved_tokens"):
+                usage[key] += report[key]
+    return usage
+
 # Global agent instance
-agent = BasicAgent()
+telemetry = get_telemetry()
+checkpointer = build_checkpointer()
+agent = BasicAgent(checkpointer=checkpointer)
+agent_runner = AgentRunner()
+semantic_cache = SemanticCache.from_env()
+
+def _warm_embeddings():
+    from retrieval import get_vector_store_manager
+    get_vector_store_manager().get_embeddings()
+
+def _warm_index():
+    from retrieval import prewarm
+    prewarm()
+
+warmup = Warmup.from_env({
+    "agent": lambda: agent.graph,
+    "tools": preload_tool_modules,
+    "embeddings": _warm_embeddings,
+    "index": _warm_index,
+})
 
 def convert_to_langchain_messages(history: List[ChatMessage]) -> List[BaseMessage]:
     """Convert chat history to LangChain message format"""
@@ -62,6 +247,44 @@ def convert_to_langchain_messages(history: List[ChatMessage]) -> List[BaseMessag
             messages.append(AIMessage(content=msg.content))
     return messages
 
+async def prepare_conversation(request: ChatRequest) -> Tuple[str, List[BaseMessage], bool]:
+    """Resolve the conversation id and the messages to append for this turn.
+
+    Also returns whether this is the first turn, i.e. the question has no earlier context.
+    """
+    conversation_id = request.conversation_id or str(uuid.uuid4())
+    new_message = HumanMessage(content=request.message)
+    if await agent.has_conversation(conversation_id):
+        return conversation_id, [new_message], False
+
+    # Unknown or expired conversation: seed it from whatever history the client sent
+    langchain_history = convert_to_langchain_messages(request.conversation_history)
+    langchain_history.append(new_message)
+    return conversation_id, langchain_history, len(langchain_history) == 1
+
+async def cached_answer(request: ChatRequest, first_turn: bool):
+    """Look the question up in the semantic cache.
+
+    Returns the question vector (None when the cache does not apply) and the cached answer, if any.
+    Follow-up questions depend on earlier turns, so only first turns are cached.
+    """
+    if semantic_cache is None or request.bypass_cache or not first_turn:
+        return None, None
+    try:
+        vector = await asyncio.to_thread(semantic_cache.embed, request.message)
+        return vector, await asyncio.to_thread(semantic_cache.lookup, request.message, vector)
+    except Exception as e:
+        # The cache is an optimization; answer without it
+        print(f"Semantic cache lookup failed, treating as a miss: {e}")
+        return None, None
+
+async def cache_answer(request: ChatRequest, answer: str, seconds: float, vector) -> None:
+    """Store a freshly generated answer in the semantic cache; failures are logged, not raised."""
+    try:
+        await asyncio.to_thread(semantic_cache.store, request.message, answer, seconds, vector)
+    except Exception as e:
+        print(f"Semantic cache store failed: {e}")
+
 @app.get("/")
 async def root():
     return {"message": "Rae Chat API is running!"}
@@ -69,23 +292,121 @@ async def root():
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     try:
-        langchain_history = convert_to_langchain_messages(request.conversation_history)
-        langchain_history.append(HumanMessage(content=request.message))
-        response_content = agent(langchain_history)
+        conversation_id, new_messages, first_turn = await prepare_conversation(request)
+        vector, answer = await cached_answer(request, first_turn)
+        if answer is not None:
+            await agent.record_turn(conversation_id, new_messages + [AIMessage(content=answer)])
+            return ChatResponse(response=answer, conversation_id=conversation_id, cached=True)
+
+        start = time.perf_counter()
+        response_content, context = await agent_runner.run(agent.ainvoke, new_messages, conversation_id)
+        if vector is not None and isinstance(response_content, str) and response_content:
+            await cache_answer(request, response_content, time.perf_counter() - start, vector)
 
-        return ChatResponse(response=response_content)
+        return ChatResponse(response=response_content, conversation_id=conversation_id, context=context)
         # return ChatResponse(response="Henlo")
         
+    except AgentBusyError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except AgentTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except ProviderUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         print(f"Error in chat endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+def format_sse(event: str, data: dict) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    if agent_runner.saturated:
+        raise HTTPException(status_code=429, detail="Too many requests in progress, try again later.", headers={"Retry-After": "1"})
+
+    async def event_stream():
+        conversation_id = None
+        try:
+            conversation_id, new_messages, first_turn = await prepare_conversation(request)
+            vector, answer = await cached_answer(request, first_turn)
+            if answer is not None:
+                await agent.record_turn(conversation_id, new_messages + [AIMessage(content=answer)])
+                yield format_sse("token", {"content": answer})
+                yield format_sse("done", {"response": answer, "conversation_id": conversation_id, "cached": True})
+                return
+
+            start = time.perf_counter()
+            async for item in agent_runner.stream(agent.astream, new_messages, conversation_id):
+                if item["event"] == "done" and vector is not None and item["data"]["response"]:
+                    await cache_answer(request, item["data"]["response"], time.perf_counter() - start, vector)
+                yield format_sse(item["event"], item["data"])
+            return
+        except AgentBusyError as e:
+            error = {"status": 429, "detail": str(e)}
+        except AgentTimeoutError as e:
+            error = {"status": 504, "detail": str(e)}
+        except ProviderUnavailableError as e:
+            error = {"status": 503, "detail": str(e)}
+        except Exception as e:
+            print(f"Error in chat stream endpoint: {str(e)}")
+            error = {"status": 500, "detail": f"Internal server error: {str(e)}"}
+
+        # If the server kept the conversation, the client continues it; otherwise it resends its history
+        try:
+            if conversation_id is not None and await agent.has_conversation(conversation_id):
+                error["conversation_id"] = conversation_id
+        except Exception as e:
+            print(f"Could not look up conversation {conversation_id}: {e}")
+        yield format_sse("error", error)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.delete("/conversations/{conversation_id}")
+async def delete_conversation(conversation_id: str):
+    await checkpointer.adelete_thread(conversation_id)
+    return {"deleted": conversation_id}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "semantic_cache": semantic_cache.stats if semantic_cache is not None else None,
+        "tool_cache": tool_cache.stats if tool_cache is not None else None,
+        "conversations": checkpointer.stats,
+    }
+
+@app.delete("/cache")
+async def invalidate_cache(question: Optional[str] = None):
+    """Drop all cached answers, or only those matching `question`."""
+    if semantic_cache is None:
+        return {"invalidated": 0}
+    invalidated = await asyncio.to_thread(semantic_cache.invalidate, question)
+    return {"invalidated": invalidated}
+
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    """Liveness: the process is up and serving, whether or not the warm-up has finished."""
+    return {"status": "healthy", "ready": warmup.ready, "worker": os.getpid()}
 
-if __name__ == "__main__":
-    print("\n" + "-"*30 + "Rae Backend" + "-"*30)
-    server_host = os.getenv("BACKEND_HOST", "0.0.0.0")
-    server_port = int(os.getenv("BACKEND_PORT", "8000"))
-    uvicorn.run(app, host=server_host, port=server_port, log_level="info") 
\ No newline at end of file
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness: 503 until every warm-up step has finished, then 200 ("degraded" if one failed)."""
+    body = {"status": ("degraded" if warmup.failed else "ready") if warmup.ready else "starting",
+            "warmup": warmup.status, "worker": os.getpid()}
+    if not warmup.ready:
+        return JSONResponse(body, status_code=503)
+    return body
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Span latency, tool output size and token metrics in the Prometheus text format."""
+    return PlainTextResponse(telemetry.metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/summary")
+async def metrics_summary():
+    """The same metrics as JSON, with p50/p95/p99 per series."""
+    return telemetry.metrics.summary()
@@ -0,0 +1,78 @@
+"""Latency of resubmitting the same C (and, if a JDK is installed, Java) program.
+
+Compares compiling on every run with the build cache, and for Java also a cold `java`
+per run with the long-lived JVM runner.
+
+Usage (from the backend directory):
+    python benchmarks/bench_build_cache.py --runs 10
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from build_cache import BuildCache
+from code_interpreter import CodeInterpreter
+
+C_PROGRAM = """
+#include <stdio.h>
+int main(void) { long s = 0; for (int i = 0; i < 1000000; i++) s += i; printf("%ld\\n", s); return 0; }
+"""
+
+JAVA_PROGRAM = """
+public class Main {
+    public static void main(String[] args) {
+        long s = 0; for (int i = 0; i < 1000000; i++) s += i; System.out.println(s);
+    }
+}
+"""
+
+
+def time_runs(interpreter: CodeInterpreter, code: str, language: str, runs: int, clear: bool) -> list:
+    timings = []
+    for _ in range(runs):
+        if clear:
+            interpreter.build_cache.clear()
+        start = time.perf_counter()
+        result = interpreter.execute_code(code, language)
+        assert result["status"] == "success", result["stderr"]
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(label: str, timings: list) -> None:
+    print(f"{label:<34} p50 {statistics.median(timings) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    cache = BuildCache(os.path.join(root, "builds"))
+    interpreter = CodeInterpreter(working_directory=root, build_cache=cache, use_java_runner=False)
+
+    report("c: compile every run", time_runs(interpreter, C_PROGRAM, "c", args.runs, clear=True))
+    report("c: build cache", time_runs(interpreter, C_PROGRAM, "c", args.runs, clear=False))
+
+    if shutil.which("javac") and shutil.which("java"):
+        report("java: compile every run", time_runs(interpreter, JAVA_PROGRAM, "java", args.runs, clear=True))
+        report("java: build cache, cold JVM", time_runs(interpreter, JAVA_PROGRAM, "java", args.runs, clear=False))
+        interpreter.use_java_runner = True
+        interpreter.execute_code(JAVA_PROGRAM, "java")  # start the JVM
+        report("java: build cache, warm JVM", time_runs(interpreter, JAVA_PROGRAM, "java", args.runs, clear=False))
+    else:
+        print("javac/java not found; skipping Java")
+
+    print(f"cache: {cache.stats}")
+    shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
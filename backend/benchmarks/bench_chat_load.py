@@ -0,0 +1,68 @@
+"""Load test for /chat with a stub LLM: throughput vs concurrent clients.
+
+Usage (from the backend directory):
+    python benchmarks/bench_chat_load.py --requests 64 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+# Every request must reach the agent; the numbered prompts could also look alike to the answer cache
+os.environ["SEMANTIC_CACHE_ENABLED"] = "False"
+
+import httpx
+import backend
+from agent_runner import AgentRunner
+from my_agent import build_agent
+from benchmarks.fakes import FakeChatModel
+
+
+async def run_level(clients: int, total: int) -> dict:
+    transport = httpx.ASGITransport(app=backend.app)
+    statuses = []
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async def client_loop(client):
+        while not queue.empty():
+            i = queue.get_nowait()
+            response = await client.post("/chat", json={"message": f"question {i}"})
+            statuses.append(response.status_code)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "clients": clients,
+        "elapsed": elapsed,
+        "ok": statuses.count(200),
+        "rejected": statuses.count(429),
+        "rps": statuses.count(200) / elapsed,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub LLM latency in seconds")
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    parser.add_argument("--max-queue", type=int, default=64)
+    args = parser.parse_args()
+
+    backend.agent.graph = build_agent(llm=FakeChatModel(latency=args.latency))
+    for clients in (1, 2, 4, 8, 16, 32):
+        backend.agent_runner = AgentRunner(args.max_concurrency, args.max_queue, timeout=60)
+        r = await run_level(clients, args.requests)
+        print(f"clients={r['clients']:>3}  ok={r['ok']:>4}  429={r['rejected']:>3}  "
+              f"elapsed={r['elapsed']:.2f}s  throughput={r['rps']:.1f} req/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
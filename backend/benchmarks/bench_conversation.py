@@ -0,0 +1,71 @@
+"""Request size and latency per turn: full-history uploads vs server-side conversations.
+
+Usage (from the backend directory):
+    python benchmarks/bench_conversation.py --turns 10 100 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+os.environ.setdefault("CONVERSATION_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench_conversations.db"))
+
+import httpx
+import backend
+from my_agent import build_agent
+from benchmarks.fakes import FakeChatModel
+
+
+def history(turns: int) -> list:
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"Question number {i} about something moderately long."})
+        messages.append({"role": "assistant", "content": f"Answer number {i}, with a couple of sentences of detail."})
+    return messages
+
+
+async def timed_post(client, payload: dict) -> tuple:
+    body = json.dumps(payload)
+    start = time.perf_counter()
+    response = await client.post("/chat", content=body, headers={"Content-Type": "application/json"})
+    response.raise_for_status()
+    return len(body), time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    backend.agent.graph = build_agent(llm=FakeChatModel(), checkpointer=backend.checkpointer)
+    transport = httpx.ASGITransport(app=backend.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for turns in args.turns:
+            past = history(turns)
+
+            # Stateless: the client uploads the whole transcript every turn
+            full = [await timed_post(client, {"message": "next?", "conversation_history": past})
+                    for _ in range(args.runs)]
+
+            # Server-side: seed once, then send only the new message
+            conversation_id = str(uuid.uuid4())
+            await timed_post(client, {"message": "seed", "conversation_id": conversation_id, "conversation_history": past})
+            incremental = [await timed_post(client, {"message": "next?", "conversation_id": conversation_id})
+                           for _ in range(args.runs)]
+
+            for name, results in (("full history", full), ("conversation_id", incremental)):
+                size = statistics.median(r[0] for r in results)
+                latency = statistics.median(r[1] for r in results)
+                print(f"turns={turns:>5}  {name:<16} request={size / 1024:8.1f} KiB  latency p50={latency * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
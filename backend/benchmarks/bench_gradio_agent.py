@@ -0,0 +1,52 @@
+"""Per-message cost of the Gradio handler: building the agent per message vs one shared graph.
+
+The old handler ran build_agent() (LLM client, tool binding, system prompt read, graph
+compile) on every message; the new one reuses a graph compiled at startup.
+
+Usage (from the backend directory):
+    python benchmarks/bench_gradio_agent.py --messages 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+
+from langchain_core.messages import HumanMessage
+from my_agent import build_agent, build_llm
+from benchmarks.fakes import FakeChatModel
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20)
+    args = parser.parse_args()
+    messages = [HumanMessage(content="What is the capital of France?")]
+
+    # Construction cost with the real provider client (no request is sent)
+    build_times = []
+    for _ in range(args.messages):
+        start = time.perf_counter()
+        build_agent(llm=build_llm("google"))
+        build_times.append(time.perf_counter() - start)
+
+    shared = build_agent(llm=FakeChatModel())
+    run_times = []
+    for _ in range(args.messages):
+        start = time.perf_counter()
+        shared.invoke({"messages": messages})
+        run_times.append(time.perf_counter() - start)
+
+    build = statistics.median(build_times)
+    run = statistics.median(run_times)
+    print(f"build_agent() per call, p50:           {build * 1000:8.1f} ms")
+    print(f"graph run with stub LLM, p50:          {run * 1000:8.1f} ms")
+    print(f"old handler overhead per message:      {(build + run) * 1000:8.1f} ms")
+    print(f"shared graph overhead per message:     {run * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
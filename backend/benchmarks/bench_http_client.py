@@ -0,0 +1,117 @@
+"""Fetching large pages from a local stub server: WebBaseLoader per call vs the shared HTTP client.
+
+The stub serves gzip-compressed ~2 MB HTML pages with ETags (answering If-None-Match
+with 304) and a Tavily-shaped /search endpoint, and counts the connections it accepts
+and the bytes it sends. No network access is needed.
+
+Usage (from the backend directory):
+    python benchmarks/bench_http_client.py --pages 20
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_client import HttpClient
+
+PARAGRAPH = "<p>Figaro fetches pages for the agent. " + "The quick brown fox jumps over the lazy dog. " * 20 + "</p>\n"
+PAGE = ("<html><head><title>Stub page</title><script>var x = 1;</script></head><body>"
+        + PARAGRAPH * 2200 + "</body></html>").encode("utf-8")
+PAGE_GZ = gzip.compress(PAGE)
+ETAG = '"' + hashlib.sha1(PAGE).hexdigest() + '"'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    counters = {"connections": 0, "bytes_sent": 0, "not_modified": 0}
+
+    def setup(self):
+        super().setup()
+        self.counters["connections"] += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, headers: dict) -> None:
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            # Send in pieces so a client that stops reading early really saves the transfer
+            for start in range(0, len(body), 64 * 1024):
+                self.wfile.write(body[start:start + 64 * 1024])
+                self.counters["bytes_sent"] += min(64 * 1024, len(body) - start)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def do_GET(self):
+        if self.headers.get("If-None-Match") == ETAG:
+            self.counters["not_modified"] += 1
+            self._send(304, b"", {"ETag": ETAG})
+        elif "gzip" in self.headers.get("Accept-Encoding", ""):
+            self._send(200, PAGE_GZ, {"Content-Type": "text/html; charset=utf-8", "Content-Encoding": "gzip", "ETag": ETAG})
+        else:
+            self._send(200, PAGE, {"Content-Type": "text/html; charset=utf-8", "ETag": ETAG})
+
+    def do_POST(self):
+        query = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["query"]
+        results = [{"title": f"Result {i}", "url": f"http://example.com/{i}", "content": f"About {query}"} for i in range(3)]
+        self._send(200, json.dumps({"results": results}).encode(), {"Content-Type": "application/json"})
+
+
+def measure(label: str, fetch, urls: list) -> None:
+    counters = StubHandler.counters
+    before = dict(counters)
+    start = time.perf_counter()
+    texts = fetch(urls)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<36} {elapsed:7.2f} s  connections {counters['connections'] - before['connections']:3d}  "
+          f"sent {(counters['bytes_sent'] - before['bytes_sent']) / 2**20:7.2f} MiB  "
+          f"304s {counters['not_modified'] - before['not_modified']:3d}  chars/page {sum(map(len, texts)) // len(texts)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--max-chars", type=int, default=20000)
+    args = parser.parse_args()
+
+    ThreadingHTTPServer.request_queue_size = 128  # the default of 5 drops concurrent connects
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base}/page/{i}" for i in range(args.pages)]
+
+    from langchain_community.document_loaders import WebBaseLoader
+    measure("WebBaseLoader per call", lambda us: [WebBaseLoader(u).load()[0].page_content for u in us], urls)
+
+    client = HttpClient(max_chars=args.max_chars)
+    measure("shared client, sequential", lambda us: [client.fetch_text(u)["text"] for u in us], urls)
+
+    async def gather(us):
+        results = await asyncio.gather(*(client.afetch_text(u, max_chars=args.max_chars + 1) for u in us))
+        return [r["text"] for r in results]
+    measure("shared client, concurrent", lambda us: asyncio.run(gather(us)), urls)
+    measure("shared client, repeat (ETag)", lambda us: [client.fetch_text(u)["text"] for u in us], urls)
+
+    search = lambda queries: [json.dumps(client.post_json(f"{base}/search", {"query": q, "max_results": 3}))
+                              for q in queries]
+    measure("search, shared client", search, [f"query {i}" for i in range(args.pages)])
+
+    client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
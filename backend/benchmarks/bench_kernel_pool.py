@@ -0,0 +1,61 @@
+"""Latency of running a small pandas script: cold `python script.py` vs a warm kernel.
+
+Usage (from the backend directory):
+    python benchmarks/bench_kernel_pool.py --runs 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kernel_pool import KernelPool
+
+SCRIPT = """
+import numpy as np
+import pandas as pd
+df = pd.DataFrame({"x": np.arange(1000)})
+print(df["x"].sum())
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as f:
+        f.write(SCRIPT)
+        path = f.name
+
+    cold = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, path], capture_output=True, text=True, check=True)
+        cold.append(time.perf_counter() - start)
+
+    pool = KernelPool(size=1, max_runs=args.runs + 1)
+    start = time.perf_counter()
+    pool.warm()
+    warm_up = time.perf_counter() - start
+
+    warm = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        result = pool.run({"mode": "file", "path": path})
+        assert result["returncode"] == 0, result["stderr"]
+        warm.append(time.perf_counter() - start)
+    pool.shutdown()
+    os.unlink(path)
+
+    print(f"cold spawn per run, p50:  {statistics.median(cold) * 1000:8.1f} ms")
+    print(f"kernel start (one-off):   {warm_up * 1000:8.1f} ms")
+    print(f"warm kernel per run, p50: {statistics.median(warm) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""LLM provider routing under slow, failing and rate-limited providers, with fake chat models.
+
+Each scenario sends --requests calls from --concurrency clients, through a single
+provider (the baseline) and through LLMRouter with fallback, with hedging, or both.
+Providers are FakeChatModels with a latency, a slow tail (`slow_rate` of calls take
+`slow_latency`) and an error rate. Reported: success rate, latency percentiles, how the
+calls were spread over the providers and how many were hedges, fallbacks or skipped.
+
+Usage (from the backend directory):
+    python benchmarks/bench_llm_router.py --requests 400 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["TELEMETRY_ENABLED"] = "True"
+
+from langchain_core.messages import HumanMessage
+
+from benchmarks.fakes import FakeChatModel
+from llm_router import LLMRouter
+from telemetry import get_telemetry
+
+# name -> {provider: fake model settings}, router settings (None: call the first provider directly)
+SCENARIOS = [
+    ("slow tail, single provider", {"primary": dict(latency=0.05, slow_rate=0.05, slow_latency=1.0)}, None),
+    ("slow tail, hedged", {"primary": dict(latency=0.05, slow_rate=0.05, slow_latency=1.0),
+                           "secondary": dict(latency=0.08)}, dict(hedge=True, strategy="ordered")),
+    ("10% errors, single provider", {"primary": dict(latency=0.05, error_rate=0.1)}, None),
+    ("10% errors, fallback", {"primary": dict(latency=0.05, error_rate=0.1),
+                              "secondary": dict(latency=0.08)}, dict(strategy="ordered")),
+    ("primary down, no circuit breaker", {"primary": dict(latency=0.05, error_rate=1.0),
+                                          "secondary": dict(latency=0.08)},
+     dict(strategy="ordered", failure_threshold=10**9)),
+    ("primary down, circuit breaker", {"primary": dict(latency=0.05, error_rate=1.0),
+                                       "secondary": dict(latency=0.08)},
+     dict(strategy="ordered", failure_threshold=5, reset_timeout=60)),
+    ("primary rate limited to 60/min", {"primary": dict(latency=0.05), "secondary": dict(latency=0.08)},
+     dict(strategy="ordered", rate_limits={"primary": 60})),
+    ("slower primary, latency routing", {"primary": dict(latency=0.12), "secondary": dict(latency=0.05)},
+     dict(strategy="latency")),
+]
+
+
+def percentile(values: list, q: float) -> float:
+    return values[min(int(q * len(values)), len(values) - 1)] if values else float("nan")
+
+
+async def run(llm, concurrency: int, total: int) -> dict:
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+    latencies, errors = [], 0
+
+    async def client():
+        nonlocal errors
+        while not queue.empty():
+            i = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                await llm.ainvoke([HumanMessage(content=f"question {i}")])
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return {"elapsed": time.perf_counter() - start, "latencies": sorted(latencies), "errors": errors}
+
+
+def provider_counts() -> str:
+    summary = get_telemetry().metrics.summary()
+    calls = {}
+    for series in summary.get("agent_spans_total", []):
+        if series["kind"] == "provider":
+            calls[f"{series['name']} {series['status']}"] = int(series["value"])
+    for series in summary.get("agent_llm_routing_total", []):
+        calls[f"{series['provider']} {series['event']}"] = int(series["value"])
+    return "  ".join(f"{key} {value}" for key, value in sorted(calls.items()))
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--hedge-delay", type=float, default=0.2,
+                        help="delay before hedging until enough latencies are recorded for a p95")
+    args = parser.parse_args()
+
+    for name, providers, router in SCENARIOS:
+        fakes = {provider: FakeChatModel(seed=i, **settings) for i, (provider, settings) in enumerate(providers.items())}
+        if router is None:
+            llm = next(iter(fakes.values()))
+        else:
+            llm = LLMRouter(fakes, hedge_delay=args.hedge_delay, **router)
+        get_telemetry().metrics.reset()
+        r = await run(llm, args.concurrency, args.requests)
+        lat = r["latencies"]
+        print(f"{name:<34} ok {len(lat) / args.requests:6.1%}  p50 {percentile(lat, 0.5) * 1000:7.1f}  "
+              f"p95 {percentile(lat, 0.95) * 1000:7.1f}  p99 {percentile(lat, 0.99) * 1000:7.1f} ms  "
+              f"{len(lat) / r['elapsed']:6.1f} req/s")
+        if router is not None:
+            print(f"{'':<34} {provider_counts()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
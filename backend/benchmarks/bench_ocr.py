@@ -0,0 +1,103 @@
+"""OCR throughput on a folder of generated text images: one image at a time vs the batched pipeline.
+
+The images are full-page scans (large, RGB, light noise) with known text, so word recall
+is reported next to pages/s. Needs the tesseract binary on PATH.
+
+Usage (from the backend directory):
+    python benchmarks/bench_ocr.py --images 24
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytesseract
+from PIL import Image, ImageDraw, ImageFont
+
+from image_processing import encode_image
+from ocr import OCRPipeline
+from tool_cache import SQLiteBackend
+
+WORDS = ("invoice total amount payment order customer shipping address quantity price "
+         "tax discount balance account number date reference product service").split()
+
+
+def generate(directory: str, count: int) -> dict:
+    """Write `count` noisy 2480x3508 (A4 at 300 dpi) pages; returns path -> expected words."""
+    rng = random.Random(0)
+    noise = np.random.default_rng(0)
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", 48)
+    except OSError:
+        font = ImageFont.load_default(size=48)
+    expected = {}
+    for i in range(count):
+        image = Image.new("RGB", (2480, 3508), (245, 242, 235))
+        draw = ImageDraw.Draw(image)
+        words = []
+        for line in range(30):
+            text = " ".join(rng.choice(WORDS) for _ in range(8))
+            draw.text((150, 150 + line * 105), text, fill=(40, 40, 40), font=font)
+            words += text.split()
+        pixels = np.asarray(image).astype(np.int16) + noise.integers(-20, 20, (3508, 2480, 1))
+        path = os.path.join(directory, f"page_{i:03d}.png")
+        Image.fromarray(pixels.clip(0, 255).astype(np.uint8)).save(path)
+        expected[path] = words
+    return expected
+
+
+def recall(texts: list, expected: list) -> float:
+    found = sum(len(set(text.lower().split()) & set(words)) for text, words in zip(texts, expected))
+    return found / sum(len(set(words)) for words in expected)
+
+
+def run(label: str, ocr, sources: list, expected: list) -> None:
+    start = time.perf_counter()
+    texts = ocr(sources)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed:7.2f} s  {len(sources) / elapsed:6.2f} pages/s  word recall {recall(texts, expected):.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=24)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    try:
+        pytesseract.get_tesseract_version()
+    except pytesseract.TesseractNotFoundError:
+        sys.exit("tesseract is not installed or not on PATH")
+
+    root = tempfile.mkdtemp()
+    expected = generate(root, args.images)
+    paths = list(expected)
+    words = [expected[p] for p in paths]
+
+    run("one at a time (legacy)", lambda sources: [pytesseract.image_to_string(Image.open(p)) for p in sources],
+        paths, words)
+
+    single = OCRPipeline(workers=1)
+    run("pipeline, 1 worker", lambda sources: [r["text"] for r in single.extract(sources)], paths, words)
+
+    cache = SQLiteBackend(os.path.join(root, "ocr_cache.db"))
+    parallel = OCRPipeline(workers=args.workers, cache=cache)
+    extract = lambda sources: [r["text"] for r in parallel.extract(sources)]
+    parallel.extract(paths[:1])  # start the pool outside the timing
+    cache.clear()
+    run(f"pipeline, {args.workers} workers, cold cache", extract, paths, words)
+    run(f"pipeline, {args.workers} workers, warm cache", extract, paths, words)
+    run("pipeline, base64 inputs, warm cache", extract, [encode_image(p) for p in paths], words)
+
+    parallel.close()
+    shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
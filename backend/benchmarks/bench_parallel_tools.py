@@ -0,0 +1,80 @@
+"""Wall-clock time of one assistant turn with several slow tool calls: sequential vs ParallelToolNode.
+
+Usage (from the backend directory):
+    python benchmarks/bench_parallel_tools.py --delay 1.0 --calls 3
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+from parallel_tools import ParallelToolNode
+
+DELAY = 1.0
+
+
+@tool
+def slow_search(query: str) -> str:
+    """Stub for a network search tool."""
+    time.sleep(DELAY)
+    return f"results for {query}"
+
+
+@tool
+def hung_scraper(url: str) -> str:
+    """Stub for a scraper that never answers."""
+    time.sleep(3600)
+    return ""
+
+
+def make_state(calls: int, with_hung: bool) -> dict:
+    tool_calls = [{"name": "slow_search", "args": {"query": f"q{i}"}, "id": f"call-{i}"} for i in range(calls)]
+    if with_hung:
+        tool_calls.append({"name": "hung_scraper", "args": {"url": "http://example.com"}, "id": "call-hung"})
+    return {"messages": [AIMessage(content="", tool_calls=tool_calls)]}
+
+
+def sequential(state: dict) -> None:
+    for call in state["messages"][-1].tool_calls:
+        if call["name"] == "slow_search":
+            slow_search.invoke(call["args"])
+
+
+def main():
+    global DELAY
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--delay", type=float, default=1.0)
+    parser.add_argument("--calls", type=int, default=3)
+    args = parser.parse_args()
+    DELAY = args.delay
+
+    node = ParallelToolNode([slow_search, hung_scraper], timeout=args.delay * 2, process_tools=())
+    state = make_state(args.calls, with_hung=False)
+
+    start = time.perf_counter()
+    sequential(state)
+    print(f"sequential, {args.calls} calls:              {time.perf_counter() - start:.2f} s")
+
+    start = time.perf_counter()
+    node.run(state)
+    print(f"ParallelToolNode.run, {args.calls} calls:    {time.perf_counter() - start:.2f} s")
+
+    start = time.perf_counter()
+    asyncio.run(node.arun(state))
+    print(f"ParallelToolNode.arun, {args.calls} calls:   {time.perf_counter() - start:.2f} s")
+
+    start = time.perf_counter()
+    # asyncio.run would wait on the hung thread at shutdown, so drive the loop directly
+    result = asyncio.new_event_loop().run_until_complete(node.arun(make_state(args.calls, with_hung=True)))
+    failed = [m.name for m in result["messages"] if m.status == "error"]
+    print(f"with one hung tool (timeout {args.delay * 2:g}s):  {time.perf_counter() - start:.2f} s, errors: {failed}")
+    os._exit(0)  # the hung stub thread never finishes
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Replay recorded agent runs through the compiled graph and the /chat endpoint, offline.
+
+Every fixture in benchmarks/fixtures (see replay.py for recording new ones) is replayed
+with ReplayChatModel and stub tools, at each concurrency level, and each answer is
+checked against the recorded one. Reported per level: throughput, end-to-end latency
+percentiles, RSS growth, and where the time went per request from the telemetry spans:
+LLM and tool time as replayed, and the overhead of the graph itself around them (at
+concurrency above 1 this includes waiting for the event loop behind other requests).
+
+--latency-scale 0 (the default) replays without the recorded LLM/tool delays, so the
+numbers are pure orchestration cost; 1 replays them in real time.
+
+Usage (from the backend directory):
+    python benchmarks/bench_replay.py --mode graph http --concurrency 1 4 16 --requests 96
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+os.environ.setdefault("CONVERSATION_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench_conversations.db"))
+# Stubs must run in this process, and the answer cache would need the embedding model
+os.environ["TOOL_PROCESS_POOL_TOOLS"] = ""
+os.environ.setdefault("SEMANTIC_CACHE_ENABLED", "False")
+os.environ.setdefault("TOOL_CACHE_BACKEND", "memory")
+os.environ["TELEMETRY_ENABLED"] = "True"
+
+import httpx
+from langchain_core.messages import HumanMessage
+
+from benchmarks.replay import FIXTURES_DIR, ReplayChatModel, final_answer, load_fixtures, stub_tools
+from my_agent import build_agent, tools as real_tools
+from telemetry import get_telemetry
+from tool_cache import MemoryBackend, ToolResultCache
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def breakdown(requests: int) -> dict:
+    """Mean milliseconds per request spent in each kind of span."""
+    totals = {}
+    for series in get_telemetry().metrics.summary()["agent_span_duration_seconds"]:
+        key = series["name"] if series["kind"] in ("node", "step", "request") else series["kind"]
+        totals[key] = totals.get(key, 0.0) + series["mean"] * series["count"]
+    per_request = {key: value * 1000 / requests for key, value in totals.items()}
+    request = sum(v for k, v in per_request.items() if k in ("chat", "replay"))
+    nodes = per_request.get("assistant", 0.0) + per_request.get("tools", 0.0)
+    return {
+        "llm": per_request.get("llm", 0.0),
+        "tools node": per_request.get("tools", 0.0),
+        "context budget": per_request.get("context_budget", 0.0),
+        "assistant overhead": per_request.get("assistant", 0.0) - per_request.get("llm", 0.0)
+                              - per_request.get("context_budget", 0.0),
+        "graph overhead": request - nodes,
+    }
+
+
+async def run_graph(graph, question: str, thread_id: str = None) -> str:
+    # A graph with a checkpointer needs a thread per conversation
+    config = {"configurable": {"thread_id": thread_id}} if thread_id else None
+    with get_telemetry().trace("replay"):
+        result = await graph.ainvoke({"messages": [HumanMessage(content=question)]}, config=config)
+    return result["messages"][-1].content
+
+
+async def run_http(client, question: str) -> str:
+    response = await client.post("/chat", json={"message": question})
+    response.raise_for_status()
+    return response.json()["response"]
+
+
+async def run_level(call, fixtures: dict, concurrency: int, total: int) -> dict:
+    questions = list(fixtures)
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(questions[i % len(questions)])
+    latencies, errors, mismatches = [], [], 0
+
+    async def worker():
+        nonlocal mismatches
+        while not queue.empty():
+            question = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                answer = await call(question)
+            except Exception as e:
+                errors.append(str(e))
+                continue
+            latencies.append(time.perf_counter() - start)
+            mismatches += answer != final_answer(fixtures[question])
+
+    get_telemetry().metrics.reset()
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    # The server's per-request prints would dominate the output
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    for error in sorted(set(errors)):
+        print(f"  error: {error}")
+    return {"elapsed": elapsed, "latencies": latencies, "mismatches": mismatches, "errors": errors,
+            "rss": rss_mb(), "rss_growth": rss_mb() - rss_before, "breakdown": breakdown(max(len(latencies), 1))}
+
+
+def report(mode: str, concurrency: int, r: dict) -> None:
+    lat = r["latencies"] or [0.0]
+    print(f"{mode:<5} c={concurrency:<3} {len(r['latencies']) / r['elapsed']:8.1f} req/s  "
+          f"p50 {percentile(lat, 0.5) * 1000:8.2f}  p95 {percentile(lat, 0.95) * 1000:8.2f}  "
+          f"p99 {percentile(lat, 0.99) * 1000:8.2f} ms  rss {r['rss']:6.0f} MiB ({r['rss_growth']:+.1f})  "
+          f"errors {len(r['errors'])}  mismatched answers {r['mismatches']}")
+    print("      per request: " + "  ".join(f"{k} {v:.2f} ms" for k, v in r["breakdown"].items()))
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--mode", nargs="+", choices=("graph", "http"), default=["graph", "http"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=96, help="requests per concurrency level")
+    parser.add_argument("--latency-scale", type=float, default=0.0,
+                        help="fraction of the recorded LLM/tool latency to replay (0 = none)")
+    parser.add_argument("--checkpointer", action="store_true", help="graph mode: persist conversations as /chat does")
+    parser.add_argument("--tool-cache", action="store_true", help="serve repeated tool calls from a memory cache")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures)
+    llm = ReplayChatModel(fixtures=fixtures, latency_scale=args.latency_scale)
+    agent_tools = stub_tools(real_tools, fixtures, latency_scale=args.latency_scale)
+    if args.tool_cache:
+        agent_tools = ToolResultCache(MemoryBackend()).wrap_tools(agent_tools)
+    print(f"{len(fixtures)} fixtures, latency scale {args.latency_scale:g}, rss {rss_mb():.0f} MiB")
+
+    for mode in args.mode:
+        if mode == "graph":
+            checkpointer = None
+            if args.checkpointer:
+                from conversation_store import build_checkpointer
+                checkpointer = build_checkpointer()
+            graph = build_agent(llm=llm, agent_tools=agent_tools, checkpointer=checkpointer)
+            threads = itertools.count()
+            call = lambda q: run_graph(graph, q, f"replay-{next(threads)}" if checkpointer is not None else None)
+            await call(next(iter(fixtures)))  # warm up outside the timing
+            for concurrency in args.concurrency:
+                report(mode, concurrency, await run_level(call, fixtures, concurrency, args.requests))
+        else:
+            import backend
+            from agent_runner import AgentRunner
+            backend.agent.graph = build_agent(llm=llm, agent_tools=agent_tools, checkpointer=backend.checkpointer)
+            transport = httpx.ASGITransport(app=backend.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                await run_http(client, next(iter(fixtures)))
+                for concurrency in args.concurrency:
+                    backend.agent_runner = AgentRunner(max_concurrency=concurrency, max_queue=args.requests, timeout=600)
+                    report(mode, concurrency, await run_level(lambda q: run_http(client, q), fixtures,
+                                                              concurrency, args.requests))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+"""Per-execution cost of extracting plots and DataFrames over a long in-process session.
+
+Each execution builds a DataFrame and draws one figure. The legacy extraction
+(PNG files on disk, figures never closed, every DataFrame in the globals reported)
+is reproduced here for comparison with CodeInterpreter's in-memory, diff-based one.
+
+Usage (from the backend directory):
+    python benchmarks/bench_result_extraction.py --executions 30
+"""
+import argparse
+import base64
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import pandas as pd
+
+from code_interpreter import CodeInterpreter, base_namespace
+
+CODE = """
+df_{i} = pd.DataFrame({{"x": np.arange(2000), "y": np.random.rand(2000)}})
+plt.figure()
+plt.plot(df_{i}["x"], df_{i}["y"])
+"""
+
+
+def legacy_execute(code: str, namespace: dict, exec_dir: str) -> dict:
+    with contextlib.redirect_stdout(io.StringIO()):
+        exec(code, namespace)
+    plots = []
+    for i, fig_num in enumerate(plt.get_fignums()):
+        img_path = os.path.join(exec_dir, f"plot_{i}.png")
+        plt.figure(fig_num).savefig(img_path)
+        with open(img_path, "rb") as f:
+            plots.append(base64.b64encode(f.read()).decode("utf-8"))
+    dataframes = [v.head().to_dict() for v in namespace.values() if isinstance(v, pd.DataFrame) and len(v) > 0]
+    return {"plots": plots, "dataframes": dataframes}
+
+
+def run(label: str, execute, executions: int) -> None:
+    timings, plots, dataframes = [], 0, 0
+    for i in range(executions):
+        start = time.perf_counter()
+        result = execute(CODE.format(i=i))
+        timings.append(time.perf_counter() - start)
+        plots += len(result["plots"])
+        dataframes += len(result["dataframes"])
+    print(f"{label:<28} first {timings[0] * 1000:7.1f} ms  last {timings[-1] * 1000:7.1f} ms  "
+          f"total {sum(timings):6.2f} s  plots {plots:5d}  dataframes {dataframes:5d}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--executions", type=int, default=30)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    namespace = base_namespace()
+    counter = iter(range(args.executions))
+
+    def legacy(code):
+        exec_dir = os.path.join(root, str(next(counter)))
+        os.makedirs(exec_dir)
+        return legacy_execute(code, namespace, exec_dir)
+
+    run("legacy (disk, no close)", legacy, args.executions)
+    plt.close("all")
+
+    for plot_format in ("png", "webp", "svg"):
+        interpreter = CodeInterpreter(working_directory=root, use_kernel=False, plot_format=plot_format)
+        run(f"in-memory {plot_format}, diffed", interpreter.execute_code, args.executions)
+
+    shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Cold vs warm per-query latency for retriever_tool's vector store, and N related
+queries searched one by one vs as one batch.
+
+Usage (from the backend directory, with a built faiss_index):
+    python benchmarks/bench_retrieval.py --queries 20 --multi 5
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_community.vectorstores import FAISS
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from retrieval import EMBEDDING_MODEL_NAME, VectorStoreManager, current_index_dir
+
+QUERY = "Which paper about AI regulation was submitted to arXiv in June 2022?"
+RELATED = [QUERY, "AI regulation paper arXiv June 2022", "arXiv submissions on AI policy in 2022",
+           "Figures in the June 2022 AI regulation paper", "Which society is described in the AI regulation paper?"]
+
+
+def cold_query(index_path: str) -> float:
+    start = time.perf_counter()
+    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+    store = FAISS.load_local(current_index_dir(index_path), embeddings=embeddings, allow_dangerous_deserialization=True)
+    store.similarity_search(QUERY, k=3)
+    return time.perf_counter() - start
+
+
+def warm_query(manager: VectorStoreManager) -> float:
+    start = time.perf_counter()
+    manager.get_vector_store().similarity_search(QUERY, k=3)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index-path", default=os.getenv("FAISS_INDEX_PATH", "faiss_index"))
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--multi", type=int, default=5)
+    parser.add_argument("--mmap", action="store_true")
+    args = parser.parse_args()
+
+    cold = [cold_query(args.index_path) for _ in range(3)]
+    manager = VectorStoreManager(index_path=args.index_path, use_mmap=args.mmap)
+    first = warm_query(manager)
+    warm = sorted(warm_query(manager) for _ in range(args.queries))
+
+    print(f"cold (load + query), mean of 3: {sum(cold) / len(cold) * 1000:.1f} ms")
+    print(f"managed first query (loads once): {first * 1000:.1f} ms")
+    print(f"managed warm query p50: {warm[len(warm) // 2] * 1000:.2f} ms")
+    print(f"managed warm query max: {warm[-1] * 1000:.2f} ms")
+
+    queries = (RELATED * args.multi)[:args.multi]
+    store = manager.get_vector_store()
+    start = time.perf_counter()
+    for _ in range(args.queries):
+        for query in queries:
+            store.similarity_search_with_score(query, k=3)
+    separate = (time.perf_counter() - start) / args.queries
+    start = time.perf_counter()
+    for _ in range(args.queries):
+        response = manager.search(queries, k=3)
+    batched = (time.perf_counter() - start) / args.queries
+    timing = response["timing"]
+    print(f"{len(queries)} queries one by one: {separate * 1000:.2f} ms")
+    print(f"{len(queries)} queries batched: {batched * 1000:.2f} ms "
+          f"(embed {timing['embed_ms']:.2f} ms, search {timing['search_ms']:.2f} ms, "
+          f"{len(response['results'])} unique results)")
+
+
+if __name__ == "__main__":
+    main()
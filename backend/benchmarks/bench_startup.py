@@ -0,0 +1,110 @@
+"""Cold-start cost of the backend: what `import backend` spends its time on, and how long a
+fresh server process takes to answer /health (live) and /health/ready (warm-up done).
+
+The import profile comes from `python -X importtime`: each module's own import time,
+summed per top-level package. Server starts use a placeholder GOOGLE_API_KEY (no
+request reaches the provider) and a throwaway conversation database, once per
+BACKEND_WARMUP setting.
+
+Usage (from the backend directory):
+    python benchmarks/bench_startup.py --warmup "" agent agent,tools --runs 3
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def bench_env(**overrides) -> dict:
+    env = dict(os.environ)
+    env.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+    env["CONVERSATION_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_conversations.db")
+    env.update(overrides)
+    return env
+
+
+def import_profile(module: str, top: int) -> None:
+    """Print the total import time and the packages that dominate it."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=BACKEND_DIR,
+                            env=bench_env(), capture_output=True, text=True)
+    per_package = defaultdict(int)
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Nesting is shown by indentation after the single separating space
+        if name[1:] == module:
+            total = int(cumulative_us)
+        per_package[name.strip().split(".")[0]] += int(self_us)
+    print(f"import {module}: {total / 1e6:.2f} s")
+    for package, us in sorted(per_package.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {package:<28} {us / 1e6:6.3f} s")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(warmup: str, timeout: float) -> dict:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "backend.py"], cwd=BACKEND_DIR,
+                               env=bench_env(BACKEND_PORT=str(port), BACKEND_WARMUP=warmup),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    live = ready = None
+    try:
+        while time.perf_counter() - started < timeout and process.poll() is None:
+            try:
+                if live is None:
+                    urllib.request.urlopen(url + "/health", timeout=1).close()
+                    live = time.perf_counter() - started
+                urllib.request.urlopen(url + "/health/ready", timeout=1).close()
+                ready = time.perf_counter() - started
+                break
+            except urllib.error.HTTPError:
+                pass  # 503 until the warm-up finishes
+            except (urllib.error.URLError, ConnectionError, TimeoutError):
+                pass  # not listening yet
+            time.sleep(0.02)
+    finally:
+        process.terminate()
+        process.wait()
+    return {"live": live, "ready": ready}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--warmup", nargs="+", default=["", "agent", "agent,tools"],
+                        help="BACKEND_WARMUP values to start the server with")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=12, help="packages to show in the import profile")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    for module in ("my_agent", "backend"):
+        import_profile(module, args.top)
+
+    for warmup in args.warmup:
+        runs = [start_server(warmup, args.timeout) for _ in range(args.runs)]
+        live = [r["live"] for r in runs if r["live"] is not None]
+        ready = [r["ready"] for r in runs if r["ready"] is not None]
+        print(f"BACKEND_WARMUP={warmup!r:<24} live {statistics.median(live) if live else float('nan'):6.2f} s  "
+              f"ready {statistics.median(ready) if ready else float('nan'):6.2f} s  "
+              f"(median of {args.runs}, {args.runs - len(ready)} not ready)")
+
+
+if __name__ == "__main__":
+    main()
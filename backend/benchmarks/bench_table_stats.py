@@ -0,0 +1,88 @@
+"""Peak memory and time of summarizing a large CSV: pandas read_csv + describe() vs the chunked engine.
+
+Each mode runs in its own process so its peak RSS can be measured. The synthetic CSV
+is generated once and reused when --path already exists.
+
+Usage (from the backend directory):
+    python benchmarks/bench_table_stats.py --size-mb 1024
+"""
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+ROWS_PER_BATCH = 500_000
+
+
+def generate(path: str, size_mb: int) -> None:
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    cities = np.array([f"city_{i}" for i in range(5000)])
+    first = True
+    start = 0
+    while not os.path.exists(path) or os.path.getsize(path) < size_mb * 1024 * 1024:
+        n = ROWS_PER_BATCH
+        pd.DataFrame({
+            "id": np.arange(start, start + n),
+            "price": rng.normal(100, 25, n).round(2),
+            "quantity": rng.integers(1, 500, n),
+            "discount": rng.random(n).round(4),
+            "city": cities[rng.integers(0, len(cities), n)],
+            "segment": rng.choice(["consumer", "corporate", "home office"], n),
+            "score": rng.exponential(3.0, n).round(3),
+        }).to_csv(path, mode="w" if first else "a", header=first, index=False)
+        first = False
+        start += n
+
+
+def run_mode(mode: str, path: str) -> None:
+    start = time.perf_counter()
+    if mode == "pandas":
+        import pandas as pd
+        df = pd.read_csv(path)
+        text = str(df.describe())
+    else:
+        from table_stats import format_summary, summarize_file
+        summary, focus = summarize_file(path, "")
+        text = format_summary(summary, focus, "CSV file")
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{mode:<16} {elapsed:8.2f} s   peak RSS {peak_mb:8.0f} MiB   ({len(text)} chars of output)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--path", default=os.path.join(tempfile.gettempdir(), "bench_table_stats.csv"))
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.path)
+        return
+
+    if not os.path.exists(args.path):
+        start = time.perf_counter()
+        generate(args.path, args.size_mb)
+        print(f"generated {os.path.getsize(args.path) / 2**20:.0f} MiB in {time.perf_counter() - start:.1f} s")
+
+    cache_dir = tempfile.mkdtemp()
+    env = dict(os.environ, DATA_CACHE_DIR=cache_dir, DATA_CACHE_ENABLED="True")
+    for mode, label in (("pandas", "pandas"), ("engine", "engine (cold)"), ("engine", "engine (cached)")):
+        print(f"{label}:", end=" ", flush=True)
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--path", args.path, "--mode", mode],
+                       env=env, check=True)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Cost of the instrumentation on the request path: span overhead, and printing every
+message of a turn (the old unconditional pretty_print) vs the debug switch being off.
+
+Usage (from the backend directory):
+    python benchmarks/bench_telemetry.py --spans 100000 --tool-chars 200000
+"""
+import argparse
+import contextlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from telemetry import Telemetry
+
+
+def time_spans(telemetry: Telemetry, count: int) -> float:
+    start = time.perf_counter()
+    with telemetry.trace("bench"):
+        for i in range(count):
+            with telemetry.span("reverse_string", kind="tool") as span:
+                telemetry.record_tool_output(span, "reverse_string", i % 5000)
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--spans", type=int, default=100000)
+    parser.add_argument("--tool-chars", type=int, default=200000)
+    parser.add_argument("--turns", type=int, default=20)
+    args = parser.parse_args()
+
+    for label, telemetry in (("disabled", Telemetry(enabled=False)), ("enabled", Telemetry())):
+        print(f"span overhead, telemetry {label:<8} {time_spans(telemetry, args.spans) * 1e6:6.2f} us/span")
+    telemetry = Telemetry()
+    time_spans(telemetry, 1000)
+    started = time.perf_counter()
+    text = telemetry.metrics.render_prometheus()
+    print(f"/metrics render: {(time.perf_counter() - started) * 1000:.2f} ms for {len(text.splitlines())} lines")
+
+    turn = [HumanMessage("Summarize this page"),
+            AIMessage(content="", tool_calls=[{"name": "scrape_website", "args": {"url": "http://x"}, "id": "1"}]),
+            ToolMessage(content="lorem ipsum " * (args.tool_chars // 12), name="scrape_website", tool_call_id="1"),
+            AIMessage(content="A summary.")]
+    for label, debug in (("pretty_print every message", True), ("debug off (default)", False)):
+        telemetry = Telemetry(debug=debug)
+        sink = open(os.devnull, "w")
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(sink):
+            for _ in range(args.turns):
+                telemetry.debug_messages(turn)
+        print(f"{label:<28} {(time.perf_counter() - started) / args.turns * 1000:7.3f} ms/turn "
+              f"({args.tool_chars} char tool output, stdout to /dev/null)")
+
+
+if __name__ == "__main__":
+    main()
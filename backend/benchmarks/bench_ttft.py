@@ -0,0 +1,72 @@
+"""Time to first token: buffered /chat vs streaming /chat/stream with a fake streaming LLM.
+
+Usage (from the backend directory):
+    python benchmarks/bench_ttft.py --latency 0.3 --token-delay 0.02 --runs 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+
+import httpx
+import uvicorn
+import backend
+from my_agent import build_agent
+from benchmarks.fakes import FakeChatModel
+
+ANSWER = " ".join(f"word{i}" for i in range(60))
+
+
+async def buffered(client) -> tuple:
+    start = time.perf_counter()
+    response = await client.post("/chat", json={"message": "hi"})
+    response.raise_for_status()
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed
+
+
+async def streamed(client) -> tuple:
+    start = time.perf_counter()
+    first_token = None
+    async with client.stream("POST", "/chat/stream", json={"message": "hi"}) as response:
+        async for line in response.aiter_lines():
+            if first_token is None and line == "event: token":
+                first_token = time.perf_counter() - start
+    return first_token, time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    backend.agent.graph = build_agent(
+        llm=FakeChatModel(responses=[ANSWER], latency=args.latency, token_delay=args.token_delay)
+    )
+    # httpx's ASGITransport buffers whole responses, so serve over a real socket
+    server = uvicorn.Server(uvicorn.Config(backend.app, host="127.0.0.1", port=args.port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=None) as client:
+        for name, fn in (("/chat", buffered), ("/chat/stream", streamed)):
+            results = [await fn(client) for _ in range(args.runs)]
+            ttft = statistics.median(r[0] for r in results)
+            total = statistics.median(r[1] for r in results)
+            print(f"{name:<14} TTFT p50={ttft * 1000:7.1f} ms   total p50={total * 1000:7.1f} ms")
+
+    server.should_exit = True
+    await server_task
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
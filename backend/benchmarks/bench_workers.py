@@ -0,0 +1,168 @@
+"""Requests/sec of the real server against the number of uvicorn workers.
+
+For each BACKEND_WORKERS value, benchmarks/replay_app.py is started on a free port (the
+backend with its agent replaying the fixtures), the benchmark waits until every worker
+answers /health/ready, then sends --requests /chat requests over HTTP from --concurrency
+clients, each asking one fixture question and then a follow-up in the same conversation,
+which lands on whichever worker accepts it. Reported: throughput, latency percentiles,
+how many distinct workers served requests, and the proportional set size (PSS) of the
+whole process tree, in which pages shared between workers (the mmapped index, libraries)
+are counted once overall rather than once per worker.
+
+--tool-cpu-ms makes every tool call burn that much CPU while holding the GIL, as pandas,
+OCR or embedding tools do; that is the load extra workers help with. The client runs in
+this process and competes with the workers for cores, so leave one free if you can.
+
+Usage (from the backend directory):
+    python benchmarks/bench_workers.py --workers 1 2 4 --concurrency 16 --requests 200 --tool-cpu-ms 20
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.replay import FIXTURES_DIR, final_answer, load_fixtures
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_tree(pid: int) -> list:
+    children = []
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except FileNotFoundError:
+        pass
+    return [pid] + [p for child in children for p in process_tree(child)]
+
+
+def pss_mb(pid: int) -> float:
+    total = 0
+    for p in process_tree(pid):
+        try:
+            with open(f"/proc/{p}/smaps_rollup") as f:
+                total += sum(int(line.split()[1]) for line in f if line.startswith("Pss:"))
+        except FileNotFoundError:
+            pass
+    return total / 1024
+
+
+async def wait_ready(client: httpx.AsyncClient, process: subprocess.Popen, workers: int, timeout: float) -> None:
+    """Poll until `workers` different processes have answered /health/ready with 200."""
+    ready = set()
+    deadline = time.perf_counter() + timeout
+    while len(ready) < workers:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"only {len(ready)} of {workers} workers ready after {timeout:.0f} s")
+        try:
+            # A kept-alive connection would keep reaching the same worker
+            response = await client.get("/health/ready", headers={"Connection": "close"})
+            if response.status_code == 200:
+                ready.add(response.json()["worker"])
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.05)
+
+
+async def run_load(client: httpx.AsyncClient, fixtures: dict, concurrency: int, total: int) -> dict:
+    questions = list(fixtures)
+    queue = asyncio.Queue()
+    for i in range(total // 2):
+        queue.put_nowait((questions[i % len(questions)], questions[(i + 1) % len(questions)]))
+    latencies, errors, mismatches = [], [], 0
+
+    async def ask(question: str, conversation_id: str = None) -> str:
+        start = time.perf_counter()
+        response = await client.post("/chat", json={"message": question, "conversation_id": conversation_id})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        return response.json()
+
+    async def worker():
+        nonlocal mismatches
+        while not queue.empty():
+            first, follow_up = queue.get_nowait()
+            try:
+                reply = await ask(first)
+                mismatches += reply["response"] != final_answer(fixtures[first])
+                # The follow-up needs the first turn from the shared conversation database
+                reply = await ask(follow_up, reply["conversation_id"])
+                mismatches += reply["response"] != final_answer(fixtures[follow_up])
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"elapsed": time.perf_counter() - start, "latencies": sorted(latencies),
+            "errors": errors, "mismatches": mismatches}
+
+
+async def bench(workers: int, args, fixtures: dict) -> None:
+    port = free_port()
+    data_dir = tempfile.mkdtemp()
+    env = dict(os.environ, BACKEND_HOST="127.0.0.1", BACKEND_PORT=str(port), BACKEND_WORKERS=str(workers),
+               REPLAY_FIXTURES=args.fixtures, REPLAY_TOOL_CPU_MS=str(args.tool_cpu_ms),
+               REPLAY_LATENCY_SCALE=str(args.latency_scale),
+               CONVERSATION_DB_PATH=os.path.join(data_dir, "conversations.db"),
+               TOOL_CACHE_PATH=os.path.join(data_dir, "tool_cache.db"),
+               AGENT_MAX_QUEUE=str(max(args.concurrency * 2, 32)))
+    env.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+    process = subprocess.Popen([sys.executable, "benchmarks/replay_app.py"], cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None, limits=limits) as client:
+            await wait_ready(client, process, workers, args.startup_timeout)
+            await run_load(client, fixtures, 1, 2)  # warm up outside the timing
+            r = await run_load(client, fixtures, args.concurrency, args.requests)
+            served = set()
+            for _ in range(workers * 8):
+                served.add((await client.get("/health", headers={"Connection": "close"})).json()["worker"])
+            pss = pss_mb(process.pid)
+    finally:
+        process.terminate()
+        process.wait()
+
+    lat = r["latencies"] or [0.0]
+    print(f"workers {workers:<2} {len(r['latencies']) / r['elapsed']:8.1f} req/s  "
+          f"p50 {lat[len(lat) // 2] * 1000:8.1f}  p95 {lat[int(len(lat) * 0.95)] * 1000:8.1f} ms  "
+          f"pss {pss:6.0f} MiB  workers answering {len(served)}  errors {len(r['errors'])}  "
+          f"mismatched answers {r['mismatches']}")
+    for error in sorted(set(r["errors"]))[:5]:
+        print(f"  error: {error}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--tool-cpu-ms", type=float, default=20.0)
+    parser.add_argument("--latency-scale", type=float, default=0.0)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures)
+    print(f"{os.cpu_count()} CPUs, {len(fixtures)} fixtures, {args.tool_cpu_ms:g} ms CPU per tool call")
+    for workers in args.workers:
+        await bench(workers, args, fixtures)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+"""Fake chat models for benchmarking the agent without network access"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from typing import Any, Iterator, AsyncIterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeChatModel(BaseChatModel):
+    """Returns canned responses after a simulated latency.
+
+    `responses` are cycled through; each item is either a string or an AIMessage
+    (e.g. one carrying tool_calls). `latency` is the delay before the first token and
+    `token_delay` the delay between streamed tokens. A `slow_rate` fraction of calls takes
+    `slow_latency` instead, and an `error_rate` fraction fails after the latency, as a
+    provider with a latency tail or intermittent 5xx/429 errors would.
+    """
+    responses: List[Any] = ["This is a stub answer from the fake model."]
+    latency: float = 0.0
+    token_delay: float = 0.0
+    error: Optional[str] = None
+    error_rate: float = 0.0
+    slow_rate: float = 0.0
+    slow_latency: float = 0.0
+    seed: Optional[int] = None
+    _cycle: Any = None
+    _random: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _next_message(self, messages: List[BaseMessage]) -> AIMessage:
+        if self._cycle is None:
+            self._cycle = itertools.cycle(self.responses)
+        response = next(self._cycle)
+        if isinstance(response, AIMessage):
+            return response.model_copy()
+        return AIMessage(content=response)
+
+    def _roll(self) -> float:
+        if self._random is None:
+            self._random = random.Random(self.seed)
+        return self._random.random()
+
+    def _check_error(self):
+        if self.error:
+            raise RuntimeError(self.error)
+        if self.error_rate and self._roll() < self.error_rate:
+            raise RuntimeError(f"{self._llm_type}: simulated provider error")
+
+    def _latency(self) -> float:
+        if self.slow_rate and self._roll() < self.slow_rate:
+            return self.slow_latency
+        return self.latency
+
+    def _generation_time(self, message: AIMessage) -> float:
+        # A non-streaming call still pays for every token before returning
+        return self._latency() + self.token_delay * len(str(message.content).split(" "))
+
+    def _first_token_time(self, message: AIMessage) -> float:
+        return self._latency()
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = self._next_message(messages)
+        time.sleep(self._generation_time(message))
+        self._check_error()
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = self._next_message(messages)
+        await asyncio.sleep(self._generation_time(message))
+        self._check_error()
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, message: AIMessage) -> Iterator[AIMessageChunk]:
+        if message.tool_calls:
+            yield AIMessageChunk(
+                content=message.content,
+                tool_call_chunks=[
+                    {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+                    for i, call in enumerate(message.tool_calls)
+                ],
+                usage_metadata=message.usage_metadata,
+            )
+            return
+        words = message.content.split(" ")
+        for i, word in enumerate(words):
+            # Token counts arrive with the last chunk, as streaming providers send them
+            yield AIMessageChunk(content=word if i == 0 else " " + word,
+                                 usage_metadata=message.usage_metadata if i == len(words) - 1 else None)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        message = self._next_message(messages)
+        time.sleep(self._first_token_time(message))
+        self._check_error()
+        for chunk in self._chunks(message):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+            time.sleep(self.token_delay)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        message = self._next_message(messages)
+        await asyncio.sleep(self._first_token_time(message))
+        self._check_error()
+        for chunk in self._chunks(message):
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+            await asyncio.sleep(self.token_delay)
+
@@ -0,0 +1,181 @@
+"""Record agent runs to fixture files and replay them offline.
+
+A fixture holds one question's turn as it happened: the AI messages (with their tool
+calls), the tool results, and how long each LLM and tool call took. Replay serves the
+AI messages from ReplayChatModel and the tool results from stub tools with the real
+tools' names and schemas, sleeping the recorded time scaled by `latency_scale`, so the
+compiled graph runs exactly as recorded without Gemini, Groq or Tavily.
+
+The fixtures in benchmarks/fixtures are hand-written examples ("source": "synthetic") of a
+direct answer, a search-then-scrape turn and parallel tool calls, with typical output
+sizes and latencies. Recorded fixtures ("source": "recorded") can sit next to them.
+
+Recording needs the real providers (API keys and network):
+    python benchmarks/replay.py "What is the capital of France?" --out benchmarks/fixtures
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage, messages_from_dict, messages_to_dict
+from langchain_core.tools import StructuredTool
+
+from benchmarks.fakes import FakeChatModel
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def fixture_from_run(question: str, turn: List[BaseMessage], trace, provider: str) -> dict:
+    """Build a fixture from one turn's messages and the telemetry trace recorded around it."""
+    llm_latency = [span.duration for span in trace.spans if span.kind == "llm"]
+    tool_spans = defaultdict(list)
+    for span in trace.spans:
+        if span.kind == "tool":
+            tool_spans[span.name].append(span.duration)
+    # Tool spans carry no call id; calls of the same tool are matched in order
+    tool_latency = {m.tool_call_id: tool_spans[m.name].pop(0)
+                    for m in turn if isinstance(m, ToolMessage) and tool_spans[m.name]}
+    return {
+        "question": question,
+        "source": "recorded",
+        "provider": provider,
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "messages": messages_to_dict(turn),
+        "llm_latency": llm_latency,
+        "tool_latency": tool_latency,
+    }
+
+
+def load_fixtures(directory: str = FIXTURES_DIR) -> Dict[str, dict]:
+    """Fixtures by question, with their messages deserialized."""
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path) as f:
+            fixture = json.load(f)
+        fixture["messages"] = messages_from_dict(fixture["messages"])
+        fixture["path"] = path
+        fixtures[fixture["question"]] = fixture
+    if not fixtures:
+        raise FileNotFoundError(f"no fixtures in {directory}")
+    return fixtures
+
+
+def final_answer(fixture: dict) -> str:
+    return fixture["messages"][-1].content
+
+
+class ReplayChatModel(FakeChatModel):
+    """Answers each LLM call with the recorded AI message for the same question and step.
+
+    The step is the number of AI messages since the question, so concurrent requests for
+    different (or the same) questions replay independently.
+    """
+    fixtures: Dict[str, dict] = {}
+    latency_scale: float = 1.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay-chat-model"
+
+    def _next_message(self, messages: List[BaseMessage]) -> AIMessage:
+        last_question = max(i for i, m in enumerate(messages) if isinstance(m, HumanMessage))
+        question = messages[last_question].content
+        if question not in self.fixtures:
+            raise KeyError(f"no fixture recorded for question {question[:80]!r}")
+        fixture = self.fixtures[question]
+        step = sum(isinstance(m, AIMessage) for m in messages[last_question:])
+        recorded = [m for m in fixture["messages"] if isinstance(m, AIMessage)]
+        message = recorded[min(step, len(recorded) - 1)].model_copy(deep=True)
+        latencies = fixture["llm_latency"]
+        message.response_metadata["replay_latency"] = latencies[step] if step < len(latencies) else 0.0
+        return message
+
+    def _generation_time(self, message: AIMessage) -> float:
+        return message.response_metadata["replay_latency"] * self.latency_scale
+
+    def _first_token_time(self, message: AIMessage) -> float:
+        return self._generation_time(message)
+
+
+def burn_cpu(seconds: float) -> None:
+    """Spin in Python, holding the GIL as a CPU-bound tool (pandas, OCR, embeddings) would."""
+    deadline = time.process_time() + seconds
+    while time.process_time() < deadline:
+        pass
+
+
+def stub_tools(real_tools: list, fixtures: Dict[str, dict], latency_scale: float = 1.0,
+               cpu_seconds: float = 0.0) -> list:
+    """Tools with the real tools' names and argument schemas that return recorded outputs.
+
+    `cpu_seconds` of CPU work is done per call before the (scaled) recorded latency.
+    """
+    recorded = defaultdict(list)  # tool name -> [(args, output, latency)]
+    for fixture in fixtures.values():
+        calls = {call["id"]: call for m in fixture["messages"] if isinstance(m, AIMessage) for call in m.tool_calls}
+        for m in fixture["messages"]:
+            if isinstance(m, ToolMessage) and m.tool_call_id in calls:
+                recorded[m.name].append((calls[m.tool_call_id]["args"], m.content,
+                                         fixture["tool_latency"].get(m.tool_call_id, 0.0)))
+
+    def make_stub(real):
+        def lookup(kwargs: dict):
+            # Validated arguments include defaults the recorded call left out
+            for args, output, latency in recorded[real.name]:
+                if all(kwargs.get(key) == value for key, value in args.items()):
+                    return output, latency * latency_scale
+            raise ValueError(f"no recorded output for {real.name}({json.dumps(kwargs, default=str)[:200]})")
+
+        def func(**kwargs):
+            output, delay = lookup(kwargs)
+            burn_cpu(cpu_seconds)
+            time.sleep(delay)
+            return output
+
+        async def coroutine(**kwargs):
+            output, delay = lookup(kwargs)
+            burn_cpu(cpu_seconds)
+            await asyncio.sleep(delay)
+            return output
+
+        return StructuredTool.from_function(func=func, coroutine=coroutine, name=real.name,
+                                            description=real.description, args_schema=real.args_schema)
+
+    return [make_stub(real) for real in real_tools]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record agent runs as replay fixtures (needs the real providers).")
+    parser.add_argument("questions", nargs="+")
+    parser.add_argument("--out", default=FIXTURES_DIR)
+    parser.add_argument("--provider", default="google")
+    args = parser.parse_args()
+
+    from my_agent import build_agent
+    from telemetry import get_telemetry
+
+    telemetry = get_telemetry()
+    graph = build_agent(provider=args.provider)
+    os.makedirs(args.out, exist_ok=True)
+    for question in args.questions:
+        with telemetry.trace("record") as trace:
+            result = graph.invoke({"messages": [HumanMessage(content=question)]})
+        fixture = fixture_from_run(question, result["messages"], trace, args.provider)
+        path = os.path.join(args.out, hashlib.blake2b(question.encode(), digest_size=6).hexdigest() + ".json")
+        with open(path, "w") as f:
+            json.dump(fixture, f, indent=1)
+        print(f"{path}: {len(fixture['llm_latency'])} LLM calls, {len(fixture['tool_latency'])} tool calls")
+
+
+if __name__ == "__main__":
+    main()
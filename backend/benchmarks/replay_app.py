@@ -0,0 +1,36 @@
+"""The backend app with its agent replaying the fixtures, for benchmarks that run real server processes.
+
+Every uvicorn worker imports this module and builds its own replay graph. Configured by
+REPLAY_FIXTURES (default benchmarks/fixtures), REPLAY_LATENCY_SCALE (default 0) and
+REPLAY_TOOL_CPU_MS (CPU time burned per tool call, default 0).
+
+Usage (from the backend directory; BACKEND_WORKERS and friends as for backend.py):
+    GOOGLE_API_KEY=placeholder BACKEND_WORKERS=4 python benchmarks/replay_app.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Stubs must run in the worker itself, and the answer cache would need the embedding model
+os.environ["TOOL_PROCESS_POOL_TOOLS"] = ""
+os.environ.setdefault("SEMANTIC_CACHE_ENABLED", "False")
+
+if __name__ == "__main__":
+    # As in backend.py: only the server (or each worker) builds the app
+    from server import run_server
+    run_server("benchmarks.replay_app:app")
+    raise SystemExit
+
+import backend
+from benchmarks.replay import FIXTURES_DIR, ReplayChatModel, load_fixtures, stub_tools
+from my_agent import build_agent, tools as real_tools
+
+fixtures = load_fixtures(os.getenv("REPLAY_FIXTURES", FIXTURES_DIR))
+latency_scale = float(os.getenv("REPLAY_LATENCY_SCALE", "0"))
+backend.agent.graph = build_agent(
+    llm=ReplayChatModel(fixtures=fixtures, latency_scale=latency_scale),
+    agent_tools=stub_tools(real_tools, fixtures, latency_scale=latency_scale,
+                           cpu_seconds=float(os.getenv("REPLAY_TOOL_CPU_MS", "0")) / 1000),
+    checkpointer=backend.checkpointer,
+)
+app = backend.app
@@ -0,0 +1,141 @@
+"""Content-addressed cache of compiled C and Java programs"""
+import contextlib
+import functools
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from typing import Iterator, List, Optional
+
+
+@functools.lru_cache(maxsize=None)
+def compiler_version(compiler: str) -> str:
+    """First line of `<compiler> -version`, so upgrading a toolchain invalidates old builds."""
+    flag = "-version" if compiler.endswith("javac") else "--version"
+    try:
+        completed = subprocess.run([compiler, flag], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+    lines = (completed.stdout or completed.stderr).splitlines()
+    return lines[0] if lines else ""
+
+
+def build_key(language: str, source: str, compiler: str, flags: List[str]) -> str:
+    """Hash of everything that determines a build's output."""
+    digest = hashlib.sha256()
+    for part in (language, compiler, compiler_version(compiler), "\0".join(flags), source):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class BuildCache:
+    """Directory of build outputs named by `build_key`, evicted least-recently-used beyond `max_bytes`.
+
+    A build happens in a staging directory under the cache root that is always removed
+    afterwards; a successful one is renamed into place atomically, so several processes
+    can share the same root.
+    """
+    def __init__(self, root: str, max_bytes: int = 256 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(root, "staging"), exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "BuildCache":
+        return cls(
+            os.getenv("CODE_BUILD_CACHE_DIR", os.path.join(tempfile.gettempdir(), "figaro_build_cache")),
+            max_bytes=int(os.getenv("CODE_BUILD_CACHE_MAX_MB", "256")) * 1024 * 1024,
+        )
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Return the artifact directory for `key`, or None if it has not been built."""
+        path = self._path(key)
+        if not os.path.isdir(path):
+            self.misses += 1
+            return None
+        self.hits += 1
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        return path
+
+    @contextlib.contextmanager
+    def staging(self) -> Iterator[str]:
+        """A fresh directory to build in; removed on exit whether or not it was stored."""
+        path = tempfile.mkdtemp(dir=os.path.join(self.root, "staging"))
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def store(self, key: str, staging_dir: str) -> str:
+        """Move a finished build into the cache and return its artifact directory."""
+        path = self._path(key)
+        try:
+            os.rename(staging_dir, path)
+        except OSError:
+            # Another run stored the same build first; keep theirs
+            if not os.path.isdir(path):
+                raise
+        self._evict(keep=key)
+        return path
+
+    def _evict(self, keep: str) -> None:
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.root):
+                path = self._path(name)
+                if name == "staging" or not os.path.isdir(path):
+                    continue
+                with contextlib.suppress(OSError):
+                    entries.append((os.path.getmtime(path), name, _dir_size(path)))
+            total = sum(size for _, _, size in entries)
+            for _, name, size in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if name == keep:
+                    continue
+                shutil.rmtree(self._path(name), ignore_errors=True)
+                total -= size
+
+    def clear(self) -> None:
+        for name in os.listdir(self.root):
+            if name != "staging":
+                shutil.rmtree(self._path(name), ignore_errors=True)
+
+    @property
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_build_cache() -> BuildCache:
+    """Return the process-wide build cache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = BuildCache.from_env()
+    return _cache
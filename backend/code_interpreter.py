@@ -1,22 +1,110 @@
 import os
 import io
 import sys
+import asyncio
 import uuid
 import base64
 import traceback
 import contextlib
 import tempfile
-import subprocess
-import sqlite3
-from typing import Dict, List, Any, Optional, Union
+import threading
+from typing import Dict, List, Any, Optional, Union, Iterator, AsyncIterator
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from PIL import Image
+from kernel_pool import get_kernel_pool
+from output_capture import BoundedOutput, stream_process
+from build_cache import build_key, get_build_cache
+from sql_engine import SQLEngine
+from java_runner import get_java_runner, java_runner_enabled
+
+C_COMPILE_FLAGS = os.getenv("CODE_C_FLAGS", "").split()
+JAVA_COMPILE_FLAGS = os.getenv("CODE_JAVA_FLAGS", "").split()
+
+def base_namespace() -> dict:
+    """Globals every Python execution starts with."""
+    return {
+        "__builtins__": __builtins__,
+        "np": np,
+        "pd": pd,
+        "plt": plt,
+        "Image": Image,
+    }
+
+PLOT_FORMATS = ("png", "webp", "svg")
+DEFAULT_PLOT_FORMAT = os.getenv("CODE_PLOT_FORMAT", "png").lower()
+DEFAULT_PLOT_DPI = float(os.getenv("CODE_PLOT_DPI", "0")) or None
+
+def collect_plots(plot_format: str = None, dpi: float = None) -> list:
+    """Render every open matplotlib figure in memory, base64-encoded, then close them all."""
+    plot_format = (plot_format or DEFAULT_PLOT_FORMAT).lower()
+    if plot_format not in PLOT_FORMATS:
+        raise ValueError(f"Unsupported plot format: {plot_format} (use one of {', '.join(PLOT_FORMATS)})")
+    plots = []
+    try:
+        for fig_num in plt.get_fignums():
+            buffer = io.BytesIO()
+            plt.figure(fig_num).savefig(buffer, format=plot_format, dpi=dpi or DEFAULT_PLOT_DPI or "figure")
+            plots.append({
+                "figure_number": fig_num,
+                "format": plot_format,
+                "data": base64.b64encode(buffer.getvalue()).decode('utf-8')
+            })
+    finally:
+        plt.close("all")
+    return plots
+
+def _fingerprint(value: pd.DataFrame) -> tuple:
+    # Identity, shape, columns and a hash of every row, so an in-place edit anywhere is noticed
+    try:
+        content = int(pd.util.hash_pandas_object(value, index=True).sum())
+    except (TypeError, ValueError):
+        # Unhashable cells (lists, dicts): never equal, so the DataFrame is always reported
+        content = object()
+    return (id(value), value.shape, tuple(map(str, value.columns)), content)
+
+def snapshot_dataframes(namespace: dict) -> dict:
+    """Fingerprints of the DataFrames in a namespace, for diffing against after an execution."""
+    return {name: _fingerprint(value) for name, value in namespace.items() if isinstance(value, pd.DataFrame)}
+
+def collect_dataframes(namespace: dict, before: dict = None) -> list:
+    """Summarize the non-empty DataFrames in a namespace.
+
+    With `before` (from snapshot_dataframes), only DataFrames that are new or changed since are reported.
+    """
+    dataframes = []
+    for var_name, var_value in namespace.items():
+        if isinstance(var_value, pd.DataFrame) and len(var_value) > 0:
+            if before is not None and before.get(var_name) == _fingerprint(var_value):
+                continue
+            dataframes.append({
+                "name": var_name,
+                "head": var_value.head().to_dict(),
+                "shape": var_value.shape,
+                "dtypes": str(var_value.dtypes)
+            })
+    return dataframes
 
 class CodeInterpreter:
-    def __init__(self, allowed_modules=None, max_execution_time=30, working_directory=None):
-        """Initialize the code interpreter with safety measures."""
+    def __init__(self, allowed_modules=None, max_execution_time=30, working_directory=None, use_kernel=True,
+                 max_output_bytes=None, build_cache=None, use_java_runner=None, plot_format=None, plot_dpi=None):
+        """Initialize the code interpreter with safety measures.
+
+        Python code runs on a warm worker process pinned to this interpreter (use_kernel),
+        so globals persist across executions while max_execution_time and the kernel
+        memory limit apply and output streams live; if the kernel has to be killed, its
+        globals are lost and the next execution starts a new one. With use_kernel=False,
+        code runs in this process instead. Either way each result only lists the
+        DataFrames that execution created or changed. close() stops the kernel.
+        Figures are returned as plot_format images (png, webp or svg; default:
+        CODE_PLOT_FORMAT) at plot_dpi (default: CODE_PLOT_DPI or the figure's own DPI).
+        stdout and stderr each keep at most max_output_bytes (default: CODE_MAX_OUTPUT_BYTES),
+        split between the start and the end of the output.
+        C and Java builds are reused from build_cache (default: the shared cache under
+        CODE_BUILD_CACHE_DIR) when the same source is submitted again; use_java_runner
+        (default: JAVA_PERSISTENT_JVM, off) runs Java programs on one long-lived JVM.
+        """
         self.allowed_modules = allowed_modules or [
             "numpy", "pandas", "matplotlib", "scipy", "sklearn", 
             "math", "random", "statistics", "datetime", "collections",
@@ -25,257 +113,246 @@ class CodeInterpreter:
             "cmath", "uuid", "tempfile", "requests", "urllib"
         ]
         self.max_execution_time = max_execution_time
+        self.max_output_bytes = max_output_bytes
+        self.plot_format = plot_format
+        self.plot_dpi = plot_dpi
         self.working_directory = working_directory or os.path.join(os.getcwd()) 
         if not os.path.exists(self.working_directory):
             os.makedirs(self.working_directory)
         
-        self.globals = {
-            "__builtins__": __builtins__,
-            "np": np,
-            "pd": pd,
-            "plt": plt,
-            "Image": Image,
-        }
+        self.use_kernel = use_kernel
+        self._kernel = None
+        self._kernel_lock = threading.Lock()
+        self.build_cache = build_cache or get_build_cache()
+        self.use_java_runner = java_runner_enabled() if use_java_runner is None else use_java_runner
+        self.globals = base_namespace()
         self.temp_sqlite_db = os.path.join(tempfile.gettempdir(), "code_exec.db")
+        self._sql_engine = None
+
+    @staticmethod
+    def _result(execution_id: str, status: str = "error", stdout: str = "", stderr: str = "",
+                plots: list = None, dataframes: list = None, result=None) -> dict:
+        return {
+            "execution_id": execution_id,
+            "status": status,
+            "stdout": stdout,
+            "stderr": stderr,
+            "result": result,
+            "plots": plots or [],
+            "dataframes": dataframes or []
+        }
 
-    def execute_code(self, code: str, language: str = "python") -> Dict[str, Any]:
-        """Execute the provided code in the selected programming language."""
+    def execute_code(self, code: str, language: str = "python", params=None) -> Dict[str, Any]:
+        """Execute the provided code in the selected programming language.
+
+        params (a dict of named or a sequence of positional values) is bound into SQL queries.
+        """
+        for event in self.execute_code_stream(code, language, params):
+            if event["type"] == "result":
+                return event["result"]
+
+    def execute_code_stream(self, code: str, language: str = "python", params=None) -> Iterator[Dict[str, Any]]:
+        """Execute code and yield its output while it runs.
+
+        Yields {"type": "stdout"|"stderr", "data": str} chunks as the program prints,
+        {"type": "truncated", "stream": ...} when a stream overflows max_output_bytes,
+        then one {"type": "plot", ...} / {"type": "dataframe", ...} per captured object,
+        and finally {"type": "result", "result": <the execute_code dict>}.
+        """
         language = language.lower()
         execution_id = str(uuid.uuid4())
-        
-        result = {
-            "execution_id": execution_id,
-            "status": "error",
-            "stdout": "",
-            "stderr": "",
-            "result": None,
-            "plots": [],
-            "dataframes": []
+        streams = {
+            "python": self._stream_python,
+            "bash": self._stream_bash,
+            "c": self._stream_c,
+            "java": self._stream_java,
         }
-        
+
         try:
-            if language == "python":
-                return self._execute_python(code, execution_id)
-            elif language == "bash":
-                return self._execute_bash(code, execution_id)
-            elif language == "sql":
-                return self._execute_sql(code, execution_id)
-            elif language == "c":
-                return self._execute_c(code, execution_id)
-            elif language == "java":
-                return self._execute_java(code, execution_id)
+            if language == "sql":
+                result = self._execute_sql(code, execution_id, params)
+            elif language in streams:
+                result = yield from streams[language](code, execution_id)
             else:
-                result["stderr"] = f"Unsupported language: {language}"
+                result = self._result(execution_id, stderr=f"Unsupported language: {language}")
         except Exception as e:
-            result["stderr"] = str(e)
-        
-        return result
+            result = self._result(execution_id, stderr=str(e))
 
-    def _execute_python(self, code: str, execution_id: str) -> dict:
-        output_buffer = io.StringIO()
-        error_buffer = io.StringIO()
-        result = {
-            "execution_id": execution_id,
-            "status": "error",
-            "stdout": "",
-            "stderr": "",
-            "result": None,
-            "plots": [],
-            "dataframes": []
-        }
+        for plot in result["plots"]:
+            yield {"type": "plot", **plot}
+        for dataframe in result["dataframes"]:
+            yield {"type": "dataframe", **dataframe}
+        yield {"type": "result", "result": result}
+
+    async def aexecute_code_stream(self, code: str, language: str = "python", params=None) -> AsyncIterator[Dict[str, Any]]:
+        """execute_code_stream for async callers; the execution runs on a worker thread."""
+        events = self.execute_code_stream(code, language, params)
+        done = object()
+        try:
+            while True:
+                event = await asyncio.to_thread(next, events, done)
+                if event is done:
+                    break
+                yield event
+        finally:
+            await asyncio.to_thread(events.close)
+
+    def _stream_python(self, code: str, execution_id: str):
+        if self.use_kernel:
+            return (yield from self._stream_python_in_kernel(code, execution_id))
+
+        output_buffer = BoundedOutput(self.max_output_bytes)
+        error_buffer = BoundedOutput(self.max_output_bytes)
+        result = self._result(execution_id)
         
         try:
-            exec_dir = os.path.join(self.working_directory, execution_id)
-            os.makedirs(exec_dir, exist_ok=True)
             plt.switch_backend('Agg')
+            before = snapshot_dataframes(self.globals)
             
             with contextlib.redirect_stdout(output_buffer), contextlib.redirect_stderr(error_buffer):
                 exec_result = exec(code, self.globals)
 
-                if plt.get_fignums():
-                    for i, fig_num in enumerate(plt.get_fignums()):
-                        fig = plt.figure(fig_num)
-                        img_path = os.path.join(exec_dir, f"plot_{i}.png")
-                        fig.savefig(img_path)
-                        with open(img_path, "rb") as img_file:
-                            img_data = base64.b64encode(img_file.read()).decode('utf-8')
-                            result["plots"].append({
-                                "figure_number": fig_num,
-                                "data": img_data
-                            })
-
-                for var_name, var_value in self.globals.items():
-                    if isinstance(var_value, pd.DataFrame) and len(var_value) > 0:
-                        result["dataframes"].append({
-                            "name": var_name,
-                            "head": var_value.head().to_dict(),
-                            "shape": var_value.shape,
-                            "dtypes": str(var_value.dtypes)
-                        })
+                result["plots"] = collect_plots(self.plot_format, self.plot_dpi)
+                result["dataframes"] = collect_dataframes(self.globals, before)
                 
             result["status"] = "success"
             result["stdout"] = output_buffer.getvalue()
             result["result"] = exec_result
             
-        except Exception as e:
+        except Exception:
             result["status"] = "error"
+            result["stdout"] = output_buffer.getvalue()
             result["stderr"] = f"{error_buffer.getvalue()}\n{traceback.format_exc()}"
-        
+        finally:
+            # Figures from a failed run must not show up in the next one
+            plt.close("all")
+
+        # In-process code runs on this thread, so its output can only be passed on afterwards
+        if result["stdout"]:
+            yield {"type": "stdout", "data": result["stdout"]}
+        if result["stderr"]:
+            yield {"type": "stderr", "data": result["stderr"]}
         return result
 
-    def _execute_bash(self, code: str, execution_id: str) -> dict:
-        try:
-            completed = subprocess.run(
-                code, shell=True, capture_output=True, text=True, timeout=self.max_execution_time
-            )
-            return {
-                "execution_id": execution_id,
-                "status": "success" if completed.returncode == 0 else "error",
-                "stdout": completed.stdout,
-                "stderr": completed.stderr,
-                "result": None,
-                "plots": [],
-                "dataframes": []
-            }
-        except subprocess.TimeoutExpired:
-            return {
-                "execution_id": execution_id,
-                "status": "error",
-                "stdout": "",
-                "stderr": "Execution timed out.",
-                "result": None,
-                "plots": [],
-                "dataframes": []
-            }
-
-    def _execute_sql(self, code: str, execution_id: str) -> dict:
-        result = {
-            "execution_id": execution_id,
-            "status": "error",
-            "stdout": "",
-            "stderr": "",
-            "result": None,
-            "plots": [],
-            "dataframes": []
-        }
+    def _stream_python_in_kernel(self, code: str, execution_id: str):
+        request = {"mode": "code", "source": code, "cwd": self.working_directory, "collect_results": True,
+                   "persist": True, "plot_format": self.plot_format, "plot_dpi": self.plot_dpi,
+                   "max_output_bytes": self.max_output_bytes}
+        with self._kernel_lock:
+            if self._kernel is None or not self._kernel.alive:
+                self._kernel = get_kernel_pool().pin()
+            for event in self._kernel.run_stream(request, timeout=self.max_execution_time):
+                if event["type"] == "result":
+                    stderr = event["stderr"]
+                    if not self._kernel.alive:
+                        stderr += "\nThe Python session was restarted; variables from earlier executions are gone."
+                    return self._result(
+                        execution_id,
+                        status=event["status"],
+                        stdout=event["stdout"],
+                        stderr=stderr,
+                        plots=event["plots"],
+                        dataframes=event["dataframes"],
+                    )
+                yield event
+
+    def close(self) -> None:
+        """Stop the Python kernel; the session's globals are lost."""
+        with self._kernel_lock:
+            if self._kernel is not None:
+                self._kernel.close()
+                self._kernel = None
+
+    def _stream_command(self, args, execution_id: str, **popen_kwargs):
+        returncode, stdout, stderr = yield from stream_process(
+            args, timeout=self.max_execution_time, max_output_bytes=self.max_output_bytes, **popen_kwargs
+        )
+        return self._result(execution_id, status="success" if returncode == 0 else "error",
+                            stdout=stdout, stderr=stderr)
+
+    def _stream_bash(self, code: str, execution_id: str):
+        return (yield from self._stream_command(code, execution_id, shell=True))
+
+    @property
+    def sql_engine(self) -> SQLEngine:
+        if self._sql_engine is None:
+            self._sql_engine = SQLEngine.from_env(self.temp_sqlite_db, timeout=self.max_execution_time)
+        return self._sql_engine
+
+    def register_table(self, path: str, table_name: str = None) -> List[str]:
+        """Make a CSV or Excel file queryable from SQL; returns the table names created."""
+        return self.sql_engine.register_file(path, table_name)
+
+    def _execute_sql(self, code: str, execution_id: str, params=None) -> dict:
+        result = self._result(execution_id)
         try:
-            conn = sqlite3.connect(self.temp_sqlite_db)
-            cur = conn.cursor()
-            cur.execute(code)
-            if code.strip().lower().startswith("select"):
-                columns = [description[0] for description in cur.description]
-                rows = cur.fetchall()
-                df = pd.DataFrame(rows, columns=columns)
+            reports = self.sql_engine.execute(code, params=params, timeout=self.max_execution_time)
+        except Exception as e:
+            result["stderr"] = str(e)
+            return result
+
+        lines = []
+        for i, report in enumerate(reports, start=1):
+            if "columns" in report:
+                df = pd.DataFrame(report["rows"], columns=report["columns"])
+                more = " (more rows not fetched)" if report["truncated"] else ""
                 result["dataframes"].append({
-                    "name": "query_result",
+                    "name": "query_result" if i == 1 else f"query_result_{i}",
                     "head": df.head().to_dict(),
                     "shape": df.shape,
-                    "dtypes": str(df.dtypes)
+                    "dtypes": str(df.dtypes),
+                    "truncated": report["truncated"]
                 })
+                lines.append(f"Statement {i}: {len(df)} rows{more} in {report['elapsed_ms']:.1f} ms")
+            elif report["rowcount"] >= 0:
+                lines.append(f"Statement {i}: {report['rowcount']} rows affected in {report['elapsed_ms']:.1f} ms")
             else:
-                conn.commit()
-
-            result["status"] = "success"
-            result["stdout"] = "Query executed successfully."
-
-        except Exception as e:
-            result["stderr"] = str(e)
-        finally:
-            conn.close()
+                lines.append(f"Statement {i}: done in {report['elapsed_ms']:.1f} ms")
 
+        result["status"] = "success"
+        result["stdout"] = "\n".join(["Query executed successfully."] + lines)
+        result["result"] = {
+            "statements": [{k: v for k, v in report.items() if k not in ("rows", "columns")} for report in reports],
+            "elapsed_ms": round(sum(report["elapsed_ms"] for report in reports), 3),
+        }
         return result
 
-    def _execute_c(self, code: str, execution_id: str) -> dict:
-        temp_dir = tempfile.mkdtemp()
-        source_path = os.path.join(temp_dir, "program.c")
-        binary_path = os.path.join(temp_dir, "program")
-
-        try:
-            with open(source_path, "w") as f:
-                f.write(code)
+    def _compile(self, language: str, code: str, source_name: str, command: List[str], execution_id: str):
+        """Build `code` with `command` (run in the build directory), reusing a cached build of the same source.
 
-            compile_proc = subprocess.run(
-                ["gcc", source_path, "-o", binary_path],
-                capture_output=True, text=True, timeout=self.max_execution_time
-            )
-            if compile_proc.returncode != 0:
-                return {
-                    "execution_id": execution_id,
-                    "status": "error",
-                    "stdout": compile_proc.stdout,
-                    "stderr": compile_proc.stderr,
-                    "result": None,
-                    "plots": [],
-                    "dataframes": []
-                }
-
-            run_proc = subprocess.run(
-                [binary_path],
-                capture_output=True, text=True, timeout=self.max_execution_time
-            )
-            return {
-                "execution_id": execution_id,
-                "status": "success" if run_proc.returncode == 0 else "error",
-                "stdout": run_proc.stdout,
-                "stderr": run_proc.stderr,
-                "result": None,
-                "plots": [],
-                "dataframes": []
-            }
-        except Exception as e:
-            return {
-                "execution_id": execution_id,
-                "status": "error",
-                "stdout": "",
-                "stderr": str(e),
-                "result": None,
-                "plots": [],
-                "dataframes": []
-            }
-
-    def _execute_java(self, code: str, execution_id: str) -> dict:
-        temp_dir = tempfile.mkdtemp()
-        source_path = os.path.join(temp_dir, "Main.java")
+        Returns (artifact_dir, None) on success and (None, error_result) when compilation fails.
+        """
+        key = build_key(language, code, command[0], command[1:])
+        artifact_dir = self.build_cache.lookup(key)
+        if artifact_dir is not None:
+            return artifact_dir, None
 
-        try:
-            with open(source_path, "w") as f:
+        with self.build_cache.staging() as build_dir:
+            with open(os.path.join(build_dir, source_name), "w") as f:
                 f.write(code)
+            compiled = yield from self._stream_command(command, execution_id, cwd=build_dir)
+            if compiled["status"] != "success":
+                return None, compiled
+            return self.build_cache.store(key, build_dir), None
 
-            compile_proc = subprocess.run(
-                ["javac", source_path],
-                capture_output=True, text=True, timeout=self.max_execution_time
-            )
-            if compile_proc.returncode != 0:
-                return {
-                    "execution_id": execution_id,
-                    "status": "error",
-                    "stdout": compile_proc.stdout,
-                    "stderr": compile_proc.stderr,
-                    "result": None,
-                    "plots": [],
-                    "dataframes": []
-                }
-
-            run_proc = subprocess.run(
-                ["java", "-cp", temp_dir, "Main"],
-                capture_output=True, text=True, timeout=self.max_execution_time
+    def _stream_c(self, code: str, execution_id: str):
+        artifact_dir, error = yield from self._compile(
+            "c", code, "program.c", ["gcc", *C_COMPILE_FLAGS, "program.c", "-o", "program"], execution_id
+        )
+        if error is not None:
+            return error
+        return (yield from self._stream_command([os.path.join(artifact_dir, "program")], execution_id))
+
+    def _stream_java(self, code: str, execution_id: str):
+        artifact_dir, error = yield from self._compile(
+            "java", code, "Main.java", ["javac", *JAVA_COMPILE_FLAGS, "Main.java"], execution_id
+        )
+        if error is not None:
+            return error
+        if self.use_java_runner:
+            returncode, stdout, stderr = yield from get_java_runner().run_stream(
+                artifact_dir, timeout=self.max_execution_time, max_output_bytes=self.max_output_bytes
             )
-            return {
-                "execution_id": execution_id,
-                "status": "success" if run_proc.returncode == 0 else "error",
-                "stdout": run_proc.stdout,
-                "stderr": run_proc.stderr,
-                "result": None,
-                "plots": [],
-                "dataframes": []
-            }
-        except Exception as e:
-            return {
-                "execution_id": execution_id,
-                "status": "error",
-                "stdout": "",
-                "stderr": str(e),
-                "result": None,
-                "plots": [],
-                "dataframes": []
-            }
+            return self._result(execution_id, status="success" if returncode == 0 else "error",
+                                stdout=stdout, stderr=stderr)
+        return (yield from self._stream_command(["java", "-cp", artifact_dir, "Main"], execution_id))
@@ -0,0 +1,185 @@
+"""Token budgeting for the messages the assistant node sends to the LLM"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+# Rough average for English text with the Gemini/Llama tokenizers; avoids a network call per count
+CHARS_PER_TOKEN = 4
+
+SUMMARY_PROMPT = (
+    "Summarize the following earlier part of a conversation between a user and an assistant. "
+    "Keep facts, numbers, names, file paths and decisions that may matter later. Be concise."
+)
+
+
+def message_text(message: BaseMessage) -> str:
+    """Plain text of a message, including any tool call arguments."""
+    content = message.content
+    if isinstance(content, list):
+        content = "".join(part if isinstance(part, str) else str(part.get("text", "")) for part in content)
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        content += json.dumps([{"name": c["name"], "args": c["args"]} for c in tool_calls])
+    return content
+
+
+def estimate_tokens(message: BaseMessage) -> int:
+    # A few tokens of per-message overhead for role markers
+    return len(message_text(message)) // CHARS_PER_TOKEN + 4
+
+
+def truncate_tool_message(message: ToolMessage, max_tokens: int) -> ToolMessage:
+    """Keep the head and tail of an oversized tool output."""
+    content = message.content if isinstance(message.content, str) else message_text(message)
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(content) <= max_chars:
+        return message
+    head = content[: max_chars * 3 // 4]
+    tail = content[-(max_chars // 4):]
+    omitted = len(content) - len(head) - len(tail)
+    truncated = f"{head}\n\n[... {omitted} characters truncated to fit the context budget ...]\n\n{tail}"
+    return message.model_copy(update={"content": truncated})
+
+
+def omit_tool_message(message: ToolMessage) -> ToolMessage:
+    """Replace a tool output with a note, keeping the message so it still answers its tool call."""
+    omitted = len(message_text(message))
+    return message.model_copy(update={"content": f"[{omitted} characters of tool output omitted to fit the context budget]"})
+
+
+class ContextManager:
+    """Fits the system prompt and conversation into a token budget before each LLM call.
+
+    Oversized ToolMessages are cut to `max_tool_tokens`. If the result is still over
+    `max_context_tokens`, whole earlier turns (from one HumanMessage up to the next) are
+    dropped, and replaced with a summary when a `summarizer` model is configured, so
+    tool calls and their results are never separated. If the latest turn alone is still
+    over budget, its earlier tool outputs are cut further, oldest first, to `min_tool_tokens`
+    and then to a short note; the newest tool results stay at `max_tool_tokens`. The graph state is
+    left intact.
+    """
+    def __init__(self, max_context_tokens: int = 24000, max_tool_tokens: int = 2000,
+                 summarizer=None, summary_cache_size: int = 128, min_tool_tokens: int = 200):
+        self.max_context_tokens = max_context_tokens
+        self.max_tool_tokens = max_tool_tokens
+        self.min_tool_tokens = min_tool_tokens
+        self.summarizer = summarizer
+        self.summary_cache_size = summary_cache_size
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._summaries_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, summarizer=None) -> "ContextManager":
+        return cls(
+            max_context_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "24000")),
+            max_tool_tokens=int(os.getenv("CONTEXT_MAX_TOOL_TOKENS", "2000")),
+            summarizer=summarizer,
+        )
+
+    def prepare(self, sys_msg: SystemMessage, messages: List[BaseMessage]) -> Tuple[List[BaseMessage], dict]:
+        """Return the messages to send to the LLM and a token report."""
+        kept, dropped, report = self._fit(sys_msg, messages)
+        summary = None
+        if dropped and self.summarizer is not None:
+            summary = self._cached_summary(dropped)
+            if summary is None:
+                try:
+                    summary = self.summarizer.invoke(self._summary_request(dropped)).content
+                except Exception as e:
+                    # The turns are still dropped, just without a summary in their place
+                    print(f"Warning: summarizing {len(dropped)} earlier messages failed: {e}")
+                else:
+                    self._store_summary(dropped, summary)
+        return self._finish(sys_msg, kept, summary, report)
+
+    async def aprepare(self, sys_msg: SystemMessage, messages: List[BaseMessage]) -> Tuple[List[BaseMessage], dict]:
+        kept, dropped, report = self._fit(sys_msg, messages)
+        summary = None
+        if dropped and self.summarizer is not None:
+            summary = self._cached_summary(dropped)
+            if summary is None:
+                try:
+                    summary = (await self.summarizer.ainvoke(self._summary_request(dropped))).content
+                except Exception as e:
+                    print(f"Warning: summarizing {len(dropped)} earlier messages failed: {e}")
+                else:
+                    self._store_summary(dropped, summary)
+        return self._finish(sys_msg, kept, summary, report)
+
+    def _fit(self, sys_msg: SystemMessage, messages: List[BaseMessage]):
+        original_tokens = estimate_tokens(sys_msg) + sum(estimate_tokens(m) for m in messages)
+
+        original = messages
+        messages = [
+            truncate_tool_message(m, self.max_tool_tokens) if isinstance(m, ToolMessage) else m
+            for m in original
+        ]
+        tokens = [estimate_tokens(m) for m in messages]
+        total = estimate_tokens(sys_msg) + sum(tokens)
+
+        # Drop whole turns from the front, always keeping the latest one
+        turn_starts = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+        cut = 0
+        for start in turn_starts[1:]:
+            if total <= self.max_context_tokens:
+                break
+            total -= sum(tokens[cut:start])
+            cut = start
+
+        # A long tool loop in the latest turn: shrink its older tool outputs, keeping the newest
+        # results (those after the last AI message) that the model is about to read. Outputs are
+        # first cut to `min_tool_tokens`, then replaced by a note; the tool call itself stays
+        last_ai = max((i for i, m in enumerate(messages) if i >= cut and m.type == "ai"), default=cut)
+        for shrink in (lambda m: truncate_tool_message(m, self.min_tool_tokens), omit_tool_message):
+            for i in range(cut, last_ai):
+                if total <= self.max_context_tokens:
+                    break
+                if isinstance(messages[i], ToolMessage):
+                    messages[i] = shrink(messages[i])
+                    shrunk = estimate_tokens(messages[i])
+                    total -= tokens[i] - shrunk
+                    tokens[i] = shrunk
+
+        report = {
+            "original_tokens": original_tokens,
+            "truncated_tool_messages": sum(
+                1 for before, after in zip(original, messages) if before is not after
+            ),
+            "dropped_messages": cut,
+        }
+        return messages[cut:], messages[:cut], report
+
+    def _finish(self, sys_msg, kept, summary, report):
+        if summary:
+            sys_msg = SystemMessage(content=f"{sys_msg.content}\n\nSummary of the earlier conversation:\n{summary}")
+        final = [sys_msg] + kept
+        report["final_tokens"] = sum(estimate_tokens(m) for m in final)
+        report["saved_tokens"] = max(report["original_tokens"] - report["final_tokens"], 0)
+        return final, report
+
+    def _summary_request(self, dropped: List[BaseMessage]) -> List[BaseMessage]:
+        transcript = "\n".join(f"{m.type}: {message_text(m)}" for m in dropped)
+        return [SystemMessage(content=SUMMARY_PROMPT), HumanMessage(content=transcript)]
+
+    @staticmethod
+    def _summary_key(dropped: List[BaseMessage]) -> str:
+        last = dropped[-1]
+        return f"{last.id or id(last)}:{len(dropped)}"
+
+    def _cached_summary(self, dropped: List[BaseMessage]) -> Optional[str]:
+        key = self._summary_key(dropped)
+        with self._summaries_lock:
+            summary = self._summaries.get(key)
+            if summary is not None:
+                self._summaries.move_to_end(key)
+        return summary
+
+    def _store_summary(self, dropped: List[BaseMessage], summary: str) -> None:
+        with self._summaries_lock:
+            self._summaries[self._summary_key(dropped)] = summary
+            while len(self._summaries) > self.summary_cache_size:
+                self._summaries.popitem(last=False)
@@ -0,0 +1,206 @@
+"""Server-side conversation storage: a LangGraph checkpointer on SQLite with an in-memory LRU front"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Iterator, Optional, Sequence
+
+from langgraph.checkpoint.base import BaseCheckpointSaver, CheckpointTuple, copy_checkpoint
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+
+class LRUCheckpointSaver(BaseCheckpointSaver):
+    """Caches the latest checkpoint of recently active threads in front of a SqliteSaver.
+
+    Every checkpoint is written through to SQLite, so conversations survive restarts and
+    can be read by other processes; reads of the latest checkpoint of a hot conversation
+    are served from memory. Threads idle for longer than `ttl_seconds` are deleted.
+
+    With `shared`, several processes (uvicorn workers) write the same database, so a
+    cached checkpoint is used only while it is still the thread's latest one in SQLite;
+    that check is one indexed lookup, far cheaper than loading and deserializing it.
+    """
+    def __init__(self, db_path: str, cache_size: int = 256, ttl_seconds: float = 7 * 24 * 3600,
+                 prune_interval: float = 600, shared: bool = False):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.saver = SqliteSaver(self.conn)
+        self.saver.setup()
+        super().__init__(serde=self.saver.serde)
+
+        self.cache_size = cache_size
+        self.ttl_seconds = ttl_seconds
+        self.prune_interval = prune_interval
+        self.shared = shared
+        self._cache: "OrderedDict[tuple, CheckpointTuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._last_prune = 0.0
+        self.hits = 0
+        self.misses = 0
+
+        with self.saver.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversation_activity "
+                "(thread_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+            )
+
+    # ---- cache helpers ----
+
+    @staticmethod
+    def _key(config) -> tuple:
+        configurable = config["configurable"]
+        return str(configurable["thread_id"]), configurable.get("checkpoint_ns", "")
+
+    def _cache_get(self, key) -> Optional[CheckpointTuple]:
+        with self._cache_lock:
+            item = self._cache.get(key)
+            if item is not None:
+                self._cache.move_to_end(key)
+            return item
+
+    def _cache_set(self, key, item: CheckpointTuple) -> None:
+        with self._cache_lock:
+            self._cache[key] = item
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _cache_drop(self, thread_id: str) -> None:
+        with self._cache_lock:
+            for key in [k for k in self._cache if k[0] == thread_id]:
+                del self._cache[key]
+
+    def _is_latest(self, key, item: CheckpointTuple) -> bool:
+        """Whether `item` is still the newest checkpoint of its thread in the database."""
+        with self.saver.lock:
+            row = self.conn.execute(
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT 1", key
+            ).fetchone()
+        return row is not None and row[0] == item.config["configurable"]["checkpoint_id"]
+
+    def _touch(self, thread_id: str) -> None:
+        now = time.time()
+        with self.saver.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO conversation_activity (thread_id, updated_at) VALUES (?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (thread_id, now),
+            )
+        if now - self._last_prune > self.prune_interval:
+            self._last_prune = now
+            self.prune_expired()
+
+    def prune_expired(self) -> int:
+        """Delete conversations idle for longer than the TTL; returns how many were removed."""
+        cutoff = time.time() - self.ttl_seconds
+        with self.saver.lock:
+            rows = self.conn.execute(
+                "SELECT thread_id FROM conversation_activity WHERE updated_at < ?", (cutoff,)
+            ).fetchall()
+        for (thread_id,) in rows:
+            self.delete_thread(thread_id)
+        return len(rows)
+
+    # ---- BaseCheckpointSaver ----
+
+    def get_tuple(self, config) -> Optional[CheckpointTuple]:
+        if config["configurable"].get("checkpoint_id"):
+            return self.saver.get_tuple(config)
+
+        key = self._key(config)
+        item = self._cache_get(key)
+        if item is not None and (not self.shared or self._is_latest(key, item)):
+            self.hits += 1
+            return item
+
+        self.misses += 1
+        item = self.saver.get_tuple(config)
+        if item is not None:
+            self._cache_set(key, item)
+        return item
+
+    def list(self, config, *, filter=None, before=None, limit=None) -> Iterator[CheckpointTuple]:
+        return self.saver.list(config, filter=filter, before=before, limit=limit)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        next_config = self.saver.put(config, checkpoint, metadata, new_versions)
+        parent_config = config if config["configurable"].get("checkpoint_id") else None
+        self._cache_set(self._key(next_config), CheckpointTuple(
+            config=next_config,
+            checkpoint=copy_checkpoint(checkpoint),
+            metadata=metadata,
+            parent_config=parent_config,
+            pending_writes=[],
+        ))
+        self._touch(str(next_config["configurable"]["thread_id"]))
+        return next_config
+
+    def put_writes(self, config, writes: Sequence[tuple], task_id: str, task_path: str = "") -> None:
+        self.saver.put_writes(config, writes, task_id, task_path)
+        # Pending writes belong to the cached checkpoint; reload it from SQLite on next read
+        key = self._key(config)
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached.config["configurable"]["checkpoint_id"] == config["configurable"].get("checkpoint_id"):
+                del self._cache[key]
+
+    def delete_thread(self, thread_id: str) -> None:
+        thread_id = str(thread_id)
+        self.saver.delete_thread(thread_id)
+        self._cache_drop(thread_id)
+        with self.saver.lock, self.conn:
+            self.conn.execute("DELETE FROM conversation_activity WHERE thread_id = ?", (thread_id,))
+
+    def get_next_version(self, current, channel):
+        return self.saver.get_next_version(current, channel)
+
+    def get_delta_channel_history(self, *args, **kwargs):
+        return self.saver.get_delta_channel_history(*args, **kwargs)
+
+    # SqliteSaver is synchronous; local SQLite calls are short, so run them in a thread
+
+    async def aget_tuple(self, config) -> Optional[CheckpointTuple]:
+        # A shared cache entry has to be checked against SQLite first, which happens in the thread
+        if not self.shared and not config["configurable"].get("checkpoint_id"):
+            item = self._cache_get(self._key(config))
+            if item is not None:
+                self.hits += 1
+                return item
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes: Sequence[tuple], task_id: str, task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    async def aget_delta_channel_history(self, *args, **kwargs):
+        return await asyncio.to_thread(self.saver.get_delta_channel_history, *args, **kwargs)
+
+    @property
+    def stats(self) -> dict:
+        return {"cached_threads": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+def build_checkpointer() -> LRUCheckpointSaver:
+    """Create the conversation checkpointer from environment configuration."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return LRUCheckpointSaver(
+        db_path=os.getenv("CONVERSATION_DB_PATH", os.path.join(script_dir, "conversations.db")),
+        cache_size=int(os.getenv("CONVERSATION_CACHE_SIZE", "256")),
+        ttl_seconds=float(os.getenv("CONVERSATION_TTL_SECONDS", str(7 * 24 * 3600))),
+        shared=os.getenv("CONVERSATION_CACHE_SHARED", "False").lower() == "true",
+    )
+
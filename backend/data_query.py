@@ -0,0 +1,217 @@
+"""Restricted select/filter/groupby/aggregate/sort queries over CSV and Excel files"""
+import json
+import os
+from typing import Any, Dict, List, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from table_stats import NUMERIC_KINDS, arrow_schema, get_data_cache, infer_kinds, read_chunks
+
+MAX_RESULT_ROWS = int(os.getenv("DATA_QUERY_MAX_ROWS", "50"))
+
+# Spec aggregation -> (pyarrow hash aggregation, options)
+AGGREGATIONS = {
+    "count": ("count", None),
+    "sum": ("sum", None),
+    "mean": ("mean", None),
+    "min": ("min", None),
+    "max": ("max", None),
+    "median": ("approximate_median", None),
+    "std": ("stddev", pc.VarianceOptions(ddof=1)),
+    "nunique": ("count_distinct", None),
+}
+FILTER_OPS = ("==", "=", "!=", "<", "<=", ">", ">=", "in", "not in", "contains", "is_null", "not_null")
+
+
+class QuerySpecError(ValueError):
+    """Raised for a query spec that uses unknown columns, operators or aggregations."""
+
+
+def parse_spec(spec: Union[str, dict]) -> dict:
+    """Validate a query spec and fill in defaults.
+
+    Keys (all optional): select [columns], filter [{column, op, value}], groupby [columns],
+    agg {column: aggregation or [aggregations]}, sort [{column, descending}] and limit.
+    """
+    if isinstance(spec, str):
+        try:
+            spec = json.loads(spec) if spec.strip() else {}
+        except json.JSONDecodeError as e:
+            raise QuerySpecError(f"spec is not valid JSON: {e}")
+    if not isinstance(spec, dict):
+        raise QuerySpecError("spec must be a JSON object")
+    unknown = set(spec) - {"select", "filter", "groupby", "agg", "sort", "limit"}
+    if unknown:
+        raise QuerySpecError(f"unknown spec keys: {', '.join(sorted(unknown))}")
+
+    as_list = lambda value: [value] if isinstance(value, (str, dict)) else list(value or [])
+    parsed = {
+        "select": as_list(spec.get("select")),
+        "filter": as_list(spec.get("filter")),
+        "groupby": as_list(spec.get("groupby")),
+        "agg": {column: as_list(funcs) for column, funcs in (spec.get("agg") or {}).items()},
+        "sort": [{"column": s} if isinstance(s, str) else s for s in as_list(spec.get("sort"))],
+        "limit": min(int(spec.get("limit") or MAX_RESULT_ROWS), MAX_RESULT_ROWS),
+    }
+    for condition in parsed["filter"]:
+        if condition.get("op", "==") not in FILTER_OPS:
+            raise QuerySpecError(f"unsupported filter op {condition.get('op')!r}; use one of {', '.join(FILTER_OPS)}")
+    for funcs in parsed["agg"].values():
+        for func in funcs:
+            if func not in AGGREGATIONS:
+                raise QuerySpecError(f"unsupported aggregation {func!r}; use one of {', '.join(AGGREGATIONS)}")
+    return parsed
+
+
+def referenced_columns(spec: dict) -> Optional[List[str]]:
+    """Columns a query needs to read, or None when it returns whole rows."""
+    if not (spec["select"] or spec["groupby"] or spec["agg"]):
+        return None
+    columns = list(spec["select"]) + [c["column"] for c in spec["filter"]] + list(spec["groupby"]) + list(spec["agg"])
+    if not spec["agg"] and not spec["groupby"]:
+        columns += [s["column"] for s in spec["sort"]]
+    return list(dict.fromkeys(columns))
+
+
+def _check_columns(columns: List[str], kinds: Dict[str, str]) -> None:
+    missing = [c for c in columns if c not in kinds]
+    if missing:
+        raise QuerySpecError(f"unknown columns: {', '.join(missing)}; available: {', '.join(kinds)}")
+
+
+def _typed_value(kind: str, value: Any) -> Any:
+    # The LLM often sends numbers as strings; compare numeric columns with numbers
+    if isinstance(value, (list, tuple, set)):
+        return [_typed_value(kind, v) for v in value]
+    if kind in NUMERIC_KINDS and isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            raise QuerySpecError(f"{value!r} is not a number")
+    if kind not in NUMERIC_KINDS and value is not None and not isinstance(value, str):
+        return str(value)
+    return value
+
+
+def filter_expression(conditions: List[dict], kinds: Dict[str, str]) -> Optional[pc.Expression]:
+    """AND of the filter conditions as a pyarrow expression (None for no conditions)."""
+    _check_columns([c["column"] for c in conditions], kinds)
+    expression = None
+    for condition in conditions:
+        field = pc.field(condition["column"])
+        op = condition.get("op", "==")
+        value = _typed_value(kinds[condition["column"]], condition.get("value"))
+        if op in ("==", "="):
+            term = field == value
+        elif op == "!=":
+            term = field != value
+        elif op == "<":
+            term = field < value
+        elif op == "<=":
+            term = field <= value
+        elif op == ">":
+            term = field > value
+        elif op == ">=":
+            term = field >= value
+        elif op == "in":
+            term = field.isin(value)
+        elif op == "not in":
+            term = ~field.isin(value)
+        elif op == "contains":
+            term = pc.match_substring(field, str(value), ignore_case=True)
+        elif op == "is_null":
+            term = field.is_null()
+        else:
+            term = field.is_valid()
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def load_table(path: str, columns: Optional[List[str]], conditions: List[dict]):
+    """(Arrow table of the rows matching `conditions` with only `columns` (all when None), column kinds).
+
+    With the data cache, only those columns of the Parquet copy are read and the filter is
+    applied while reading; otherwise the file is filtered chunk by chunk.
+    """
+    cache = get_data_cache()
+    if cache is not None:
+        summary, parquet_path = cache.load(path)
+        kinds = summary["kinds"]
+    else:
+        kinds = infer_kinds(path)
+    columns = list(kinds) if columns is None else columns
+    _check_columns(columns, kinds)
+    expression = filter_expression(conditions, kinds)
+
+    if cache is not None:
+        return pq.read_table(parquet_path, columns=columns, filters=expression), kinds
+
+    subset = {name: kinds[name] for name in columns}
+    schema = arrow_schema(subset)
+    parts = []
+    for chunk in read_chunks(path, subset, strict=False):
+        table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+        parts.append(table.filter(expression) if expression is not None else table)
+    return (pa.concat_tables(parts) if parts else schema.empty_table()), kinds
+
+
+def run_query(path: str, spec: Union[str, dict]) -> pd.DataFrame:
+    """Evaluate a query spec against a CSV/Excel file and return at most `limit` result rows.
+
+    Filtering, grouping, aggregation and top-k run on Arrow tables; only the limited
+    result is converted to pandas. Medians are approximate (t-digest).
+    """
+    spec = parse_spec(spec)
+    table, kinds = load_table(path, referenced_columns(spec), spec["filter"])
+    matched = table.num_rows
+    int_columns = {name for name, kind in kinds.items() if kind == "int"}
+
+    if spec["groupby"] or spec["agg"]:
+        aggregations, names = [], {}
+        for column, funcs in spec["agg"].items():
+            for func in funcs:
+                name, options = AGGREGATIONS[func]
+                aggregations.append((column, name, options) if options else (column, name))
+                names[f"{column}_{name}"] = f"{func}({column})"
+                if func in ("sum", "min", "max") and column in int_columns:
+                    int_columns.add(f"{func}({column})")
+        if not aggregations:
+            aggregations, names = [([], "count_all")], {"count_all": "count"}
+        result = table.group_by(spec["groupby"]).aggregate(aggregations)
+        # pyarrow names aggregates "<column>_<function>" and orders the group keys differently across versions
+        result = result.rename_columns([names.get(name, name) for name in result.column_names])
+        result = result.select(spec["groupby"] + list(names.values()))
+    else:
+        result = table
+
+    total = result.num_rows
+    if spec["sort"]:
+        keys = [(s["column"], "descending" if s.get("descending") else "ascending") for s in spec["sort"]]
+        _check_columns([column for column, _ in keys], dict.fromkeys(result.column_names))
+        if result.num_rows > spec["limit"]:
+            # Top-k without sorting everything
+            result = result.take(pc.select_k_unstable(result, spec["limit"], keys))
+        result = result.sort_by(keys)
+    if spec["select"] and not (spec["groupby"] or spec["agg"]):
+        # Projected after sorting so the sort keys need not be selected
+        result = result.select(spec["select"])
+
+    frame = result.slice(0, spec["limit"]).to_pandas()
+    for name in frame.columns:
+        # Integer columns are stored as float64 so they can hold missing values
+        if name in int_columns:
+            frame[name] = frame[name].astype("Int64")
+    frame.attrs.update(matched_rows=matched, total_rows=total)
+    return frame
+
+
+def format_result(result: pd.DataFrame) -> str:
+    """Compact text for the LLM: row counts, then the (limited) result table."""
+    matched = result.attrs.get("matched_rows", len(result))
+    total = result.attrs.get("total_rows", len(result))
+    text = f"{matched} rows matched the filter; {total} result rows"
+    text += f", showing the first {len(result)}.\n" if total > len(result) else ".\n"
+    return text + (result.to_string(index=False) if len(result) else "(no rows)")
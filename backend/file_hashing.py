@@ -0,0 +1,24 @@
+"""Content hashes of files; kept free of heavy imports so OCR workers can use it"""
+import hashlib
+import os
+import threading
+from typing import Dict
+
+_hashes: Dict[tuple, str] = {}
+_hashes_lock = threading.Lock()
+
+
+def file_hash(path: str) -> str:
+    """Content hash of a file, remembered per (path, size, mtime) so unchanged files are hashed once."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _hashes_lock:
+        if key in _hashes:
+            return _hashes[key]
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(8 * 1024 * 1024), b""):
+            digest.update(block)
+    with _hashes_lock:
+        _hashes[key] = digest.hexdigest()
+    return _hashes[key]
@@ -0,0 +1,252 @@
+"""Shared pooled HTTP client for the web tools, with conditional requests and bounded text extraction"""
+import asyncio
+import codecs
+import os
+import re
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (httpx[http2])
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+TEXT_CONTENT_TYPES = ("text/", "application/json", "application/xml", "application/xhtml+xml")
+
+
+class HTMLTextExtractor(HTMLParser):
+    """Incremental HTML-to-text conversion that stops collecting once `max_chars` are reached.
+
+    Feed it decoded chunks as they arrive and check `done` to stop reading the response.
+    """
+    SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "iframe", "canvas"}
+    BLOCK_TAGS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article",
+                  "header", "footer", "nav", "aside", "main", "table", "ul", "ol", "dl", "dt", "dd", "pre",
+                  "blockquote", "figure", "figcaption", "title", "hr", "form"}
+
+    def __init__(self, max_chars: int):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.size = 0
+        self.done = False
+        self._parts: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        if tag in self.BLOCK_TAGS:
+            self._append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in self.BLOCK_TAGS:
+            self._append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        if tag in self.BLOCK_TAGS:
+            self._append("\n")
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        text = " ".join(data.split())
+        if text:
+            self._append(text + " ")
+
+    def _append(self, text: str) -> None:
+        if self.done:
+            return
+        if self.size + len(text) >= self.max_chars:
+            text = text[:self.max_chars - self.size]
+            self.done = True
+        self._parts.append(text)
+        self.size += len(text)
+
+    def text(self) -> str:
+        text = "".join(self._parts)
+        text = re.sub(r"[ \t]*\n[ \t]*", "\n", text)
+        return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+class HttpClient:
+    """One pooled httpx.AsyncClient shared by every tool call in the process.
+
+    The client lives on a background event loop thread so synchronous tool threads and
+    async graph runs share the same connections. Responses are read as a stream and
+    abandoned once `max_bytes` (decompressed) or the character budget is reached.
+    ETag/Last-Modified validators of recent pages are kept so repeat fetches can be
+    answered with 304 Not Modified.
+    """
+    def __init__(self, timeout: float = 20, max_connections: int = 100, max_keepalive: int = 20,
+                 http2: bool = True, max_bytes: int = 5 * 1024 * 1024, max_chars: int = 20000,
+                 user_agent: str = None, validator_entries: int = 256):
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.validator_entries = validator_entries
+        self._client_kwargs = dict(
+            http2=self.http2,
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 10)),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive,
+                                keepalive_expiry=30),
+            follow_redirects=True,
+            headers={"User-Agent": user_agent or "Mozilla/5.0 (compatible; FigaroAgent/1.0)"},
+        )
+        # url -> (validators, text, truncated) of recently fetched pages
+        self._validators: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._validators_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._start_lock = threading.Lock()
+        self.stats = {"requests": 0, "not_modified": 0, "bytes": 0, "stopped_early": 0}
+
+    @classmethod
+    def from_env(cls) -> "HttpClient":
+        return cls(
+            timeout=float(os.getenv("HTTP_TIMEOUT", "20")),
+            max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive=int(os.getenv("HTTP_MAX_KEEPALIVE", "20")),
+            http2=os.getenv("HTTP_HTTP2", "True").lower() == "true",
+            max_bytes=int(os.getenv("HTTP_MAX_BYTES", str(5 * 1024 * 1024))),
+            max_chars=int(os.getenv("SCRAPE_MAX_CHARS", "20000")),
+            user_agent=os.getenv("USER_AGENT"),
+        )
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._start_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="http-client", daemon=True).start()
+                    self._client = asyncio.run_coroutine_threadsafe(self._make_client(), loop).result()
+                    self._loop = loop
+        return self._loop
+
+    async def _make_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(**self._client_kwargs)
+
+    def _submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._ensure_loop())
+
+    def fetch_text(self, url: str, max_chars: int = None, max_bytes: int = None) -> Dict[str, Any]:
+        """Fetch `url` and return {url, status, content_type, text, truncated, not_modified, bytes}."""
+        return self._submit(self._fetch_text(url, max_chars or self.max_chars, max_bytes or self.max_bytes)).result()
+
+    async def afetch_text(self, url: str, max_chars: int = None, max_bytes: int = None) -> Dict[str, Any]:
+        return await asyncio.wrap_future(
+            self._submit(self._fetch_text(url, max_chars or self.max_chars, max_bytes or self.max_bytes)))
+
+    def post_json(self, url: str, payload: dict, headers: Dict[str, str] = None) -> Any:
+        return self._submit(self._post_json(url, payload, headers)).result()
+
+    async def apost_json(self, url: str, payload: dict, headers: Dict[str, str] = None) -> Any:
+        return await asyncio.wrap_future(self._submit(self._post_json(url, payload, headers)))
+
+    async def _post_json(self, url: str, payload: dict, headers: Optional[Dict[str, str]]) -> Any:
+        self.stats["requests"] += 1
+        response = await self._client.post(url, json=payload, headers=headers)
+        response.raise_for_status()
+        self.stats["bytes"] += len(response.content)
+        return response.json()
+
+    async def _fetch_text(self, url: str, max_chars: int, max_bytes: int) -> Dict[str, Any]:
+        key = (url, max_chars)
+        with self._validators_lock:
+            cached = self._validators.get(key)
+        headers = {}
+        if cached is not None:
+            validators = cached[0]
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last-modified"):
+                headers["If-Modified-Since"] = validators["last-modified"]
+
+        self.stats["requests"] += 1
+        async with self._client.stream("GET", url, headers=headers) as response:
+            result = {"url": str(response.url), "status": response.status_code, "not_modified": False,
+                      "content_type": response.headers.get("content-type", "").split(";")[0].strip(),
+                      "bytes": 0, "truncated": False}
+            if response.status_code == 304 and cached is not None:
+                self.stats["not_modified"] += 1
+                await response.aread()  # an unread response would close the connection instead of reusing it
+                with self._validators_lock:
+                    self._validators.move_to_end(key)
+                return dict(result, text=cached[1], truncated=cached[2], not_modified=True)
+            response.raise_for_status()
+            if result["content_type"] and not result["content_type"].startswith(TEXT_CONTENT_TYPES):
+                raise ValueError(f"unsupported content type {result['content_type']} at {url}")
+
+            is_html = "html" in result["content_type"] or not result["content_type"]
+            extractor = HTMLTextExtractor(max_chars) if is_html else None
+            plain: List[str] = []
+            plain_size = 0
+            decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+            # Parsing runs in the default executor so a large page does not stall other requests on this loop
+            loop = asyncio.get_running_loop()
+            # Small chunks, so a highly compressed body is not decoded and parsed all at once
+            async for chunk in response.aiter_bytes(chunk_size=16 * 1024):
+                chunk = chunk[:max_bytes - result["bytes"]]
+                result["bytes"] += len(chunk)
+                text = decoder.decode(chunk)
+                if extractor is not None:
+                    await loop.run_in_executor(None, extractor.feed, text)
+                    full = extractor.done
+                else:
+                    plain.append(text)
+                    plain_size += len(text)
+                    full = plain_size >= max_chars
+                if full or result["bytes"] >= max_bytes:
+                    # Leaving the stream early closes this connection instead of reading the rest
+                    result["truncated"] = True
+                    self.stats["stopped_early"] += 1
+                    break
+            self.stats["bytes"] += result["bytes"]
+            if extractor is not None:
+                await loop.run_in_executor(None, extractor.close)
+                result["text"] = extractor.text()
+            else:
+                result["text"] = "".join(plain)[:max_chars]
+
+            validators = {name: response.headers[name] for name in ("etag", "last-modified") if name in response.headers}
+        if validators:
+            with self._validators_lock:
+                self._validators[key] = (validators, result["text"], result["truncated"])
+                self._validators.move_to_end(key)
+                while len(self._validators) > self.validator_entries:
+                    self._validators.popitem(last=False)
+        return result
+
+    def close(self) -> None:
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = self._client = None
+
+
+_http_client: Optional[HttpClient] = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """Process-wide HTTP client, configured from the environment on first use."""
+    global _http_client
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                _http_client = HttpClient.from_env()
+    return _http_client
+
+
+def format_page(result: Dict[str, Any]) -> str:
+    """Page text for the LLM, noting when it was cut at the character or byte budget."""
+    text = result["text"] or "(no text content)"
+    if result["truncated"]:
+        text += f"\n\n[Page truncated after {len(result['text'])} characters.]"
+    return text
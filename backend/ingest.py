@@ -0,0 +1,352 @@
+"""Incremental ingestion of a document directory into the FAISS index used by retriever_tool.
+
+Files are chunked and embedded in batches with the retriever's model. Only new or changed
+files are embedded, identical chunks are stored once (keyed by content hash), and chunks
+of changed or deleted files are removed. A manifest stored with the index records what
+has been ingested. Each run writes a new version directory and then points CURRENT at it.
+
+Usage (from the backend directory):
+    python ingest.py docs/ --index-path faiss_index --index-type flat|ivf|hnsw [--rebuild]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from file_hashing import file_hash
+from retrieval import (CURRENT_FILE, EMBEDDING_MODEL_NAME, INDEX_FILES, apply_search_params, current_index_dir,
+                       get_vector_store_manager)
+
+MANIFEST_FILE = "manifest.json"
+VERSION_PATTERN = re.compile(r"v\d+$")
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+TEXT_EXTENSIONS = (".txt", ".md", ".rst")
+HTML_EXTENSIONS = (".html", ".htm")
+# Same text the original index was built with from metadata.jsonl (see test.ipynb)
+DEFAULT_JSONL_TEMPLATE = "Question: {Question} Answer: {Final answer}"
+# IVF needs about this many training vectors per list for stable centroids
+IVF_TRAINING_PER_LIST = 39
+
+
+def chunk_id(text: str) -> str:
+    """Content hash of a chunk; also its docstore id, so identical chunks are stored once."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def iter_files(root: str) -> Iterator[str]:
+    """Supported files under `root`, relative to it, in a stable order."""
+    extensions = TEXT_EXTENSIONS + HTML_EXTENSIONS + (".pdf", ".jsonl")
+    for directory, subdirs, files in os.walk(root):
+        subdirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(extensions):
+                yield os.path.relpath(os.path.join(directory, name), root)
+
+
+def load_documents(path: str, source: str, jsonl_template: str = DEFAULT_JSONL_TEMPLATE) -> Iterator[Document]:
+    """Documents in one file: one per text/HTML file, per PDF page or per JSONL record."""
+    lower = path.lower()
+    if lower.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                try:
+                    text = jsonl_template.format(**record)
+                except (KeyError, IndexError):
+                    text = "\n".join(str(v) for v in record.values() if isinstance(v, (str, int, float)))
+                metadata = {"source": source, "line": line_number}
+                if "task_id" in record:
+                    metadata["task_id"] = record["task_id"]
+                yield Document(page_content=text, metadata=metadata)
+    elif lower.endswith(".pdf"):
+        import pymupdf
+        with pymupdf.open(path) as document:
+            for number, page in enumerate(document, 1):
+                yield Document(page_content=page.get_text(), metadata={"source": source, "page": number})
+    else:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            text = f.read()
+        if lower.endswith(HTML_EXTENSIONS):
+            from http_client import HTMLTextExtractor
+            extractor = HTMLTextExtractor(max_chars=len(text) + 1)
+            extractor.feed(text)
+            extractor.close()
+            text = extractor.text()
+        yield Document(page_content=text, metadata={"source": source})
+
+
+class IndexIngestor:
+    """Adds a directory's documents to a FAISS index incrementally.
+
+    `index_type` picks the FAISS index built for a new index: "flat" (exact), "ivf"
+    (inverted lists, trained on the first `nlist * 39` chunks) or "hnsw" (graph). An
+    existing index keeps the type recorded in its manifest unless rebuilt.
+    """
+    def __init__(self, index_path: str, embeddings=None, index_type: str = "flat", chunk_size: int = 1000,
+                 chunk_overlap: int = 150, batch_size: int = 256, nlist: int = 256, nprobe: int = 16,
+                 hnsw_m: int = 32, ef_search: int = 64, jsonl_template: str = DEFAULT_JSONL_TEMPLATE):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"index_type must be one of {', '.join(INDEX_TYPES)}")
+        self.index_path = index_path
+        self.embeddings = embeddings
+        self.index_type = index_type
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self.chunk_size, self.chunk_overlap = chunk_size, chunk_overlap
+        self.batch_size = batch_size
+        self.nlist, self.nprobe = nlist, nprobe
+        self.hnsw_m, self.ef_search = hnsw_m, ef_search
+        self.jsonl_template = jsonl_template
+
+    @classmethod
+    def from_env(cls, index_path: str = None, **overrides) -> "IndexIngestor":
+        settings = dict(
+            index_path=index_path or os.getenv("FAISS_INDEX_PATH", "faiss_index"),
+            index_type=os.getenv("FAISS_INDEX_TYPE", "flat"),
+            chunk_size=int(os.getenv("INGEST_CHUNK_SIZE", "1000")),
+            chunk_overlap=int(os.getenv("INGEST_CHUNK_OVERLAP", "150")),
+            batch_size=int(os.getenv("INGEST_BATCH_SIZE", "256")),
+            nlist=int(os.getenv("FAISS_IVF_NLIST", "256")),
+            nprobe=int(os.getenv("FAISS_NPROBE", "16")),
+            hnsw_m=int(os.getenv("FAISS_HNSW_M", "32")),
+            ef_search=int(os.getenv("FAISS_EF_SEARCH", "64")),
+        )
+        settings.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(**settings)
+
+    # ---- manifest and index files ----
+
+    def read_manifest(self) -> Optional[dict]:
+        try:
+            with open(os.path.join(current_index_dir(self.index_path), MANIFEST_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _load_store(self) -> Optional[FAISS]:
+        directory = current_index_dir(self.index_path)
+        if not all(os.path.exists(os.path.join(directory, name)) for name in INDEX_FILES):
+            return None
+        return FAISS.load_local(directory, embeddings=self.embeddings, allow_dangerous_deserialization=True)
+
+    def _save(self, store: FAISS, manifest: dict) -> None:
+        # Write a new version directory and publish it by replacing CURRENT in one step, so a
+        # reader never pairs the index file of one version with the docstore of another
+        os.makedirs(self.index_path, exist_ok=True)
+        previous = current_index_dir(self.index_path)
+        version = os.path.join(self.index_path, f"v{time.time_ns()}")
+        staging = tempfile.mkdtemp(dir=self.index_path, prefix=".ingest-")
+        try:
+            store.save_local(staging)
+            with open(os.path.join(staging, MANIFEST_FILE), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=1)
+            os.rename(staging, version)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        pointer = os.path.join(self.index_path, CURRENT_FILE + ".tmp")
+        with open(pointer, "w", encoding="utf-8") as f:
+            f.write(os.path.basename(version))
+        os.replace(pointer, os.path.join(self.index_path, CURRENT_FILE))
+        self._remove_old_versions(keep={version, previous})
+
+    def _remove_old_versions(self, keep: set) -> None:
+        # The previous version stays for readers that resolved CURRENT just before it changed
+        for name in os.listdir(self.index_path):
+            path = os.path.join(self.index_path, name)
+            if VERSION_PATTERN.match(name) and path not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+        if self.index_path not in keep:
+            # Files of an index written before versioning, directly in index_path
+            for name in INDEX_FILES + (MANIFEST_FILE,):
+                try:
+                    os.remove(os.path.join(self.index_path, name))
+                except FileNotFoundError:
+                    pass
+
+    # ---- index construction ----
+
+    def _new_index(self, dimension: int, training: Optional[np.ndarray] = None):
+        import faiss
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dimension, self.hnsw_m)
+            index.hnsw.efConstruction = max(40, 2 * self.hnsw_m)
+        elif self.index_type == "ivf":
+            # A small corpus cannot support many lists
+            nlist = max(1, min(self.nlist, len(training) // IVF_TRAINING_PER_LIST))
+            index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dimension), dimension, nlist)
+            index.train(training)
+        else:
+            index = faiss.IndexFlatL2(dimension)
+        apply_search_params(index, nprobe=self.nprobe, ef_search=self.ef_search)
+        return index
+
+    def _compact(self, store: FAISS, remove: set) -> FAISS:
+        """Drop the vectors of `remove` by re-adding the remaining ones to an empty copy of the index.
+
+        Works for every index type (HNSW cannot remove vectors, IVF would not renumber them)
+        and needs no re-embedding.
+        """
+        import faiss
+        index = store.index
+        if isinstance(index, faiss.IndexIVF):
+            index.make_direct_map()
+        keep = [position for position, doc_id in sorted(store.index_to_docstore_id.items()) if doc_id not in remove]
+        vectors = index.reconstruct_n(0, index.ntotal)[keep] if keep else None
+        stored = set(store.index_to_docstore_id.values())
+        fresh = faiss.clone_index(index)
+        fresh.reset()
+        if isinstance(fresh, faiss.IndexIVF):
+            fresh.set_direct_map_type(faiss.DirectMap.NoMap)
+        if vectors is not None:
+            fresh.add(vectors)
+        apply_search_params(fresh, nprobe=self.nprobe, ef_search=self.ef_search)
+        store.docstore.delete([doc_id for doc_id in remove if doc_id in stored])
+        store.index = fresh
+        store.index_to_docstore_id = {i: store.index_to_docstore_id[position] for i, position in enumerate(keep)}
+        return store
+
+    # ---- ingestion ----
+
+    def ingest(self, root: str, rebuild: bool = False, prune: bool = True) -> Dict:
+        """Bring the index up to date with the files under `root`; returns counters and timings."""
+        if self.embeddings is None:
+            self.embeddings = get_vector_store_manager().get_embeddings()
+        started = time.perf_counter()
+        manifest = None if rebuild else self.read_manifest()
+        store = None if rebuild else self._load_store()
+        if manifest is None:
+            if store is not None:
+                # An index built out of band: keep its vectors, they just are not tracked per file
+                print(f"{self.index_path} has no manifest; adding to its {store.index.ntotal} existing vectors.")
+            manifest = {"model": EMBEDDING_MODEL_NAME, "index_type": self.index_type, "files": {}}
+        elif manifest.get("model") != EMBEDDING_MODEL_NAME:
+            raise ValueError(f"{self.index_path} was built with {manifest.get('model')}; ingest with --rebuild")
+        elif manifest.get("index_type", "flat") != self.index_type:
+            print(f"{self.index_path} is a {manifest['index_type']} index; keeping that type (use --rebuild to change it).")
+            self.index_type = manifest["index_type"]
+        manifest.update(chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
+
+        stats = {"files_new": 0, "files_changed": 0, "files_unchanged": 0, "files_removed": 0,
+                 "chunks_added": 0, "chunks_duplicate": 0, "chunks_removed": 0, "embed_seconds": 0.0}
+        files: Dict[str, dict] = manifest["files"]
+        references: Dict[str, int] = {}
+        for entry in files.values():
+            for doc_id in entry["chunks"]:
+                references[doc_id] = references.get(doc_id, 0) + 1
+        known = set(store.index_to_docstore_id.values()) if store is not None else set()
+        released: List[str] = []
+        pending: List[tuple] = []  # (doc_id, text, metadata) waiting to be embedded
+        training: List[tuple] = []  # embedded batches held back until an IVF index can be trained
+        seen = set()
+        dirty = rebuild
+
+        def flush(final: bool = False) -> None:
+            nonlocal store
+            while pending and (final or len(pending) >= self.batch_size):
+                batch, pending[:] = pending[:self.batch_size], pending[self.batch_size:]
+                start = time.perf_counter()
+                vectors = np.asarray(self.embeddings.embed_documents([text for _, text, _ in batch]), dtype="float32")
+                stats["embed_seconds"] += time.perf_counter() - start
+                training.append((batch, vectors))
+                print(f"embedded {stats['chunks_added'] + sum(len(b) for b, _ in training)} chunks")
+                if store is None and self.index_type == "ivf" and not final and \
+                        sum(len(v) for _, v in training) < self.nlist * IVF_TRAINING_PER_LIST:
+                    continue
+                if store is None:
+                    all_vectors = np.concatenate([v for _, v in training])
+                    store = FAISS(embedding_function=self.embeddings,
+                                  index=self._new_index(all_vectors.shape[1], all_vectors),
+                                  docstore=InMemoryDocstore(), index_to_docstore_id={})
+                for held, held_vectors in training:
+                    store.add_embeddings([(text, vector) for (_, text, _), vector in zip(held, held_vectors)],
+                                         metadatas=[metadata for _, _, metadata in held],
+                                         ids=[doc_id for doc_id, _, _ in held])
+                    stats["chunks_added"] += len(held)
+                training.clear()
+
+        for source in iter_files(root):
+            seen.add(source)
+            path = os.path.join(root, source)
+            stat = os.stat(path)
+            entry = files.get(source)
+            if entry is not None and (entry["size"], entry["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+                stats["files_unchanged"] += 1
+                continue
+            content_hash = file_hash(path)
+            if entry is not None and entry["hash"] == content_hash:
+                entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                stats["files_unchanged"] += 1
+                dirty = True
+                continue
+
+            stats["files_changed" if entry is not None else "files_new"] += 1
+            if entry is not None:
+                released += entry["chunks"]
+            chunk_ids = []
+            for document in load_documents(path, source, self.jsonl_template):
+                for chunk in self.splitter.split_documents([document]):
+                    doc_id = chunk_id(chunk.page_content)
+                    chunk_ids.append(doc_id)
+                    references[doc_id] = references.get(doc_id, 0) + 1
+                    if doc_id in known:
+                        stats["chunks_duplicate"] += 1
+                        continue
+                    known.add(doc_id)
+                    pending.append((doc_id, chunk.page_content, chunk.metadata))
+            files[source] = {"hash": content_hash, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                             "chunks": chunk_ids}
+            dirty = True
+            flush()
+        flush(final=True)
+
+        if prune:
+            for source in [s for s in files if s not in seen]:
+                released += files.pop(source)["chunks"]
+                stats["files_removed"] += 1
+                dirty = True
+        remove = set()
+        for doc_id in released:
+            references[doc_id] -= 1
+            if references[doc_id] <= 0:
+                remove.add(doc_id)
+        if store is not None and remove:
+            store = self._compact(store, remove)
+            stats["chunks_removed"] = len(remove)
+
+        if store is not None and dirty:
+            manifest["dimension"] = store.index.d
+            self._save(store, manifest)
+        stats["vectors"] = store.index.ntotal if store is not None else 0
+        stats["seconds"] = time.perf_counter() - started
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory", help="directory of .txt/.md/.rst/.html/.pdf/.jsonl files")
+    parser.add_argument("--index-path", default=None)
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=None)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--rebuild", action="store_true", help="ignore the existing index and manifest")
+    parser.add_argument("--keep-deleted", action="store_true", help="keep chunks of files no longer in the directory")
+    args = parser.parse_args()
+
+    ingestor = IndexIngestor.from_env(args.index_path, index_type=args.index_type, batch_size=args.batch_size)
+    stats = ingestor.ingest(args.directory, rebuild=args.rebuild, prune=not args.keep_deleted)
+    print(json.dumps(stats, indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Long-lived JVM that runs compiled Java programs without paying JVM startup per run"""
+import os
+import struct
+import subprocess
+import threading
+import time
+from typing import Generator, Optional, Tuple
+
+from build_cache import BuildCache, build_key, get_build_cache
+from kernel_pool import KernelDied, KernelTimeout, _read_exact
+from output_capture import BoundedOutput
+
+FRAME = struct.Struct("!cI")
+
+# Loads Main from the class directory named on each stdin line with a fresh class loader,
+# so static state does not leak between runs, and frames its output on the real stdout:
+# 'O'/'E' + length + bytes for System.out/System.err, then 'X' + 4-byte exit status.
+RUNNER_SOURCE = r"""
+import java.io.*;
+import java.lang.reflect.InvocationTargetException;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+
+public class FigaroRunner {
+    private static final DataOutputStream channel =
+        new DataOutputStream(new BufferedOutputStream(new FileOutputStream(FileDescriptor.out)));
+
+    static synchronized void send(char kind, byte[] data, int off, int len) {
+        try {
+            channel.writeByte(kind);
+            channel.writeInt(len);
+            channel.write(data, off, len);
+            channel.flush();
+        } catch (IOException e) {
+            throw new UncheckedIOException(e);
+        }
+    }
+
+    static class FrameStream extends OutputStream {
+        private final char kind;
+        FrameStream(char kind) { this.kind = kind; }
+        @Override public void write(int b) { send(kind, new byte[]{(byte) b}, 0, 1); }
+        @Override public void write(byte[] b, int off, int len) { if (len > 0) send(kind, b, off, len); }
+    }
+
+    public static void main(String[] args) throws Exception {
+        BufferedReader requests = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        System.setIn(new ByteArrayInputStream(new byte[0]));
+        PrintStream out = new PrintStream(new BufferedOutputStream(new FrameStream('O'), 8192), false, "UTF-8");
+        PrintStream err = new PrintStream(new BufferedOutputStream(new FrameStream('E'), 8192), false, "UTF-8");
+        System.setOut(out);
+        System.setErr(err);
+        String classDir;
+        while ((classDir = requests.readLine()) != null) {
+            int status = 0;
+            URL[] path = {new File(classDir).toURI().toURL()};
+            try (URLClassLoader loader = new URLClassLoader(path, FigaroRunner.class.getClassLoader())) {
+                loader.loadClass("Main").getMethod("main", String[].class).invoke(null, (Object) new String[0]);
+            } catch (InvocationTargetException e) {
+                e.getCause().printStackTrace();
+                status = 1;
+            } catch (Throwable e) {
+                e.printStackTrace();
+                status = 1;
+            }
+            out.flush();
+            err.flush();
+            byte[] code = {(byte) (status >>> 24), (byte) (status >>> 16), (byte) (status >>> 8), (byte) status};
+            send('X', code, 0, 4);
+        }
+    }
+}
+"""
+
+
+class JavaRunner:
+    """One JVM that executes a compiled Main per request, one request at a time.
+
+    A program that calls System.exit or exceeds its timeout takes the JVM down with it;
+    the next run starts a fresh one.
+    """
+    def __init__(self, build_cache: BuildCache = None, javac: str = "javac", java: str = "java"):
+        self.build_cache = build_cache or get_build_cache()
+        self.javac = javac
+        self.java = java
+        self.process: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+
+    def _runner_dir(self) -> str:
+        key = build_key("java-runner", RUNNER_SOURCE, self.javac, [])
+        runner_dir = self.build_cache.lookup(key)
+        if runner_dir is None:
+            with self.build_cache.staging() as build_dir:
+                with open(os.path.join(build_dir, "FigaroRunner.java"), "w") as f:
+                    f.write(RUNNER_SOURCE)
+                subprocess.run([self.javac, "FigaroRunner.java"], cwd=build_dir, check=True,
+                               capture_output=True, timeout=120)
+                runner_dir = self.build_cache.store(key, build_dir)
+        return runner_dir
+
+    def _start(self) -> subprocess.Popen:
+        if self.process is None or self.process.poll() is not None:
+            self.process = subprocess.Popen(
+                [self.java, "-cp", self._runner_dir(), "FigaroRunner"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+        return self.process
+
+    def run_stream(self, class_dir: str, timeout: float = None,
+                   max_output_bytes: int = None) -> Generator[dict, None, Tuple[int, str, str]]:
+        """Run Main from `class_dir`; same events and return value as output_capture.stream_process."""
+        captures = {"stdout": BoundedOutput(max_output_bytes), "stderr": BoundedOutput(max_output_bytes)}
+        streams = {b"O": "stdout", b"E": "stderr"}
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._lock:
+            process = self._start()
+            fd = process.stdout.fileno()
+            try:
+                process.stdin.write(os.path.abspath(class_dir).encode("utf-8") + b"\n")
+                process.stdin.flush()
+                while True:
+                    kind, size = FRAME.unpack(_read_exact(fd, FRAME.size, deadline))
+                    data = _read_exact(fd, size, deadline)
+                    if kind == b"X":
+                        returncode = struct.unpack("!i", data)[0]
+                        break
+                    name = streams[kind]
+                    was_truncated = captures[name].truncated
+                    streamed = captures[name].write(data.decode("utf-8", errors="replace"))
+                    if streamed:
+                        yield {"type": name, "data": streamed}
+                    if captures[name].truncated and not was_truncated:
+                        yield {"type": "truncated", "stream": name}
+            except KernelTimeout:
+                self.close()
+                return -9, captures["stdout"].getvalue(), captures["stderr"].getvalue() + "Execution timed out."
+            except (KernelDied, BrokenPipeError):
+                # System.exit ends the JVM; its status is the program's exit code
+                returncode = process.wait()
+            except BaseException:
+                # The consumer stopped mid-run; the JVM may still be busy, so start over next time
+                self.close()
+                raise
+        return returncode, captures["stdout"].getvalue(), captures["stderr"].getvalue()
+
+    def close(self) -> None:
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.kill()
+            self.process.wait()
+            self.process = None
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_java_runner() -> JavaRunner:
+    """Return the process-wide JVM runner."""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = JavaRunner()
+    return _runner
+
+
+def java_runner_enabled() -> bool:
+    return os.getenv("JAVA_PERSISTENT_JVM", "False").lower() == "true"
@@ -0,0 +1,454 @@
+"""Pool of warm Python worker processes for running agent-submitted code"""
+import codecs
+import io
+import os
+import pickle
+import queue
+import select
+import struct
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import contextlib
+from typing import Iterator, Optional
+
+HEADER = struct.Struct("!Q")
+
+
+class KernelTimeout(Exception):
+    """Raised when a kernel does not answer within the execution timeout."""
+
+
+class KernelDied(Exception):
+    """Raised when a kernel process exits while running code."""
+
+
+def _write_frame(stream, obj) -> None:
+    data = pickle.dumps(obj)
+    stream.write(HEADER.pack(len(data)) + data)
+    stream.flush()
+
+
+def _read_exact(fd: int, size: int, deadline: Optional[float]) -> bytes:
+    chunks = []
+    while size:
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise KernelTimeout()
+        chunk = os.read(fd, min(size, 1 << 20))
+        if not chunk:
+            raise KernelDied()
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _read_frame(fd: int, timeout: Optional[float] = None):
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    (size,) = HEADER.unpack(_read_exact(fd, HEADER.size, deadline))
+    return pickle.loads(_read_exact(fd, size, deadline))
+
+
+class PythonKernel:
+    """One warm worker process; requests and results travel as pickled frames over its stdin/stdout."""
+    def __init__(self, memory_mb: int = 0, startup_timeout: float = 60):
+        backend_dir = os.path.dirname(os.path.abspath(__file__))
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [backend_dir, env.get("PYTHONPATH")]))
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--worker", str(memory_mb)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=env,
+        )
+        self.runs = 0
+        # Set when a run may have left state behind; the pool then replaces the kernel
+        self.retire = False
+        # The worker announces itself once numpy/pandas/matplotlib are imported
+        _read_frame(self.process.stdout.fileno(), startup_timeout)
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def execute(self, request: dict, timeout: float) -> Iterator[dict]:
+        """Yield the output events of one run, ending with its {"type": "result"} event."""
+        self.runs += 1
+        try:
+            _write_frame(self.process.stdin, request)
+        except BrokenPipeError:
+            raise KernelDied()
+        deadline = time.monotonic() + timeout
+        while True:
+            event = _read_frame(self.process.stdout.fileno(), max(deadline - time.monotonic(), 0))
+            if event["type"] == "result":
+                self.retire = self.retire or event.pop("retire", False)
+                yield event
+                return
+            yield event
+
+    def run_stream(self, request: dict, timeout: float) -> Iterator[dict]:
+        """Like execute, but a timeout or crash ends in an error result instead of raising.
+
+        The kernel is killed then, and also when the caller stops reading before the result,
+        since its remaining frames would otherwise be read as the next run's.
+        """
+        streamed = {"stdout": [], "stderr": []}
+        finished = False
+        try:
+            for event in self.execute(request, timeout):
+                if event["type"] in streamed:
+                    streamed[event["type"]].append(event["data"])
+                finished = event["type"] == "result"
+                yield event
+        except (KernelTimeout, KernelDied) as e:
+            if isinstance(e, KernelTimeout):
+                returncode, message = -9, "Execution timed out."
+            else:
+                returncode, message = self.process.wait(), "Execution process exited unexpectedly (possibly out of memory)."
+            self.kill()
+            finished = True
+            yield {"type": "result", "status": "error", "returncode": returncode,
+                   "stdout": "".join(streamed["stdout"]),
+                   "stderr": "".join(streamed["stderr"]) + message,
+                   "plots": [], "dataframes": []}
+        finally:
+            if not finished:
+                self.kill()
+
+    def kill(self) -> None:
+        # Reaped, so `alive` is False right away
+        self.process.kill()
+        self.process.wait()
+
+    def close(self) -> None:
+        if self.alive:
+            try:
+                _write_frame(self.process.stdin, None)
+                self.process.wait(timeout=2)
+            except Exception:
+                self.process.kill()
+        self.process.wait()
+
+
+class KernelPool:
+    """Checks out a warm kernel per execution, enforcing a timeout and recycling kernels after `max_runs`.
+
+    A script run ("file" mode) can import modules, change os.environ or patch libraries, so its
+    kernel is never reused; a fresh one is started in the background for the next execution.
+    """
+    def __init__(self, size: int = 2, max_runs: int = 50, memory_mb: int = 2048, timeout: float = 30):
+        self.size = size
+        self.max_runs = max_runs
+        self.memory_mb = memory_mb
+        self.timeout = timeout
+        self._idle: "queue.Queue[PythonKernel]" = queue.Queue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+
+    @classmethod
+    def from_env(cls) -> "KernelPool":
+        return cls(
+            size=int(os.getenv("PYTHON_KERNEL_POOL_SIZE", "2")),
+            max_runs=int(os.getenv("PYTHON_KERNEL_MAX_RUNS", "50")),
+            memory_mb=int(os.getenv("PYTHON_KERNEL_MEMORY_MB", "2048")),
+            timeout=float(os.getenv("PYTHON_KERNEL_TIMEOUT", "30")),
+        )
+
+    def warm(self) -> None:
+        """Start every kernel now instead of on first use."""
+        kernels = [self._checkout() for _ in range(self.size)]
+        for kernel in kernels:
+            self._checkin(kernel)
+
+    def _checkout(self) -> PythonKernel:
+        self._slots.acquire()
+        try:
+            kernel = self._idle.get_nowait()
+            if kernel.alive:
+                return kernel
+        except queue.Empty:
+            pass
+        try:
+            return PythonKernel(self.memory_mb)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _checkin(self, kernel: Optional[PythonKernel]) -> None:
+        if kernel is not None:
+            if kernel.alive and not kernel.retire and kernel.runs < self.max_runs:
+                self._idle.put(kernel)
+            else:
+                threading.Thread(target=self._replace, args=(kernel,), name="kernel-replace", daemon=True).start()
+        self._slots.release()
+
+    def pin(self) -> PythonKernel:
+        """Take a warm kernel out of the pool for one caller's exclusive use, e.g. a session whose
+        globals persist across executions; the caller closes it. A replacement is started."""
+        try:
+            kernel = self._idle.get_nowait()
+        except queue.Empty:
+            return PythonKernel(self.memory_mb)
+        threading.Thread(target=self._refill, name="kernel-replace", daemon=True).start()
+        if not kernel.alive:
+            return PythonKernel(self.memory_mb)
+        return kernel
+
+    def _replace(self, kernel: PythonKernel) -> None:
+        kernel.close()
+        self._refill()
+
+    def _refill(self) -> None:
+        if self._closed or self._idle.qsize() >= self.size:
+            return
+        try:
+            replacement = PythonKernel(self.memory_mb)
+        except Exception as e:
+            print(f"Could not start a replacement Python kernel: {e}")
+            return
+        if self._closed:
+            replacement.close()
+        else:
+            self._idle.put(replacement)
+
+    def run(self, request: dict, timeout: float = None) -> dict:
+        """Run one request ({"mode": "code"|"file", ...}) on a warm kernel and return its result."""
+        for event in self.run_stream(request, timeout):
+            if event["type"] == "result":
+                return event
+
+    def run_stream(self, request: dict, timeout: float = None) -> Iterator[dict]:
+        """Like run, but yield stdout/stderr/truncated events while the code runs.
+
+        The last event has type "result" and carries status, returncode, the bounded
+        stdout/stderr and any plots and dataframes.
+        """
+        timeout = timeout or self.timeout
+        kernel = self._checkout()
+        if request["mode"] == "file":
+            kernel.retire = True
+        try:
+            yield from kernel.run_stream(request, timeout)
+        finally:
+            self._checkin(kernel)
+
+    def shutdown(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_kernel_pool() -> KernelPool:
+    """Return the process-wide kernel pool."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = KernelPool.from_env()
+    return _pool
+
+
+def kernel_pool_enabled() -> bool:
+    return os.getenv("PYTHON_KERNEL_POOL", "True").lower() == "true"
+
+
+# ---- worker side ----
+
+class _StreamingWriter(io.TextIOBase):
+    """stdout/stderr replacement that captures boundedly and forwards the head as events."""
+    FLUSH_INTERVAL = 0.05
+    FLUSH_BYTES = 8192
+
+    # Both writers share the channel, and fd output arrives on reader threads
+    _lock = threading.RLock()
+
+    def __init__(self, channel, stream: str, max_output_bytes: int):
+        from output_capture import BoundedOutput
+        self.channel = channel
+        self.stream = stream
+        self.capture = BoundedOutput(max_output_bytes)
+        self._pending = []
+        self._pending_len = 0
+        self._last_flush = 0.0
+        self._announced_truncation = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        with self._lock:
+            return self._write(text)
+
+    def _write(self, text: str) -> int:
+        streamed = self.capture.write(text)
+        if streamed:
+            self._pending.append(streamed)
+            self._pending_len += len(streamed)
+        # Send whole lines in batches so a chatty loop does not become one frame per print
+        if self._pending_len >= self.FLUSH_BYTES or (
+            text.endswith("\n") and time.monotonic() - self._last_flush >= self.FLUSH_INTERVAL
+        ):
+            self._flush()
+        return len(text)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._pending:
+            _write_frame(self.channel, {"type": self.stream, "data": "".join(self._pending)})
+            self._pending, self._pending_len = [], 0
+        if self.capture.truncated and not self._announced_truncation:
+            _write_frame(self.channel, {"type": "truncated", "stream": self.stream})
+            self._announced_truncation = True
+        self._last_flush = time.monotonic()
+
+
+class _FdCapture:
+    """Feeds what is written to a file descriptor (by os.system, subprocesses or C code) to a writer."""
+    def __init__(self, fd: int, writer: _StreamingWriter):
+        self.fd = fd
+        self.writer = writer
+        self._saved = os.dup(fd)
+        self._read_end, write_end = os.pipe()
+        os.dup2(write_end, fd)
+        os.close(write_end)
+        self._thread = threading.Thread(target=self._pump, name=f"fd{fd}-capture", daemon=True)
+        self._thread.start()
+
+    def _pump(self) -> None:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        while True:
+            data = os.read(self._read_end, 65536)
+            if not data:
+                break
+            self.writer.write(decoder.decode(data))
+        self.writer.write(decoder.decode(b"", final=True))
+
+    def restore(self) -> None:
+        os.dup2(self._saved, self.fd)
+        os.close(self._saved)
+
+    def join(self, timeout: float) -> bool:
+        """Wait for the rest of the output; False when a leftover process still holds the pipe open."""
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            return False
+        os.close(self._read_end)
+        return True
+
+
+def _run_code(request: dict, channel, namespace: dict) -> dict:
+    from code_interpreter import collect_dataframes, collect_plots, snapshot_dataframes
+    import matplotlib.pyplot as plt
+
+    max_output_bytes = request.get("max_output_bytes")
+    stdout = _StreamingWriter(channel, "stdout", max_output_bytes)
+    stderr = _StreamingWriter(channel, "stderr", max_output_bytes)
+    result = {"type": "result", "status": "error", "returncode": 1, "stdout": "", "stderr": "",
+              "plots": [], "dataframes": []}
+    before = snapshot_dataframes(namespace)
+    captures = [_FdCapture(1, stdout), _FdCapture(2, stderr)]
+    try:
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            if request["mode"] == "file":
+                path = request["path"]
+                namespace.update({"__name__": "__main__", "__file__": path})
+                sys.argv = [path]
+                sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+                with open(path, "r") as f:
+                    code = compile(f.read(), path, "exec")
+            else:
+                code = compile(request["source"], "<string>", "exec")
+            exec(code, namespace)
+            if request.get("collect_results"):
+                result["plots"] = collect_plots(request.get("plot_format"), request.get("plot_dpi"))
+                result["dataframes"] = collect_dataframes(namespace, before)
+        result["status"], result["returncode"] = "success", 0
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        if e.code is not None and not isinstance(e.code, int):
+            stderr.write(f"{e.code}\n")
+        result["status"], result["returncode"] = ("success" if code == 0 else "error"), code
+    except BaseException:
+        stderr.write(traceback.format_exc())
+    finally:
+        plt.close("all")
+        if request["mode"] == "file":
+            sys.path.pop(0)
+        deadline = time.monotonic() + 1.0
+        for capture in captures:
+            capture.restore()
+        if not all([capture.join(max(deadline - time.monotonic(), 0)) for capture in captures]):
+            result["retire"] = True
+    stdout.flush()
+    stderr.flush()
+    result["stdout"] = stdout.capture.getvalue()
+    result["stderr"] = stderr.capture.getvalue()
+    return result
+
+
+def _worker_main(memory_mb: int) -> None:
+    # Keep the protocol stream private; user code prints into redirected buffers
+    channel_in = os.fdopen(os.dup(sys.stdin.fileno()), "rb")
+    channel_out = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    # Point fds 0 and 1 away from the pipes too, so os.system, subprocesses and C extensions
+    # writing to stdout (or reading stdin) cannot corrupt the frames; during a run fds 1 and 2
+    # are captured into its output
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    os.dup2(2, 1)
+    sys.stdin = open(os.devnull)
+    sys.stdout = sys.stderr
+
+    import matplotlib
+    matplotlib.use("Agg")
+    from code_interpreter import base_namespace  # pre-imports numpy, pandas, matplotlib, PIL
+
+    if memory_mb:
+        import resource
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    try:
+        _write_frame(channel_out, "ready")
+    except BrokenPipeError:
+        return  # the server went away while this kernel was starting
+    # Globals of "persist" requests, kept for the kernel's lifetime (a pinned session)
+    session = None
+    while True:
+        (size,) = HEADER.unpack(channel_in.read(HEADER.size) or HEADER.pack(0))
+        if not size:
+            break
+        request = pickle.loads(channel_in.read(size))
+        if request is None:
+            break
+        cwd = os.getcwd()
+        if request.get("cwd"):
+            os.chdir(request["cwd"])
+        if request.get("persist"):
+            session = session if session is not None else base_namespace()
+            namespace = session
+        else:
+            namespace = base_namespace()
+        try:
+            _write_frame(channel_out, _run_code(request, channel_out, namespace))
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__" and len(sys.argv) >= 2 and sys.argv[1] == "--worker":
+    _worker_main(int(sys.argv[2]) if len(sys.argv) > 2 else 0)
@@ -0,0 +1,437 @@
+"""Routing of LLM calls across providers: latency-aware order, fallback, hedging, circuit breakers and rate limits"""
+import asyncio
+import concurrent.futures
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler, BaseCallbackManager
+from langchain_core.runnables.config import ensure_config
+
+from telemetry import get_telemetry
+
+ROUTING_STRATEGIES = ("latency", "ordered")
+
+
+class ProviderUnavailableError(RuntimeError):
+    """Every provider failed, or none could take the call (circuit open or rate limit exhausted)."""
+
+
+class TokenBucket:
+    """Allows `rate` calls per second on average, in bursts of up to `capacity`."""
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def wait_time(self) -> float:
+        """Seconds until a call would be allowed."""
+        with self._lock:
+            self._refill()
+            return max(0.0, (1 - self._tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """Stops calls to a provider after `failure_threshold` consecutive failures.
+
+    After `reset_timeout` seconds a single trial call is let through (half-open): its
+    success closes the circuit, its failure opens it for another `reset_timeout`.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def _available(self) -> bool:
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self.state == self.CLOSED or (self.state == self.HALF_OPEN and not self._trial_in_flight)
+
+    def available(self) -> bool:
+        """Whether a call could go out now, without reserving it."""
+        with self._lock:
+            return self._available()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; in the half-open state this reserves the trial call."""
+        with self._lock:
+            if not self._available():
+                return False
+            if self.state == self.HALF_OPEN:
+                self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def record_cancelled(self) -> None:
+        """A call abandoned without an outcome (a hedge that lost) frees the trial slot."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class ProviderHealth:
+    """What the router knows about one provider: recent latencies, its circuit breaker and rate limit."""
+    def __init__(self, breaker: CircuitBreaker, bucket: TokenBucket = None, window: int = 100):
+        self.breaker = breaker
+        self.bucket = bucket
+        self.latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> Optional[str]:
+        """Reserve a call; returns None if it may go out, otherwise why not."""
+        # Check the circuit before spending a token, and reserve both or neither
+        with self._lock:
+            if not self.breaker.available():
+                return "circuit_open"
+            if self.bucket is not None and not self.bucket.try_acquire():
+                return "rate_limited"
+            self.breaker.allow()
+            return None
+
+    def record_success(self, seconds: float) -> None:
+        self.latencies.append(seconds)
+        self.breaker.record_success()
+
+    def quantile(self, q: float) -> Optional[float]:
+        values = sorted(self.latencies)
+        if not values:
+            return None
+        return values[min(int(q * len(values)), len(values) - 1)]
+
+    @property
+    def stats(self) -> dict:
+        p50, p95 = self.quantile(0.5), self.quantile(0.95)
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "samples": len(self.latencies),
+            "p50_seconds": round(p50, 3) if p50 is not None else None,
+            "p95_seconds": round(p95, 3) if p95 is not None else None,
+        }
+
+
+class _FirstToken(BaseCallbackHandler):
+    """Notices when a streaming attempt has produced its first token."""
+    run_inline = True
+
+    def __init__(self):
+        self.seen = threading.Event()
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        self.seen.set()
+
+
+# A fallback would stream a second answer after the partial one the caller's callbacks already got
+_MID_ANSWER = "LLM provider failed after streaming part of its answer, not retrying elsewhere: "
+
+
+def _with_handler(config: dict, handler: BaseCallbackHandler) -> dict:
+    callbacks = config.get("callbacks")
+    if isinstance(callbacks, BaseCallbackManager):
+        callbacks = callbacks.copy()
+        callbacks.add_handler(handler, inherit=True)
+    else:
+        callbacks = list(callbacks or []) + [handler]
+    return {**config, "callbacks": callbacks}
+
+
+class LLMRouter:
+    """Sends each LLM call to one of several providers and falls back to the next on an error or timeout.
+
+    `providers` maps names to chat models in order of preference. With the `latency`
+    strategy they are tried fastest first by median latency of recent successful calls;
+    providers without any come first, in preference order, so they get measured. Providers
+    whose circuit is open or whose rate limit (`rate_limits`, requests per minute) is used
+    up are skipped; when only rate limits stand in the way, the call waits until one of
+    them allows it.
+
+    With `hedge`, a second provider is started if the first has neither answered nor
+    streamed a token after its p95 latency (`hedge_delay` until `min_samples` calls were
+    seen), and the first answer wins. The hedge runs without the caller's callbacks, so
+    only the first attempt streams tokens to the client. For the same reason there is no
+    fallback once a provider has streamed a token: its failure raises ProviderUnavailableError.
+    """
+    model_name = "router"
+
+    def __init__(self, providers: Dict[str, Any], strategy: str = "latency", attempt_timeout: float = 60.0,
+                 hedge: bool = False, hedge_delay: float = 2.0, hedge_quantile: float = 0.95, min_samples: int = 20,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0, rate_limits: Dict[str, float] = None,
+                 health: Dict[str, ProviderHealth] = None):
+        if strategy not in ROUTING_STRATEGIES:
+            raise ValueError(f"unknown routing strategy {strategy!r}; choose from {ROUTING_STRATEGIES}")
+        self.providers = providers
+        self.strategy = strategy
+        self.attempt_timeout = attempt_timeout
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.hedge_quantile = hedge_quantile
+        self.min_samples = min_samples
+        if health is None:
+            rate_limits = rate_limits or {}
+            health = {
+                name: ProviderHealth(
+                    CircuitBreaker(failure_threshold, reset_timeout),
+                    TokenBucket(rate_limits[name] / 60, rate_limits[name]) if name in rate_limits else None,
+                )
+                for name in providers
+            }
+        # Shared with the routers bind_tools returns, so they all see the same provider health
+        self.health = health
+        self.telemetry = get_telemetry()
+        self._executor = None
+
+    @classmethod
+    def from_env(cls, providers: Dict[str, Any]) -> "LLMRouter":
+        return cls(
+            providers,
+            strategy=os.getenv("LLM_ROUTING", "latency"),
+            attempt_timeout=float(os.getenv("LLM_ATTEMPT_TIMEOUT", "60")),
+            hedge=os.getenv("LLM_HEDGE", "False").lower() == "true",
+            hedge_delay=float(os.getenv("LLM_HEDGE_DELAY", "2")),
+            failure_threshold=int(os.getenv("LLM_CIRCUIT_FAILURES", "5")),
+            reset_timeout=float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30")),
+            rate_limits=json.loads(os.getenv("LLM_RATE_LIMITS", "{}")),
+        )
+
+    def bind_tools(self, tools, **kwargs) -> "LLMRouter":
+        bound = {name: llm.bind_tools(tools, **kwargs) for name, llm in self.providers.items()}
+        return LLMRouter(bound, strategy=self.strategy, attempt_timeout=self.attempt_timeout, hedge=self.hedge,
+                         hedge_delay=self.hedge_delay, hedge_quantile=self.hedge_quantile,
+                         min_samples=self.min_samples, health=self.health)
+
+    @property
+    def stats(self) -> dict:
+        return {name: health.stats for name, health in self.health.items()}
+
+    # ---- provider selection ----
+
+    def _ordered(self) -> List[str]:
+        names = list(self.providers)
+        if self.strategy == "ordered":
+            return names
+        return sorted(names, key=lambda name: (self.health[name].quantile(0.5) or 0.0, names.index(name)))
+
+    def _acquire(self, tried: set) -> Tuple[Optional[str], float]:
+        """The next provider to call, or None and how long to wait before a rate limit frees up (0: none will)."""
+        wait = None
+        for name in self._ordered():
+            if name in tried:
+                continue
+            refused = self.health[name].try_acquire()
+            if refused is None:
+                return name, 0.0
+            self.telemetry.record_routing(name, refused)
+            if refused == "rate_limited":
+                bucket_wait = self.health[name].bucket.wait_time()
+                wait = bucket_wait if wait is None else min(wait, bucket_wait)
+        return None, wait or 0.0
+
+    def _hedge_after(self, name: str) -> float:
+        health = self.health[name]
+        if len(health.latencies) < self.min_samples:
+            return self.hedge_delay
+        return health.quantile(self.hedge_quantile)
+
+    def _result(self, name: str, message):
+        message.response_metadata["llm_provider"] = name
+        return message
+
+    # ---- async ----
+
+    async def _anext(self, tried: set, deadline: float) -> Optional[str]:
+        while True:
+            name, wait = self._acquire(tried)
+            if name is not None or not wait or time.monotonic() + wait > deadline:
+                return name
+            await asyncio.sleep(wait)
+
+    async def _aattempt(self, name: str, input, config: dict, kwargs: dict):
+        breaker = self.health[name].breaker
+        with self.telemetry.span(name, kind="provider"):
+            start = time.perf_counter()
+            try:
+                message = await asyncio.wait_for(self.providers[name].ainvoke(input, config, **kwargs),
+                                                 self.attempt_timeout)
+            except asyncio.CancelledError:
+                breaker.record_cancelled()
+                raise
+            except asyncio.TimeoutError:
+                breaker.record_failure()
+                raise TimeoutError(f"no answer within {self.attempt_timeout:g} s") from None
+            except Exception:
+                breaker.record_failure()
+                raise
+            self.health[name].record_success(time.perf_counter() - start)
+            return message
+
+    async def ainvoke(self, input, config: dict = None, **kwargs):
+        config = ensure_config(config)
+        deadline = time.monotonic() + self.attempt_timeout
+        first_token = _FirstToken()
+        tried, errors = set(), []
+        pending: Dict[asyncio.Future, str] = {}
+        hedge_at = None
+
+        def launch(name: str, streaming: bool) -> None:
+            tried.add(name)
+            attempt_config = _with_handler(config, first_token) if streaming else {**config, "callbacks": []}
+            pending[asyncio.ensure_future(self._aattempt(name, input, attempt_config, kwargs))] = name
+
+        name = await self._anext(tried, deadline)
+        if name is None:
+            raise ProviderUnavailableError("no LLM provider available (circuits open or rate limited)")
+        launch(name, streaming=True)
+        if self.hedge:
+            hedge_at = time.monotonic() + self._hedge_after(name)
+        try:
+            while pending:
+                timeout = None if hedge_at is None else max(0.0, hedge_at - time.monotonic())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = pending.pop(task)
+                    if task.exception() is None:
+                        return self._result(name, task.result())
+                    errors.append(f"{name}: {type(task.exception()).__name__}: {task.exception()}")
+                if hedge_at is not None and time.monotonic() >= hedge_at and pending:
+                    hedge_at = None
+                    # A provider that is already streaming is answering, just slowly
+                    if not first_token.seen.is_set():
+                        name, _ = self._acquire(tried)
+                        if name is not None:
+                            self.telemetry.record_routing(name, "hedge")
+                            launch(name, streaming=False)
+                if not pending:
+                    if first_token.seen.is_set():
+                        raise ProviderUnavailableError(_MID_ANSWER + "; ".join(errors))
+                    name = await self._anext(tried, deadline)
+                    if name is not None:
+                        self.telemetry.record_routing(name, "fallback")
+                        launch(name, streaming=True)
+                        if self.hedge and hedge_at is not None:
+                            hedge_at = time.monotonic() + self._hedge_after(name)
+        finally:
+            for task in pending:
+                task.cancel()
+        raise ProviderUnavailableError("all LLM providers failed: " + "; ".join(errors))
+
+    # ---- sync ----
+
+    def _next(self, tried: set, deadline: float) -> Optional[str]:
+        while True:
+            name, wait = self._acquire(tried)
+            if name is not None or not wait or time.monotonic() + wait > deadline:
+                return name
+            time.sleep(wait)
+
+    def _attempt(self, name: str, input, config: dict, kwargs: dict):
+        breaker = self.health[name].breaker
+        with self.telemetry.span(name, kind="provider"):
+            start = time.perf_counter()
+            try:
+                message = self.providers[name].invoke(input, config, **kwargs)
+                # A thread cannot be interrupted; the caller has already moved on without this answer
+                if time.perf_counter() - start > self.attempt_timeout:
+                    raise TimeoutError(f"no answer within {self.attempt_timeout:g} s")
+            except Exception:
+                breaker.record_failure()
+                raise
+            self.health[name].record_success(time.perf_counter() - start)
+            return message
+
+    def invoke(self, input, config: dict = None, **kwargs):
+        """Same routing as ainvoke, with attempts on worker threads; a losing or timed-out attempt is left to finish."""
+        config = ensure_config(config)
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=4 * len(self.providers),
+                                                                   thread_name_prefix="llm-router")
+        deadline = time.monotonic() + self.attempt_timeout
+        first_token = _FirstToken()
+        tried, errors = set(), []
+        pending: Dict[concurrent.futures.Future, Tuple[str, float]] = {}
+        hedge_at = None
+
+        def launch(name: str, streaming: bool) -> None:
+            tried.add(name)
+            attempt_config = _with_handler(config, first_token) if streaming else {**config, "callbacks": []}
+            # Run in a copy of this context so telemetry spans land in the caller's trace
+            future = self._executor.submit(contextvars.copy_context().run, self._attempt,
+                                           name, input, attempt_config, kwargs)
+            pending[future] = (name, time.monotonic())
+
+        name = self._next(tried, deadline)
+        if name is None:
+            raise ProviderUnavailableError("no LLM provider available (circuits open or rate limited)")
+        launch(name, streaming=True)
+        if self.hedge:
+            hedge_at = time.monotonic() + self._hedge_after(name)
+        while pending:
+            wake = min(start for _, start in pending.values()) + self.attempt_timeout
+            if hedge_at is not None:
+                wake = min(wake, hedge_at)
+            done, _ = concurrent.futures.wait(pending, timeout=max(0.0, wake - time.monotonic()),
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name, _ = pending.pop(future)
+                if future.exception() is None:
+                    return self._result(name, future.result())
+                errors.append(f"{name}: {type(future.exception()).__name__}: {future.exception()}")
+            now = time.monotonic()
+            for future, (name, start) in list(pending.items()):
+                if now - start >= self.attempt_timeout:
+                    del pending[future]
+                    errors.append(f"{name}: TimeoutError: no answer within {self.attempt_timeout:g} s")
+            if hedge_at is not None and now >= hedge_at and pending:
+                hedge_at = None
+                if not first_token.seen.is_set():
+                    name, _ = self._acquire(tried)
+                    if name is not None:
+                        self.telemetry.record_routing(name, "hedge")
+                        launch(name, streaming=False)
+            if not pending:
+                if first_token.seen.is_set():
+                    raise ProviderUnavailableError(_MID_ANSWER + "; ".join(errors))
+                name = self._next(tried, deadline)
+                if name is not None:
+                    self.telemetry.record_routing(name, "fallback")
+                    launch(name, streaming=True)
+                    if self.hedge and hedge_at is not None:
+                        hedge_at = time.monotonic() + self._hedge_after(name)
+        raise ProviderUnavailableError("all LLM providers failed: " + "; ".join(errors))
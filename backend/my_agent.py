@@ -1,23 +1,26 @@
 import os
-from typing import Dict, Any
+import json
+import importlib
+from typing import Dict, Any, List, Tuple
 import cmath
-import numpy as np
 from dotenv import load_dotenv 
-from langchain_groq import ChatGroq
 from langgraph.graph import START, StateGraph, MessagesState
+from langgraph.config import get_stream_writer
 from langchain_core.messages import SystemMessage, HumanMessage
-from langchain_core.tools import tool
-from langgraph.prebuilt import ToolNode, tools_condition
-from langchain_community.document_loaders import WikipediaLoader, ArxivLoader
-from langchain_community.tools.tavily_search import TavilySearchResults
-from langchain_community.document_loaders import WebBaseLoader, YoutubeLoader
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_google_genai import ChatGoogleGenerativeAI
-import pandas as pd
-import pytesseract
+from langchain_core.tools import StructuredTool, tool
+from langchain_core.runnables import RunnableLambda
+from langgraph.prebuilt import tools_condition
 from python_interpreter import run_python_script
-from PIL import Image
+from context_budget import ContextManager
+from parallel_tools import ParallelToolNode
+from tool_cache import build_tool_cache
+from http_client import format_page, get_http_client
+from telemetry import get_telemetry
+
+# Imported by the tools that need them on first use (pandas/pyarrow, PIL/pytesseract,
+# FAISS/sentence-transformers, the document loaders), so importing this module stays cheap.
+# preload_tool_modules() imports them ahead of time.
+LAZY_TOOL_MODULES = ("table_stats", "data_query", "ocr", "retrieval", "langchain_community.document_loaders")
 
 load_dotenv(override=True)
 
@@ -60,6 +63,7 @@ def wiki_search(query: str) -> str:
 
     Args:
         query: The search query."""
+    from langchain_community.document_loaders import WikipediaLoader
     wiki_docs = WikipediaLoader(query=query, load_max_docs=2).load()
     formatted_wiki_docs = "\n\n---\n\n".join(
         [
@@ -69,21 +73,37 @@ def wiki_search(query: str) -> str:
     )
     return formatted_wiki_docs
 
-@tool(description="A tool to search the web for a query and return maximum 3 results.")
-def web_search(query: str) -> str:
-    """Search Tavily for a query and return maximum 3 results.
-
-    Args:
-        query: The search query."""
-    tool = TavilySearchResults(max_results=3)
-    search_docs = tool.invoke({'query': query})
-    formatted_search_docs = "\n\n-----------\n\n".join(
+def _tavily_request(query: str):
+    # Tavily's REST endpoint, called through the shared HTTP client instead of a new client per call
+    api_key = os.getenv("TAVILY_API_KEY")
+    if not api_key:
+        raise ValueError("TAVILY_API_KEY is not set")
+    url = os.getenv("TAVILY_API_URL", "https://api.tavily.com/search")
+    headers = {"Authorization": f"Bearer {api_key}"}
+    return url, {"query": query, "max_results": 3}, headers
+
+def _format_search_docs(response: dict) -> str:
+    return "\n\n-----------\n\n".join(
         [
             f'{doc["title"]}\n{doc["url"]}\n{doc["content"]}\n-----------\n'
-            for doc in search_docs
+            for doc in response.get("results", [])
         ]
     )
-    return formatted_search_docs
+
+def _web_search(query: str) -> str:
+    """Search Tavily for a query and return maximum 3 results.
+
+    Args:
+        query: The search query."""
+    return _format_search_docs(get_http_client().post_json(*_tavily_request(query)))
+
+async def _aweb_search(query: str) -> str:
+    return _format_search_docs(await get_http_client().apost_json(*_tavily_request(query)))
+
+web_search = StructuredTool.from_function(
+    func=_web_search, coroutine=_aweb_search, name="web_search",
+    description="A tool to search the web for a query and return maximum 3 results.",
+)
 
 @tool(description="A tool to search Arxiv for a topic and return 2 paper summaries.")
 def arxiv_search(query: str) -> str:
@@ -92,6 +112,7 @@ def arxiv_search(query: str) -> str:
 
     Args:
         query: The search query."""
+    from langchain_community.document_loaders import ArxivLoader
     arxiv_docs = ArxivLoader(query=query, load_max_docs=2).load()
     # formatted_wiki_docs_full = "\n\n---\n\n".join(
     #     [
@@ -106,21 +127,19 @@ def arxiv_search(query: str) -> str:
     )
     return formatted_wiki_docs_summaries
 
-@tool(description="A tool to extract text from an image using OCR library pytesseract.")
-def extract_text_from_image(image_path: str) -> str:
+@tool(description="A tool to extract text from images, multi-page TIFFs and PDFs using OCR library pytesseract.")
+def extract_text_from_image(image_paths: List[str]) -> str:
     """
-    Extract text from an image using OCR library pytesseract (if available).
+    Extract text from one or more images using OCR library pytesseract.
     Args:
-        image_path (str): the path to the image file.
+        image_paths (List[str]): image or PDF file paths, or base64-encoded images. Every page of a
+            PDF or multi-frame image is read.
     """
+    from ocr import format_ocr_results, get_ocr_pipeline
     try:
-        # Open the image
-        image = Image.open(image_path)
-
-        # Extract text from the image
-        text = pytesseract.image_to_string(image)
-
-        return f"Extracted text from image:\n\n{text}"
+        if isinstance(image_paths, str):
+            image_paths = [image_paths]
+        return format_ocr_results(get_ocr_pipeline().extract(image_paths))
     except Exception as e:
         return f"Error extracting text from image: {str(e)}"
 
@@ -132,19 +151,11 @@ def analyze_csv_file(file_path: str, query: str) -> str:
         file_path (str): the path to the CSV file.
         query (str): Question about the data
     """
+    from table_stats import format_summary, summarize_file
     try:
-        # Read the CSV file
-        df = pd.read_csv(file_path)
-
-        # Run various analyses based on the query
-        result = f"CSV file loaded with {len(df)} rows and {len(df.columns)} columns.\n"
-        result += f"Columns: {', '.join(df.columns)}\n\n"
-
-        # Add summary statistics
-        result += "Summary statistics:\n"
-        result += str(df.describe())
-
-        return result
+        # Streams the file in chunks; later calls on the same file reuse the cached summary
+        summary, focus = summarize_file(file_path, query)
+        return format_summary(summary, focus, "CSV file")
 
     except Exception as e:
         return f"Error analyzing CSV file: {str(e)}"
@@ -157,25 +168,45 @@ def analyze_excel_file(file_path: str, query: str) -> str:
         file_path (str): the path to the Excel file.
         query (str): Question about the data
     """
+    from table_stats import format_summary, summarize_file
     try:
-        # Read the Excel file
-        df = pd.read_excel(file_path)
-
-        # Run various analyses based on the query
-        result = (
-            f"Excel file loaded with {len(df)} rows and {len(df.columns)} columns.\n"
-        )
-        result += f"Columns: {', '.join(df.columns)}\n\n"
-
-        # Add summary statistics
-        result += "Summary statistics:\n"
-        result += str(df.describe())
-
-        return result
+        summary, focus = summarize_file(file_path, query)
+        return format_summary(summary, focus, "Excel file")
 
     except Exception as e:
         return f"Error analyzing Excel file: {str(e)}"
 
+@tool
+def query_data_file(file_path: str, spec: str) -> str:
+    """
+    Run a structured query over a CSV or Excel file and return only the result rows.
+    Prefer this over execute_python_script for filtering, grouping and aggregating tabular data.
+    Args:
+        file_path (str): the path to the CSV or Excel file.
+        spec (str): JSON object with any of these keys:
+            "select": ["col", ...],
+            "filter": [{"column": "col", "op": "==|!=|<|<=|>|>=|in|not in|contains|is_null|not_null", "value": ...}],
+            "groupby": ["col", ...],
+            "agg": {"col": "count|sum|mean|min|max|median|std|nunique" or a list of them},
+            "sort": [{"column": "col or an aggregate such as mean(price)", "descending": true}],
+            "limit": 10
+        Example: {"filter": [{"column": "year", "op": ">=", "value": 2020}], "groupby": ["region"],
+                  "agg": {"sales": ["sum", "mean"]}, "sort": [{"column": "sum(sales)", "descending": true}], "limit": 5}
+    """
+    from data_query import format_result, run_query
+    try:
+        return format_result(run_query(file_path, spec))
+    except Exception as e:
+        return f"Error querying data file: {str(e)}"
+
+def tool_output_writer(tool_name: str):
+    """Forward live tool output to graph streams that include the "custom" mode; None outside a graph run."""
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        return None
+    return lambda event: writer({"type": "tool_output", "tool": tool_name, "event": event})
+
 @tool
 def execute_python_script(file_path: str) -> str:
     """
@@ -185,22 +216,27 @@ def execute_python_script(file_path: str) -> str:
     Returns:
         A string containing the output of the script.
     """
-    return run_python_script(file_path)
+    return run_python_script(file_path, on_output=tool_output_writer("execute_python_script"))
 
 ##-----------------------------------------------------------------------------------------##
 
-@tool(description="A tool to scrape a website and return the text.")
-def scrape_website(url: str) -> str:
+def _scrape_website(url: str) -> str:
     """
-    Scrape a website and return the text.
+    Scrape a website and return its text, cut off at a character budget.
     Args:
         url (str): The URL of the website to scrape.
     Returns:
         A string containing the text of the website.
     """
-    loader = WebBaseLoader(url)
-    docs = loader.load()
-    return docs[0].page_content
+    return format_page(get_http_client().fetch_text(url))
+
+async def _ascrape_website(url: str) -> str:
+    return format_page(await get_http_client().afetch_text(url))
+
+scrape_website = StructuredTool.from_function(
+    func=_scrape_website, coroutine=_ascrape_website, name="scrape_website",
+    description="A tool to scrape a website and return the text.",
+)
 
 @tool(description="A tool to scrape a youtube video and return the text.")
 def scrape_youtube(url: str) -> str:
@@ -211,30 +247,71 @@ def scrape_youtube(url: str) -> str:
     Returns:
         A string containing the text of the youtube video.
     """
+    from langchain_community.document_loaders import YoutubeLoader
     loader = YoutubeLoader.from_youtube_url(url, add_video_info=False)
     docs = loader.load()
-    return docs[0].page_content
-
-@tool
-def retriever_tool(query: str) -> Dict[str, Any]:
+    text = docs[0].page_content
+    max_chars = get_http_client().max_chars
+    if len(text) > max_chars:
+        return text[:max_chars] + f"\n\n[Transcript truncated after {max_chars} characters.]"
+    return text
+
+@tool(response_format="content_and_artifact")
+def retriever_tool(queries: List[str], k: int = 3, score_threshold: float = 0.0,
+                   metadata_filter: str = "", diversify: bool = False) -> Tuple[str, Dict[str, Any]]:
     """
-    A tool to retrieve relevant documents from a vector store based on a query.
+    A tool to retrieve relevant documents from a vector store for one or more related queries at once.
     Args:
-        query (str): The query to search for.
+        queries (List[str]): the queries to search for; they are embedded and searched together.
+        k (int): documents to return per query (default 3).
+        score_threshold (float): minimum similarity from 0 to 1 for a document to be returned (default 0).
+        metadata_filter (str): optional JSON object of metadata values to match, e.g. {"source": "notes.md"};
+            a list value matches any of its entries.
+        diversify (bool): prefer documents that differ from each other (maximal marginal relevance).
     Returns:
-        A dictionary containing the retrieved documents.
+        The retrieved documents with their similarity scores and the queries that matched them.
     """
-    embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    vector_store = FAISS.load_local("faiss_index", embeddings=embedding_model, allow_dangerous_deserialization=True)
-    
-    docs = vector_store.similarity_search(query, k=3)
-
+    if isinstance(queries, str):
+        queries = [queries]
+    from retrieval import get_vector_store_manager
+    response = get_vector_store_manager().search(
+        queries, k=k, score_threshold=score_threshold or None,
+        metadata_filter=json.loads(metadata_filter) if metadata_filter.strip() else None, mmr=diversify,
+    )
+    if not response["results"]:
+        return "No documents matched.", response
     formatted_local_docs = "\n\n-----------\n\n".join(
     [
-        doc.page_content + "\n-----------\n"
-        for doc in docs
+        f'[score {hit["score"]:.3f}, queries {", ".join(map(str, hit["queries"]))}] {json.dumps(hit["metadata"], default=str)}\n'
+        f'{hit["content"]}\n-----------\n'
+        for hit in response["results"]
     ])
-    return formatted_local_docs
+    return formatted_local_docs, response
+
+def build_llm(provider: str = "google"):
+    # Several comma-separated providers are routed between, with fallback (see llm_router.py)
+    if "," in provider:
+        from llm_router import LLMRouter
+        names = [name.strip() for name in provider.split(",") if name.strip()]
+        return LLMRouter.from_env({name: build_llm(name) for name in names})
+    # Each provider's SDK takes about a second to import; only the one in use is loaded
+    if provider in ("qwen", "llama"):
+        from langchain_groq import ChatGroq
+    elif provider == "google":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+    if provider == "qwen":
+        llm = ChatGroq(model="qwen-qwq-32b", temperature=0)
+    elif provider == "llama":
+        llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0)
+    elif provider == "google":
+        llm = ChatGoogleGenerativeAI(
+                model="gemini-2.0-flash",
+                temperature=0,
+                max_tokens=None,
+                timeout=None,
+                max_retries=2,  
+            )
+    return llm
 
 tools =[
     calculator,
@@ -244,6 +321,7 @@ tools =[
     extract_text_from_image,
     analyze_csv_file,
     analyze_excel_file,
+    query_data_file,
     execute_python_script,
     reverse_string,
     scrape_website,
@@ -251,21 +329,28 @@ tools =[
     retriever_tool
 ]
 
-def build_agent(provider: str = "google"):
-    if provider == "qwen":
-        llm = ChatGroq(model="qwen-qwq-32b", temperature=0)
-    elif provider == "llama":
-        llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0)
-    elif provider == "google":
-        llm = ChatGoogleGenerativeAI(
-                model="gemini-2.0-flash",
-                temperature=0,
-                max_tokens=None,
-                timeout=None,
-                max_retries=2,  
-            )
-
-    llm_with_tools = llm.bind_tools(tools)
+# Serve repeated network lookups from the tool result cache
+tool_cache = build_tool_cache()
+if tool_cache is not None:
+    tools = tool_cache.wrap_tools(tools)
+
+def preload_tool_modules() -> None:
+    """Import the modules the tools load lazily, e.g. from a background warm-up."""
+    for name in LAZY_TOOL_MODULES:
+        importlib.import_module(name)
+
+def build_agent(provider: str = None, llm=None, checkpointer=None, context_manager=None, agent_tools=None):
+    # agent_tools replaces the default tool set, e.g. with recorded stubs for benchmarks
+    agent_tools = tools if agent_tools is None else agent_tools
+    provider = provider or os.getenv("LLM_PROVIDERS", "google")
+    if llm is None:
+        llm = build_llm(provider)
+    if context_manager is None:
+        summary_provider = os.getenv("CONTEXT_SUMMARY_PROVIDER")
+        summarizer = build_llm(summary_provider) if summary_provider else None
+        context_manager = ContextManager.from_env(summarizer=summarizer)
+
+    llm_with_tools = llm.bind_tools(agent_tools)
     
     # Get the directory where this script is located
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -275,21 +360,43 @@ def build_agent(provider: str = "google"):
         system_prompt = f.read()
     sys_msg = SystemMessage(content = system_prompt)
 
+    telemetry = get_telemetry()
+    model_name = getattr(llm, "model_name", None) or getattr(llm, "model", None) or provider
+
     def assistant(state: MessagesState):
-        
-        # Prepare messages for the LLM: System Prompt + current history
-        messages_for_llm_invocation = [sys_msg] + state["messages"]
-        
-        # Invoke LLM with the system prompt and current history
-        ai_response_message = llm_with_tools.invoke(messages_for_llm_invocation)
-        
+        with telemetry.span("assistant", kind="node"):
+            # Prepare messages for the LLM: System Prompt + current history, fitted to the token budget
+            with telemetry.span("context_budget", kind="step"):
+                messages_for_llm_invocation, context_report = context_manager.prepare(sys_msg, state["messages"])
+
+            # Invoke LLM with the system prompt and current history
+            with telemetry.span(model_name, kind="llm") as span:
+                ai_response_message = llm_with_tools.invoke(messages_for_llm_invocation)
+                # A router reports which of its providers answered
+                provider_name = ai_response_message.response_metadata.get("llm_provider", model_name)
+                telemetry.record_llm_usage(span, provider_name, ai_response_message)
+            ai_response_message.response_metadata["context_budget"] = context_report
+
         # Return only the new AI message to be appended to the state
         return {"messages": [ai_response_message]}
 
+    async def aassistant(state: MessagesState):
+        # Same as assistant, used when the graph is run with ainvoke/astream
+        with telemetry.span("assistant", kind="node"):
+            with telemetry.span("context_budget", kind="step"):
+                messages_for_llm_invocation, context_report = await context_manager.aprepare(sys_msg, state["messages"])
+            with telemetry.span(model_name, kind="llm") as span:
+                ai_response_message = await llm_with_tools.ainvoke(messages_for_llm_invocation)
+                provider_name = ai_response_message.response_metadata.get("llm_provider", model_name)
+                telemetry.record_llm_usage(span, provider_name, ai_response_message)
+            ai_response_message.response_metadata["context_budget"] = context_report
+        return {"messages": [ai_response_message]}
+
 
     graph = StateGraph(MessagesState)    
-    graph.add_node("assistant", assistant)
-    graph.add_node("tools", ToolNode(tools))
+    graph.add_node("assistant", RunnableLambda(assistant, afunc=aassistant))
+    tool_node = ParallelToolNode.from_env(agent_tools)
+    graph.add_node("tools", RunnableLambda(tool_node.run, afunc=tool_node.arun))
 
     graph.add_edge(START, "assistant")
     graph.add_conditional_edges(
@@ -298,7 +405,7 @@ def build_agent(provider: str = "google"):
     )
     graph.add_edge("tools", "assistant")
 
-    agent = graph.compile()
+    agent = graph.compile(checkpointer=checkpointer)
     return agent
 
 # if __name__ == "__main__":
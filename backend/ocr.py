@@ -0,0 +1,243 @@
+"""Batched OCR: image preprocessing, a tesseract process pool and a content-hash result cache"""
+import base64
+import binascii
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+import numpy as np
+import pytesseract
+from PIL import Image, ImageOps
+
+from file_hashing import file_hash
+from image_processing import decode_image
+from tool_cache import SQLiteBackend
+
+PDF_EXTENSIONS = (".pdf",)
+CACHE_TTL = 30 * 24 * 3600
+
+
+class OCRSource:
+    """One input: a file path or a base64 image (optionally a data: URL), with its page count."""
+    def __init__(self, source: str):
+        if os.path.isfile(source):
+            self.label = source
+            self.path, self.data = source, None
+            self.is_pdf = source.lower().endswith(PDF_EXTENSIONS)
+            self.content_hash = file_hash(source)
+        else:
+            self.path = None
+            self.data = "".join((source.split(",", 1)[1] if source.startswith("data:") else source).split())
+            try:
+                raw = base64.b64decode(self.data, validate=True)
+            except (binascii.Error, ValueError):
+                raw = b""
+            if not raw:
+                raise ValueError(f"{source[:60]!r} is neither an existing file nor base64 image data")
+            self.is_pdf = raw.startswith(b"%PDF")
+            self.content_hash = hashlib.blake2b(raw, digest_size=20).hexdigest()
+            self.label = f"base64 image {self.content_hash[:8]}"
+        self.pages = _page_count(self)
+
+
+def _page_count(source: OCRSource) -> int:
+    if source.is_pdf:
+        with _open_pdf(source) as document:
+            return document.page_count
+    with _open_image(source) as image:
+        return getattr(image, "n_frames", 1)
+
+
+def _open_pdf(source: OCRSource):
+    import pymupdf
+    if source.path is not None:
+        return pymupdf.open(source.path)
+    return pymupdf.open(stream=base64.b64decode(source.data), filetype="pdf")
+
+
+def _open_image(source: OCRSource) -> Image.Image:
+    return Image.open(source.path) if source.path is not None else decode_image(source.data)
+
+
+def load_page(source: OCRSource, page: int, pdf_dpi: int) -> Image.Image:
+    """Page `page` of a PDF (rendered in grayscale) or frame `page` of a multi-frame image."""
+    if source.is_pdf:
+        import pymupdf
+        with _open_pdf(source) as document:
+            pixmap = document[page].get_pixmap(dpi=pdf_dpi, colorspace=pymupdf.csGRAY)
+            return Image.frombytes("L", (pixmap.width, pixmap.height), pixmap.samples)
+    image = _open_image(source)
+    image.seek(page)
+    return ImageOps.exif_transpose(image) if page == 0 else image.copy()
+
+
+def otsu_threshold(pixels: np.ndarray) -> int:
+    """Gray level that best separates dark text from a light background (Otsu's method)."""
+    histogram = np.bincount(pixels.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256)
+    weight_dark = np.cumsum(histogram)
+    weight_light = weight_dark[-1] - weight_dark
+    sum_dark = np.cumsum(histogram * levels)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_dark = sum_dark / weight_dark
+        mean_light = (sum_dark[-1] - sum_dark) / weight_light
+        between = weight_dark * weight_light * (mean_dark - mean_light) ** 2
+    # A single-level image has no split at all; threshold 0 leaves it unchanged
+    return int(np.argmax(np.nan_to_num(between, nan=-1.0)))
+
+
+def preprocess(image: Image.Image, max_side: int, binarize: bool) -> Image.Image:
+    """Grayscale, downscale so the longest side is at most `max_side`, then optionally binarize."""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        # Transparent backgrounds would otherwise turn black
+        background = Image.new("RGBA", image.size, "white")
+        image = Image.alpha_composite(background, image.convert("RGBA"))
+    image = image.convert("L")
+    if max_side and max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    if binarize:
+        pixels = np.asarray(image)
+        image = Image.fromarray(np.where(pixels > otsu_threshold(pixels), 255, 0).astype(np.uint8))
+    return image
+
+
+def _init_worker() -> None:
+    # Parallelism comes from the pool; stop each tesseract from also starting a thread per core
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def _ocr_page(source: OCRSource, page: int, settings: dict) -> str:
+    image = preprocess(load_page(source, page, settings["pdf_dpi"]), settings["max_side"], settings["binarize"])
+    return pytesseract.image_to_string(image, lang=settings["lang"])
+
+
+class OCRPipeline:
+    """Recognizes many images, multi-frame images and PDF pages at once.
+
+    Each page is preprocessed and passed to tesseract on a process pool sized to the
+    available cores. Results are cached by the page's content hash and the OCR settings.
+    """
+    def __init__(self, workers: int = None, max_side: int = 2500, binarize: bool = True, lang: str = "eng",
+                 pdf_dpi: int = 200, cache: Optional[SQLiteBackend] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.settings = {"max_side": max_side, "binarize": binarize, "lang": lang, "pdf_dpi": pdf_dpi}
+        self.cache = cache
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "OCRPipeline":
+        cache = None
+        if os.getenv("OCR_CACHE_ENABLED", "True").lower() == "true":
+            script_dir = os.path.dirname(os.path.abspath(__file__))
+            cache = SQLiteBackend(os.getenv("OCR_CACHE_PATH", os.path.join(script_dir, "ocr_cache.db")),
+                                  max_entries=int(os.getenv("OCR_CACHE_MAX_ENTRIES", "10000")))
+        return cls(
+            workers=int(os.getenv("OCR_WORKERS", "0")) or None,
+            max_side=int(os.getenv("OCR_MAX_SIDE", "2500")),
+            binarize=os.getenv("OCR_BINARIZE", "True").lower() == "true",
+            lang=os.getenv("OCR_LANG", "eng"),
+            pdf_dpi=int(os.getenv("OCR_PDF_DPI", "200")),
+            cache=cache,
+        )
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    # spawn, not fork: the server process has live threads and event loops
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor) -> None:
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    def _cache_key(self, source: OCRSource, page: int) -> str:
+        settings = ",".join(f"{k}={v}" for k, v in sorted(self.settings.items()))
+        return f"ocr:{source.content_hash}:{page}:{settings}"
+
+    def extract(self, sources: List[str]) -> List[Dict]:
+        """OCR every page of every source; returns {source, page, pages, text, cached, error} per page, in order.
+
+        A source that cannot be opened gets a single result with empty text and its `error`;
+        the other sources are still recognized.
+        """
+        results = []
+        # Pages still to recognize, by cache key, so a page repeated in one batch is recognized once
+        jobs: Dict[str, tuple] = {}
+        waiting: Dict[str, List[int]] = {}
+        for raw in sources:
+            try:
+                source = OCRSource(raw)
+            except Exception as e:
+                results.append({"source": raw[:60], "page": 1, "pages": 1, "text": "", "cached": False,
+                                "error": str(e)})
+                continue
+            for page in range(source.pages):
+                key = self._cache_key(source, page)
+                text = self.cache.get(key) if self.cache is not None and key not in jobs else None
+                results.append({"source": source.label, "page": page + 1, "pages": source.pages,
+                                "text": text, "cached": text is not None, "error": None})
+                if text is None:
+                    jobs.setdefault(key, (source, page))
+                    waiting.setdefault(key, []).append(len(results) - 1)
+
+        if len(jobs) > 1 and self.workers > 1:
+            pool = self._get_pool()
+            try:
+                futures = {key: pool.submit(_ocr_page, source, page, self.settings)
+                           for key, (source, page) in jobs.items()}
+                texts = {key: future.result() for key, future in futures.items()}
+            except BrokenProcessPool:
+                self._discard_pool(pool)
+                raise
+        else:
+            texts = {key: _ocr_page(source, page, self.settings) for key, (source, page) in jobs.items()}
+
+        for key, text in texts.items():
+            for index in waiting[key]:
+                results[index]["text"] = text
+            if self.cache is not None:
+                self.cache.set(key, "ocr", text, CACHE_TTL)
+        return results
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+_pipeline: Optional[OCRPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_ocr_pipeline() -> OCRPipeline:
+    """Process-wide OCR pipeline, configured from the environment on first use."""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = OCRPipeline.from_env()
+    return _pipeline
+
+
+def format_ocr_results(results: List[Dict]) -> str:
+    """Text per page, headed by its source and page number when there is more than one page."""
+    if len(results) == 1:
+        if results[0]["error"]:
+            return f"Error extracting text from image: {results[0]['error']}"
+        return f"Extracted text from image:\n\n{results[0]['text']}"
+    parts = []
+    for result in results:
+        header = result["source"] if result["pages"] == 1 else f"{result['source']} (page {result['page']}/{result['pages']})"
+        body = f"[Error: {result['error']}]" if result["error"] else result["text"].strip()
+        parts.append(f"--- {header} ---\n{body}")
+    return f"Extracted text from {len(results)} pages:\n\n" + "\n\n".join(parts)
@@ -0,0 +1,132 @@
+"""Bounded capture of program output for code execution"""
+import codecs
+import os
+import selectors
+import subprocess
+import time
+from collections import deque
+from typing import Generator, Tuple
+
+DEFAULT_MAX_OUTPUT_BYTES = int(os.getenv("CODE_MAX_OUTPUT_BYTES", "1000000"))
+
+
+class BoundedOutput:
+    """Keeps the first and last `max_bytes / 2` bytes of a stream and counts what is dropped in between.
+
+    `write` returns the part of the text that landed in the head, which is what can be
+    streamed to a client immediately; once the head is full, later text only feeds the
+    tail ring and shows up in `getvalue()` after a truncation marker.
+    """
+    def __init__(self, max_bytes: int = None):
+        max_bytes = DEFAULT_MAX_OUTPUT_BYTES if max_bytes is None else max_bytes
+        self.head_limit = max_bytes // 2
+        self.tail_limit = max_bytes - self.head_limit
+        self._head = []
+        self._head_bytes = 0
+        self._tail = deque()
+        self._tail_bytes = 0
+        self.dropped_bytes = 0
+
+    @property
+    def truncated(self) -> bool:
+        return self.dropped_bytes > 0
+
+    def write(self, text: str) -> str:
+        if not text:
+            return ""
+        data = text.encode("utf-8", errors="replace")
+        room = self.head_limit - self._head_bytes
+        if room >= len(data):
+            self._head.append(text)
+            self._head_bytes += len(data)
+            return text
+
+        streamed = ""
+        if room > 0:
+            streamed = data[:room].decode("utf-8", errors="ignore")
+            self._head.append(streamed)
+            self._head_bytes = self.head_limit
+            data = data[room:]
+        self._push_tail(data)
+        return streamed
+
+    def _push_tail(self, data: bytes) -> None:
+        self._tail.append(data)
+        self._tail_bytes += len(data)
+        while self._tail_bytes > self.tail_limit:
+            overflow = self._tail_bytes - self.tail_limit
+            first = self._tail[0]
+            if len(first) <= overflow:
+                self._tail.popleft()
+                self._tail_bytes -= len(first)
+                self.dropped_bytes += len(first)
+            else:
+                self._tail[0] = first[overflow:]
+                self._tail_bytes -= overflow
+                self.dropped_bytes += overflow
+
+    def flush(self) -> None:
+        # Lets a BoundedOutput stand in for sys.stdout
+        pass
+
+    def getvalue(self) -> str:
+        head = "".join(self._head)
+        tail = b"".join(self._tail).decode("utf-8", errors="ignore")
+        if self.truncated:
+            return f"{head}\n[... {self.dropped_bytes} bytes of output truncated ...]\n{tail}"
+        return head + tail
+
+
+def stream_process(args, timeout: float = None, max_output_bytes: int = None,
+                   **popen_kwargs) -> Generator[dict, None, Tuple[int, str, str]]:
+    """Run a command, yielding {"type": "stdout"|"stderr", "data": ...} events as output arrives.
+
+    Emits {"type": "truncated", "stream": ...} once per stream that overflows
+    `max_output_bytes`, and returns (returncode, stdout, stderr) with bounded output;
+    use it with `yield from`. The process is killed on timeout or when the consumer
+    stops iterating; a timeout reports returncode -9.
+    """
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **popen_kwargs)
+    captures = {"stdout": BoundedOutput(max_output_bytes), "stderr": BoundedOutput(max_output_bytes)}
+    decoders = {name: codecs.getincrementaldecoder("utf-8")(errors="replace") for name in captures}
+    selector = selectors.DefaultSelector()
+    selector.register(process.stdout, selectors.EVENT_READ, "stdout")
+    selector.register(process.stderr, selectors.EVENT_READ, "stderr")
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    timed_out = False
+    try:
+        while selector.get_map():
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                timed_out = True
+                break
+            for key, _ in selector.select(remaining):
+                name = key.data
+                data = os.read(key.fileobj.fileno(), 65536)
+                final = not data
+                if final:
+                    selector.unregister(key.fileobj)
+                was_truncated = captures[name].truncated
+                streamed = captures[name].write(decoders[name].decode(data, final))
+                if streamed:
+                    yield {"type": name, "data": streamed}
+                if captures[name].truncated and not was_truncated:
+                    yield {"type": "truncated", "stream": name}
+        if not timed_out:
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            try:
+                process.wait(timeout=max(remaining, 0) if remaining is not None else None)
+            except subprocess.TimeoutExpired:
+                timed_out = True
+    finally:
+        selector.close()
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+    stderr = captures["stderr"].getvalue()
+    if timed_out:
+        return -9, captures["stdout"].getvalue(), stderr + "Execution timed out."
+    return process.returncode, captures["stdout"].getvalue(), stderr
@@ -0,0 +1,199 @@
+"""Concurrent execution of the tool calls in one assistant message"""
+import asyncio
+import contextvars
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+
+from langchain_core.messages import AIMessage, ToolMessage
+from langgraph.graph import MessagesState
+
+from telemetry import Telemetry, get_telemetry, output_chars
+
+# Tools that spend their time in pandas rather than waiting on the network.
+# OCR is not listed: it already fans pages out to its own process pool (ocr.py).
+DEFAULT_PROCESS_TOOLS = ("analyze_csv_file", "analyze_excel_file", "query_data_file")
+
+
+def _run_tool_in_process(tool_name: str, args: dict):
+    # Runs in a worker process; the tool registry is imported there on first use
+    from my_agent import tools
+    tool = next(t for t in tools if t.name == tool_name)
+    return tool.invoke(args)
+
+
+class ParallelToolNode:
+    """Runs every tool call of the last AIMessage at the same time.
+
+    Each tool has its own concurrency cap and timeout. A failing or hung tool produces an
+    error ToolMessage for its call only, so the other results still reach the LLM. A timeout
+    only stops the wait: Python cannot interrupt a thread or a pool process, so a hung call
+    keeps its worker and its concurrency slot until it returns by itself.
+    CPU-bound tools (`process_tools`) run in a process pool, the rest in threads or, when
+    the graph runs asynchronously, on the event loop. Every call is recorded as a `tool`
+    span with its duration and output size.
+    """
+    def __init__(self, tools: list, timeout: float = 60, timeouts: Optional[Dict[str, float]] = None,
+                 max_concurrency: int = 4, process_tools=DEFAULT_PROCESS_TOOLS, process_pool_size: int = None,
+                 telemetry: Telemetry = None):
+        self.tools_by_name = {t.name: t for t in tools}
+        self.timeout = timeout
+        self.timeouts = timeouts or {}
+        self.max_concurrency = max_concurrency
+        self.process_tools = set(process_tools)
+        self.process_pool_size = process_pool_size or os.cpu_count() or 1
+        self.telemetry = telemetry or get_telemetry()
+
+        self._thread_pool = ThreadPoolExecutor(max_workers=max_concurrency * max(len(tools), 1),
+                                               thread_name_prefix="tool")
+        self._process_pool = None
+        self._pool_lock = threading.Lock()
+        self._thread_limits = {name: threading.BoundedSemaphore(max_concurrency) for name in self.tools_by_name}
+        # asyncio semaphores are bound to the loop that first uses them
+        self._async_limits: Dict[tuple, asyncio.Semaphore] = {}
+
+    @classmethod
+    def from_env(cls, tools: list) -> "ParallelToolNode":
+        process_tools = os.getenv("TOOL_PROCESS_POOL_TOOLS")
+        return cls(
+            tools,
+            timeout=float(os.getenv("TOOL_TIMEOUT", "60")),
+            timeouts=json.loads(os.getenv("TOOL_TIMEOUTS", "{}")),
+            max_concurrency=int(os.getenv("TOOL_MAX_CONCURRENCY", "4")),
+            process_tools=process_tools.split(",") if process_tools is not None else DEFAULT_PROCESS_TOOLS,
+            process_pool_size=int(os.getenv("TOOL_PROCESS_POOL_SIZE", "0")) or None,
+        )
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            with self._pool_lock:
+                if self._process_pool is None:
+                    # spawn, not fork: the server process has live threads and event loops
+                    self._process_pool = ProcessPoolExecutor(
+                        max_workers=self.process_pool_size,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+        return self._process_pool
+
+    def _discard_process_pool(self, pool: ProcessPoolExecutor) -> None:
+        # A crashed worker breaks the whole pool; start a fresh one on next use
+        with self._pool_lock:
+            if self._process_pool is pool:
+                self._process_pool = None
+        pool.shutdown(wait=False)
+
+    def _timeout_for(self, name: str) -> float:
+        return self.timeouts.get(name, self.timeout)
+
+    @staticmethod
+    def _tool_calls(state: MessagesState) -> list:
+        message = state["messages"][-1]
+        return message.tool_calls if isinstance(message, AIMessage) else []
+
+    @staticmethod
+    def _to_message(call: dict, output) -> ToolMessage:
+        if isinstance(output, ToolMessage):
+            return output
+        content = output if isinstance(output, str) else json.dumps(output, default=str)
+        return ToolMessage(content=content, name=call["name"], tool_call_id=call["id"])
+
+    @staticmethod
+    def _error_message(call: dict, error: str) -> ToolMessage:
+        return ToolMessage(content=f"Error: {error}", name=call["name"], tool_call_id=call["id"], status="error")
+
+    def _record(self, span, name: str, output) -> None:
+        if span is not None and getattr(output, "status", None) == "error":
+            span.status = "error"
+        self.telemetry.record_tool_output(span, name, output_chars(output))
+
+    def _invoke_one(self, call: dict):
+        # Called on a worker thread; holds the tool's slot while it runs
+        name = call["name"]
+        with self._thread_limits[name], self.telemetry.span(name, kind="tool") as span:
+            if name in self.process_tools:
+                pool = self._get_process_pool()
+                try:
+                    output = pool.submit(_run_tool_in_process, name, call["args"]).result()
+                except BrokenProcessPool:
+                    self._discard_process_pool(pool)
+                    raise
+            else:
+                output = self.tools_by_name[name].invoke({**call, "type": "tool_call"})
+            self._record(span, name, output)
+            return output
+
+    def run(self, state: MessagesState) -> dict:
+        with self.telemetry.span("tools", kind="node"):
+            return self._run(state)
+
+    def _run(self, state: MessagesState) -> dict:
+        calls = self._tool_calls(state)
+        futures = []
+        for call in calls:
+            if call["name"] not in self.tools_by_name:
+                futures.append(None)
+            else:
+                # Carry the graph's run context so tools can emit progress via get_stream_writer
+                context = contextvars.copy_context()
+                futures.append(self._thread_pool.submit(context.run, self._invoke_one, call))
+
+        # All calls run at once, so each timeout counts from here, not from when its result is awaited
+        start = time.monotonic()
+        messages = []
+        for call, future in zip(calls, futures):
+            if future is None:
+                messages.append(self._error_message(call, f"{call['name']} is not a valid tool."))
+                continue
+            remaining = max(0.0, start + self._timeout_for(call["name"]) - time.monotonic())
+            try:
+                messages.append(self._to_message(call, future.result(timeout=remaining)))
+            except FutureTimeoutError:
+                # Only drops a call still queued for a thread; a running one is left to finish
+                future.cancel()
+                self.telemetry.record_tool_timeout(call["name"])
+                messages.append(self._error_message(call, f"{call['name']} timed out after {self._timeout_for(call['name']):g} seconds."))
+            except Exception as e:
+                messages.append(self._error_message(call, f"{call['name']} failed: {e}"))
+        return {"messages": messages}
+
+    async def arun(self, state: MessagesState) -> dict:
+        calls = self._tool_calls(state)
+        with self.telemetry.span("tools", kind="node"):
+            messages = await asyncio.gather(*(self._ainvoke_guarded(call) for call in calls))
+        return {"messages": list(messages)}
+
+    async def _ainvoke_guarded(self, call: dict) -> ToolMessage:
+        name = call["name"]
+        if name not in self.tools_by_name:
+            return self._error_message(call, f"{name} is not a valid tool.")
+        try:
+            with self.telemetry.span(name, kind="tool") as span:
+                output = await asyncio.wait_for(self._ainvoke_one(call), timeout=self._timeout_for(name))
+                self._record(span, name, output)
+            return self._to_message(call, output)
+        except asyncio.TimeoutError:
+            self.telemetry.record_tool_timeout(name)
+            return self._error_message(call, f"{name} timed out after {self._timeout_for(name):g} seconds.")
+        except Exception as e:
+            return self._error_message(call, f"{name} failed: {e}")
+
+    async def _ainvoke_one(self, call: dict):
+        name = call["name"]
+        loop = asyncio.get_running_loop()
+        key = (id(loop), name)
+        if key not in self._async_limits:
+            self._async_limits[key] = asyncio.Semaphore(self.max_concurrency)
+        async with self._async_limits[key]:
+            if name in self.process_tools:
+                pool = self._get_process_pool()
+                try:
+                    return await loop.run_in_executor(pool, _run_tool_in_process, name, call["args"])
+                except BrokenProcessPool:
+                    self._discard_process_pool(pool)
+                    raise
+            return await self.tools_by_name[name].ainvoke({**call, "type": "tool_call"})
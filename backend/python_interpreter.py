@@ -1,25 +1,47 @@
-import subprocess
 import sys
 import os
+from kernel_pool import get_kernel_pool, kernel_pool_enabled
+from output_capture import stream_process
 
-def run_python_script(script_path):
+def run_python_script(script_path, on_output=None):
+    """Run a script and return its output; on_output, if given, receives each
+    {"type": "stdout"|"stderr"|"truncated", ...} event while the script runs."""
     # Check if the file exists
     if not os.path.isfile(script_path):
         return f"Error: File not found -> {script_path}"
 
+    if kernel_pool_enabled():
+        return run_python_script_in_kernel(script_path, on_output)
+
     try:
-        result = subprocess.run(
-            ['python', script_path],
-            capture_output=True,
-            text=True
-        )
-        output = result.stdout
-        error = result.stderr
+        events = stream_process(['python', script_path])
+        while True:
+            event = next(events)
+            if on_output is not None:
+                on_output(event)
+    except StopIteration as done:
+        returncode, output, error = done.value
+    except Exception as e:
+        return f"Exception occurred: {str(e)}"
 
-        if result.returncode == 0:
-            return f"Output:\n{output}"
+    if returncode == 0:
+        return f"Output:\n{output}"
+    else:
+        return f"Script exited with errors (code {returncode}):\n{error}"
+
+def run_python_script_in_kernel(script_path, on_output=None):
+    """Run the script on a warm kernel instead of starting a new interpreter."""
+    try:
+        request = {"mode": "file", "path": os.path.abspath(script_path), "cwd": os.getcwd()}
+        for event in get_kernel_pool().run_stream(request):
+            if event["type"] == "result":
+                result = event
+            elif on_output is not None:
+                on_output(event)
+        if result["returncode"] == 0:
+            return f"Output:\n{result['stdout']}"
         else:
-            return f"Script exited with errors (code {result.returncode}):\n{error}"
+            return f"Script exited with errors (code {result['returncode']}):\n{result['stderr']}"
 
     except Exception as e:
         return f"Exception occurred: {str(e)}"
@@ -0,0 +1,248 @@
+"""Process-wide cache for the embedding model and FAISS index used by retriever_tool"""
+import os
+import pickle
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy, maximal_marginal_relevance
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+INDEX_FILES = ("index.faiss", "index.pkl")
+# Names the version directory holding the live index files (written by ingest.py)
+CURRENT_FILE = "CURRENT"
+
+
+def current_index_dir(index_path: str) -> str:
+    """Directory with the live index files: the version CURRENT points at, or `index_path`
+    itself for an index written without versions."""
+    try:
+        with open(os.path.join(index_path, CURRENT_FILE), encoding="utf-8") as f:
+            return os.path.join(index_path, f.read().strip())
+    except FileNotFoundError:
+        return index_path
+
+
+class VectorStoreManager:
+    """Lazily loads the embedder and FAISS index once and reloads the index when it changes on disk."""
+    def __init__(self, index_path: str = None, use_mmap: bool = None, reload_check_interval: float = None):
+        self.index_path = index_path or os.getenv("FAISS_INDEX_PATH", "faiss_index")
+        if use_mmap is None:
+            use_mmap = os.getenv("FAISS_USE_MMAP", "False").lower() == "true"
+        self.use_mmap = use_mmap
+        if reload_check_interval is None:
+            reload_check_interval = float(os.getenv("FAISS_RELOAD_CHECK_INTERVAL", "5"))
+        self.reload_check_interval = reload_check_interval
+
+        self._lock = threading.Lock()
+        self._embeddings = None
+        self._vector_store = None
+        self._loaded_signature = None
+        self._last_check = 0.0
+
+    def get_embeddings(self) -> HuggingFaceEmbeddings:
+        """Return the shared embedding model, loading it on first use."""
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    self._embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+        return self._embeddings
+
+    def get_vector_store(self) -> FAISS:
+        """Return the shared vector store, (re)loading it if the files on disk changed."""
+        now = time.monotonic()
+        if self._vector_store is not None and now - self._last_check < self.reload_check_interval:
+            return self._vector_store
+
+        with self._lock:
+            self._last_check = now
+            signature = self._index_signature()
+            if self._vector_store is None or signature != self._loaded_signature:
+                if self._vector_store is not None:
+                    print(f"FAISS index at {self.index_path} changed on disk, reloading.")
+                directory = signature[0] if signature is not None else current_index_dir(self.index_path)
+                self._vector_store = self._load(self._get_embeddings_locked(), directory)
+                self._loaded_signature = signature
+            return self._vector_store
+
+    def search(self, queries: List[str], k: int = 3, score_threshold: float = None,
+               metadata_filter: Dict[str, Any] = None, mmr: bool = False, fetch_k: int = None,
+               lambda_mult: float = 0.5) -> Dict[str, Any]:
+        """Search for several queries at once: one embedding batch, one FAISS search.
+
+        Each query keeps its `k` best matches that pass `metadata_filter` (a value, or a
+        list of allowed values, per metadata key) and `score_threshold`; with `mmr` they
+        are picked for diversity from `fetch_k` candidates. Matches are then merged across
+        queries, keeping each document once with its best score. Scores are cosine
+        similarities for the normalized MiniLM embeddings. Returns
+        {"results": [{content, metadata, score, queries}], "timing": {embed_ms, search_ms, total_ms}}.
+        """
+        started = time.perf_counter()
+        store = self.get_vector_store()
+        ntotal = max(store.index.ntotal, 1)
+        if fetch_k is None:
+            fetch_k = max(4 * k, 20) if (metadata_filter or mmr) else k
+        unique = list(dict.fromkeys(queries))
+        vectors = np.asarray(self.get_embeddings().embed_documents(unique), dtype="float32")
+        embedded = time.perf_counter()
+
+        candidates: Dict[int, list] = {}
+        pending = list(range(len(unique)))
+        search_seconds = 0.0
+        while pending:
+            search_started = time.perf_counter()
+            distances, positions = store.index.search(vectors[pending], min(fetch_k, ntotal))
+            search_seconds += time.perf_counter() - search_started
+            last_score = {}
+            for row, i in enumerate(pending):
+                candidates[i] = []
+                for distance, position in zip(distances[row], positions[row]):
+                    if position < 0:
+                        continue
+                    doc_id = store.index_to_docstore_id[int(position)]
+                    document = store.docstore.search(doc_id)
+                    score = last_score[i] = _similarity(float(distance), store.distance_strategy)
+                    if metadata_filter and not _matches(document.metadata, metadata_filter):
+                        continue
+                    if score_threshold is not None and score < score_threshold:
+                        continue
+                    candidates[i].append((doc_id, document, score, int(position)))
+            if not metadata_filter or fetch_k >= ntotal:
+                break
+            # The filter runs after the search; look further for queries it left short of k matches
+            pending = [i for i in pending if len(candidates[i]) < k
+                       and (score_threshold is None or last_score.get(i, 1.0) >= score_threshold)]
+            fetch_k *= 4
+
+        merged: Dict[str, Dict[str, Any]] = {}
+        for query_number, query in enumerate(queries, 1):
+            i = unique.index(query)
+            matches = candidates[i]
+            if mmr and len(matches) > k:
+                with self._lock:
+                    _ensure_reconstructable(store.index)
+                chosen = maximal_marginal_relevance(
+                    vectors[i], [store.index.reconstruct(position) for _, _, _, position in matches],
+                    lambda_mult=lambda_mult, k=k)
+                matches = [matches[j] for j in chosen]
+            for doc_id, document, score, _ in matches[:k]:
+                hit = merged.setdefault(doc_id, {"content": document.page_content, "metadata": document.metadata,
+                                                 "score": score, "queries": []})
+                hit["score"] = max(hit["score"], score)
+                hit["queries"].append(query_number)
+
+        return {
+            "results": sorted(merged.values(), key=lambda hit: -hit["score"]),
+            "timing": {"embed_ms": (embedded - started) * 1000, "search_ms": search_seconds * 1000,
+                       "total_ms": (time.perf_counter() - started) * 1000},
+        }
+
+    def invalidate(self) -> None:
+        """Drop the cached index so the next call reloads it from disk."""
+        with self._lock:
+            self._vector_store = None
+            self._loaded_signature = None
+
+    def _get_embeddings_locked(self) -> HuggingFaceEmbeddings:
+        if self._embeddings is None:
+            self._embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+        return self._embeddings
+
+    def _index_signature(self) -> Optional[tuple]:
+        # Versions are never rewritten in place, so the directory and its file stats identify what is live
+        directory = current_index_dir(self.index_path)
+        signature = [directory]
+        for name in INDEX_FILES:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                return None
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _read(self, embeddings: HuggingFaceEmbeddings, directory: str) -> FAISS:
+        if not self.use_mmap:
+            return FAISS.load_local(directory, embeddings=embeddings, allow_dangerous_deserialization=True)
+
+        # IO_FLAG_MMAP_IFC maps the whole file, so the vectors of any index type (flat included) stay
+        # in the page cache that uvicorn workers on the same host share. Older faiss only has
+        # IO_FLAG_MMAP, which maps IVF inverted lists and still reads everything else into memory.
+        import faiss
+        mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        index = faiss.read_index(
+            os.path.join(directory, "index.faiss"),
+            mmap_flag | faiss.IO_FLAG_READ_ONLY,
+        )
+        with open(os.path.join(directory, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return FAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=index_to_docstore_id,
+        )
+
+    def _load(self, embeddings: HuggingFaceEmbeddings, directory: str) -> FAISS:
+        store = self._read(embeddings, directory)
+        # IVF/HNSW indexes carry the nprobe/efSearch they were built with; the env can override them
+        apply_search_params(store.index, nprobe=int(os.getenv("FAISS_NPROBE", "0")) or None,
+                            ef_search=int(os.getenv("FAISS_EF_SEARCH", "0")) or None)
+        return store
+
+
+def _matches(metadata: Dict[str, Any], metadata_filter: Dict[str, Any]) -> bool:
+    for key, wanted in metadata_filter.items():
+        value = metadata.get(key)
+        if isinstance(wanted, (list, tuple, set)):
+            if value not in wanted:
+                return False
+        elif value != wanted:
+            return False
+    return True
+
+
+def _similarity(distance: float, strategy: DistanceStrategy) -> float:
+    if strategy == DistanceStrategy.MAX_INNER_PRODUCT:
+        return distance
+    # FAISS reports squared L2 distances; for unit vectors cos = 1 - d^2 / 2
+    return 1.0 - distance / 2.0
+
+
+def _ensure_reconstructable(index) -> None:
+    # IVF indexes can only return stored vectors once they have a direct map
+    import faiss
+    if isinstance(index, faiss.IndexIVF) and index.direct_map.type == faiss.DirectMap.NoMap:
+        index.make_direct_map()
+
+
+def apply_search_params(index, nprobe: int = None, ef_search: int = None) -> None:
+    """Set the query-time recall/speed knobs of IVF (nprobe) and HNSW (efSearch) indexes."""
+    import faiss
+    if nprobe and isinstance(index, faiss.IndexIVF):
+        index.nprobe = nprobe
+    if ef_search and isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_vector_store_manager() -> VectorStoreManager:
+    """Return the process-wide VectorStoreManager."""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = VectorStoreManager()
+    return _manager
+
+
+def prewarm() -> None:
+    """Load the embedder and index now instead of on the first retrieval."""
+    get_vector_store_manager().get_vector_store()
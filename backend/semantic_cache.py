@@ -0,0 +1,207 @@
+"""Embedding-keyed cache of agent answers for paraphrased questions"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+
+
+class SemanticCache:
+    """Returns a stored answer when a new question is close enough to a past one.
+
+    Questions are embedded with the same sentence-transformer as retriever_tool and kept
+    as unit vectors in a NumPy matrix, so a lookup is one matrix-vector product. A hit
+    needs cosine similarity >= `threshold` and an entry younger than `ttl_seconds`.
+
+    With `path`, entries are also written to a SQLite file and every process using it
+    (uvicorn workers) pulls the rows it has not seen before each lookup, so an answer
+    cached by one worker is a hit in all of them. Invalidation bumps a generation number
+    that makes the others reload.
+    """
+    def __init__(self, embed_fn: Callable[[str], List[float]] = None, threshold: float = 0.92,
+                 ttl_seconds: float = 3600, max_entries: int = 5000, path: str = None):
+        self._embed_fn = embed_fn
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._ids: List[int] = []
+        self._questions: List[str] = []
+        self._answers: List[str] = []
+        self._created: List[float] = []
+        self._costs: List[float] = []
+
+        self.lookups = 0
+        self.hits = 0
+        self.latency_saved = 0.0
+
+        self.path = path
+        self._conn = None
+        self._last_id = 0
+        self._generation = 0
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            with self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS semantic_cache (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                    "question TEXT NOT NULL, answer TEXT NOT NULL, vector BLOB NOT NULL, "
+                    "created REAL NOT NULL, cost REAL NOT NULL)"
+                )
+                self._conn.execute("CREATE TABLE IF NOT EXISTS semantic_cache_generation (generation INTEGER NOT NULL)")
+                if self._conn.execute("SELECT COUNT(*) FROM semantic_cache_generation").fetchone()[0] == 0:
+                    self._conn.execute("INSERT INTO semantic_cache_generation VALUES (0)")
+
+    @classmethod
+    def from_env(cls) -> Optional["SemanticCache"]:
+        if os.getenv("SEMANTIC_CACHE_ENABLED", "False").lower() != "true":
+            return None
+        return cls(
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+            ttl_seconds=float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600")),
+            max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000")),
+            path=os.getenv("SEMANTIC_CACHE_PATH") or None,
+        )
+
+    def embed(self, question: str) -> np.ndarray:
+        if self._embed_fn is None:
+            # Reuse the embedder already loaded for retriever_tool
+            from retrieval import get_vector_store_manager
+            self._embed_fn = get_vector_store_manager().get_embeddings().embed_query
+        vector = np.asarray(self._embed_fn(question), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def lookup(self, question: str, vector: np.ndarray = None) -> Optional[str]:
+        """Return a cached answer for `question`, or None."""
+        start = time.perf_counter()
+        vector = self.embed(question) if vector is None else vector
+        with self._lock:
+            self.lookups += 1
+            self._sync()
+            self._drop_expired()
+            if self._vectors is None or not len(self._answers):
+                return None
+            scores = self._vectors @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            self.hits += 1
+            self.latency_saved += max(self._costs[best] - (time.perf_counter() - start), 0.0)
+            return self._answers[best]
+
+    def store(self, question: str, answer: str, cost_seconds: float, vector: np.ndarray = None) -> None:
+        """Remember the answer to `question`; `cost_seconds` is what answering it took."""
+        vector = self.embed(question) if vector is None else vector
+        with self._lock:
+            if self._conn is not None:
+                now = time.time()
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT INTO semantic_cache (question, answer, vector, created, cost) VALUES (?, ?, ?, ?, ?)",
+                        (question, answer, vector.astype(np.float32).tobytes(), now, cost_seconds),
+                    )
+                    self._conn.execute(
+                        "DELETE FROM semantic_cache WHERE created < ? OR id IN (SELECT id FROM semantic_cache "
+                        "ORDER BY id DESC LIMIT -1 OFFSET ?)", (now - self.ttl_seconds, self.max_entries),
+                    )
+                self._sync()
+                return
+            self._last_id += 1
+            self._extend([(self._last_id, question, answer, vector, time.time(), cost_seconds)])
+
+    def invalidate(self, question: str = None) -> int:
+        """Drop every entry, or those semantically matching `question`; returns how many were dropped."""
+        with self._lock:
+            self._sync()
+            count = len(self._answers)
+            if question is None:
+                self._keep([])
+                self._delete_shared(None)
+                return count
+        vector = self.embed(question)
+        with self._lock:
+            self._sync()
+            if self._vectors is None:
+                return 0
+            keep = [i for i, score in enumerate(self._vectors @ vector) if score < self.threshold]
+            keep_ids = {self._ids[i] for i in keep}
+            dropped_ids = [entry_id for entry_id in self._ids if entry_id not in keep_ids]
+            self._keep(keep)
+            self._delete_shared(dropped_ids)
+            return len(dropped_ids)
+
+    def _extend(self, entries: list) -> None:
+        """Append (id, question, answer, vector, created, cost) entries, stacking the vectors once."""
+        if not entries:
+            return
+        ids, questions, answers, vectors, created, costs = zip(*entries)
+        block = np.vstack(vectors)
+        self._vectors = block if self._vectors is None else np.vstack([self._vectors, block])
+        self._ids.extend(ids)
+        self._questions.extend(questions)
+        self._answers.extend(answers)
+        self._created.extend(created)
+        self._costs.extend(costs)
+        if len(self._answers) > self.max_entries:
+            self._keep(list(range(len(self._answers) - self.max_entries, len(self._answers))))
+
+    def _sync(self) -> None:
+        """Pull entries other processes added to the shared file, or reload after an invalidation."""
+        if self._conn is None:
+            return
+        generation = self._conn.execute("SELECT generation FROM semantic_cache_generation").fetchone()[0]
+        if generation != self._generation:
+            self._keep([])
+            self._generation = generation
+            self._last_id = 0
+        rows = self._conn.execute(
+            "SELECT id, question, answer, vector, created, cost FROM semantic_cache WHERE id > ? ORDER BY id",
+            (self._last_id,),
+        ).fetchall()
+        if rows:
+            self._extend([(entry_id, question, answer, np.frombuffer(vector, dtype=np.float32), created, cost)
+                          for entry_id, question, answer, vector, created, cost in rows])
+            self._last_id = rows[-1][0]
+
+    def _delete_shared(self, ids: Optional[List[int]]) -> None:
+        """Delete entries (all with None) from the shared file and tell the other processes to reload."""
+        if self._conn is None:
+            return
+        with self._conn:
+            if ids is None:
+                self._conn.execute("DELETE FROM semantic_cache")
+            else:
+                self._conn.executemany("DELETE FROM semantic_cache WHERE id = ?", [(i,) for i in ids])
+            self._conn.execute("UPDATE semantic_cache_generation SET generation = generation + 1")
+        # Our own copy already reflects the deletion
+        self._generation += 1
+
+    def _drop_expired(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        if self._created and self._created[0] < cutoff:
+            self._keep([i for i, created in enumerate(self._created) if created >= cutoff])
+
+    def _keep(self, indices: List[int]) -> None:
+        if not indices:
+            self._vectors = None
+        else:
+            self._vectors = self._vectors[indices]
+        self._ids = [self._ids[i] for i in indices]
+        self._questions = [self._questions[i] for i in indices]
+        self._answers = [self._answers[i] for i in indices]
+        self._created = [self._created[i] for i in indices]
+        self._costs = [self._costs[i] for i in indices]
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._answers),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            "latency_saved_seconds": round(self.latency_saved, 3),
+        }
@@ -0,0 +1,43 @@
+"""Starts the API server; free of backend imports so a multi-worker master builds no server state"""
+import os
+from typing import Dict
+import uvicorn
+
+
+def shared_worker_env(workers: int) -> Dict[str, str]:
+    """Environment defaults that make uvicorn workers share caches and the index instead of each keeping a copy."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    per_worker = str(max(1, (os.cpu_count() or 1) // workers))
+    return {
+        # Tool results and OCR text are already SQLite-backed and shared through the file
+        "CONVERSATION_CACHE_SHARED": "True",
+        "SEMANTIC_CACHE_PATH": os.path.join(script_dir, "semantic_cache.db"),
+        "FAISS_USE_MMAP": "True",
+        # Split the cores between the workers' process pools instead of giving each all of them
+        "TOOL_PROCESS_POOL_SIZE": per_worker,
+        "OCR_WORKERS": per_worker,
+    }
+
+
+def run_server(app_path: str = "backend:app") -> None:
+    """Serve the API, in BACKEND_WORKERS processes if more than one.
+
+    `app_path` is imported by the server process itself, or by each worker, which then builds
+    its own agent graph; workers share the conversation database, the tool, OCR and answer
+    caches, and the memory-mapped index.
+    """
+    server_host = os.getenv("BACKEND_HOST", "0.0.0.0")
+    server_port = int(os.getenv("BACKEND_PORT", "8000"))
+    workers = int(os.getenv("BACKEND_WORKERS", "1"))
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    if workers <= 1:
+        uvicorn.run(app_path, host=server_host, port=server_port, log_level="info", app_dir=app_dir)
+        return
+
+    # Workers are spawned after this and inherit the environment; explicit settings win
+    for key, value in shared_worker_env(workers).items():
+        os.environ.setdefault(key, value)
+    if os.getenv("TOOL_CACHE_BACKEND", "sqlite").lower() == "memory":
+        print("Warning: TOOL_CACHE_BACKEND=memory keeps a separate tool cache in every worker.")
+    print(f"Starting {workers} workers.")
+    uvicorn.run(app_path, host=server_host, port=server_port, workers=workers, log_level="info", app_dir=app_dir)
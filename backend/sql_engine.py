@@ -0,0 +1,215 @@
+"""Pooled SQLite execution for CodeInterpreter's SQL mode"""
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Sequence, Union
+
+import pandas as pd
+
+Params = Union[Sequence[Any], Dict[str, Any], None]
+
+TRANSACTION_KEYWORDS = ("begin", "commit", "end", "rollback", "savepoint", "release")
+
+
+class QueryTimeout(Exception):
+    """Raised when a script runs longer than the engine's timeout."""
+
+
+def _has_sql(text: str) -> bool:
+    return bool(re.sub(r"--[^\n]*|/\*.*?\*/", "", text, flags=re.S).strip(" \t\r\n;"))
+
+
+def split_statements(script: str) -> List[str]:
+    """Split a script on the semicolons that end statements (not those inside strings or comments)."""
+    statements, current = [], ""
+    for piece in script.split(";"):
+        current += piece + ";"
+        if sqlite3.complete_statement(current):
+            if _has_sql(current):
+                statements.append(current.strip())
+            current = ""
+    if _has_sql(current):
+        statements.append(current.strip().rstrip(";"))
+    return statements
+
+
+def table_name_for(path: str, sheet: str = None) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    name = re.sub(r"\W+", "_", f"{stem}_{sheet}" if sheet else stem).strip("_").lower()
+    return name if name and not name[0].isdigit() else f"t_{name}"
+
+
+class SQLEngine:
+    """Runs SQL scripts against one SQLite file through a small pool of WAL-mode connections.
+
+    Each script runs in one transaction on a pooled connection, so concurrent scripts
+    neither share a cursor nor see each other's half-applied changes. Result rows are
+    fetched in batches of `fetch_size` and at most `max_rows` are kept per statement.
+    """
+    def __init__(self, db_path: str, pool_size: int = 4, max_rows: int = 1000, fetch_size: int = 256,
+                 timeout: float = 30):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.max_rows = max_rows
+        self.fetch_size = fetch_size
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._registered: Dict[str, tuple] = {}
+        self._register_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, db_path: str, timeout: float = 30) -> "SQLEngine":
+        return cls(
+            db_path,
+            pool_size=int(os.getenv("SQL_POOL_SIZE", "4")),
+            max_rows=int(os.getenv("SQL_MAX_ROWS", "1000")),
+            fetch_size=int(os.getenv("SQL_FETCH_SIZE", "256")),
+            timeout=timeout,
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode: transactions are opened explicitly around each script
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Check out a pooled connection; an open transaction is rolled back before it is returned."""
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+        try:
+            yield conn
+        finally:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put(conn)
+            except sqlite3.Error:
+                conn.close()
+            self._slots.release()
+
+    @contextmanager
+    def _deadline(self, conn: sqlite3.Connection, timeout: float) -> Iterator[None]:
+        deadline = time.monotonic() + timeout
+        # Returning non-zero from the progress handler interrupts the running statement
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+        try:
+            yield
+        except sqlite3.OperationalError as e:
+            if time.monotonic() > deadline and "interrupted" in str(e):
+                raise QueryTimeout(f"Query exceeded {timeout:g} seconds.") from e
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    def execute(self, script: str, params: Params = None, max_rows: int = None,
+                timeout: float = None) -> List[dict]:
+        """Run every statement of `script` and return one report per statement.
+
+        Named parameters (a dict) are bound in every statement that uses them; positional
+        parameters are only accepted for single-statement scripts. Reports hold the SQL,
+        elapsed_ms, rowcount, and for statements that return rows the `columns`, `rows`
+        (at most `max_rows`) and whether more were left unfetched (`truncated`).
+        """
+        statements = split_statements(script)
+        if params is not None and not isinstance(params, dict) and len(statements) > 1:
+            raise ValueError("Positional parameters need a single statement; use named parameters instead.")
+        max_rows = self.max_rows if max_rows is None else max_rows
+        # Scripts that manage their own transactions are run as written
+        wrap = not any(s.lstrip().lower().startswith(TRANSACTION_KEYWORDS) for s in statements)
+
+        reports = []
+        with self.connection() as conn, self._deadline(conn, timeout or self.timeout):
+            if wrap:
+                conn.execute("BEGIN")
+            for statement in statements:
+                start = time.perf_counter()
+                cur = conn.execute(statement, self._bind(statement, params))
+                report = {"sql": statement, "rowcount": cur.rowcount}
+                if cur.description is not None:
+                    rows, truncated = self._fetch(cur, max_rows)
+                    report.update(columns=[d[0] for d in cur.description], rows=rows, truncated=truncated)
+                cur.close()
+                report["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+                reports.append(report)
+            if wrap:
+                conn.execute("COMMIT")
+        return reports
+
+    @staticmethod
+    def _bind(statement: str, params: Params):
+        if params is None:
+            return ()
+        if isinstance(params, dict):
+            names = set(re.findall(r"[:@$](\w+)", statement))
+            return {k: v for k, v in params.items() if k in names}
+        return params
+
+    def _fetch(self, cur: sqlite3.Cursor, max_rows: int):
+        rows = []
+        while len(rows) < max_rows:
+            batch = cur.fetchmany(min(self.fetch_size, max_rows - len(rows)))
+            if not batch:
+                return rows, False
+            rows.extend(batch)
+        return rows, cur.fetchone() is not None
+
+    def register_file(self, path: str, table_name: str = None, chunksize: int = 50000) -> List[str]:
+        """Load a CSV or Excel file into tables and return their names.
+
+        CSV files become one table (default name: the file stem); every sheet of an Excel
+        workbook becomes `<stem>_<sheet>` unless it has a single sheet. A file whose size
+        and modification time are unchanged is not loaded again.
+        """
+        stat = os.stat(path)
+        signature = (stat.st_mtime, stat.st_size, table_name)
+        key = os.path.abspath(path)
+        with self._register_lock:
+            if self._registered.get(key, (None,))[0] == signature:
+                return self._registered[key][1]
+
+            extension = os.path.splitext(path)[1].lower()
+            with self.connection() as conn:
+                if extension in (".csv", ".tsv", ".txt"):
+                    name = table_name or table_name_for(path)
+                    separator = "\t" if extension == ".tsv" else ","
+                    if_exists = "replace"
+                    for chunk in pd.read_csv(path, sep=separator, chunksize=chunksize):
+                        chunk.to_sql(name, conn, if_exists=if_exists, index=False)
+                        if_exists = "append"
+                    names = [name]
+                elif extension in (".xlsx", ".xls", ".xlsm"):
+                    sheets = pd.read_excel(path, sheet_name=None)
+                    names = []
+                    for sheet, frame in sheets.items():
+                        if len(sheets) == 1:
+                            name = table_name or table_name_for(path)
+                        else:
+                            name = table_name_for(table_name or path, sheet)
+                        frame.to_sql(name, conn, if_exists="replace", index=False)
+                        names.append(name)
+                else:
+                    raise ValueError(f"Unsupported file type for a SQL table: {extension}")
+            self._registered[key] = (signature, names)
+            return names
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
@@ -0,0 +1,349 @@
+"""Out-of-core summary statistics for CSV and Excel files, with a Parquet copy for follow-up questions"""
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from build_cache import BuildCache
+from file_hashing import file_hash
+
+CHUNK_ROWS = int(os.getenv("DATA_CHUNK_ROWS", "100000"))
+SAMPLE_ROWS = int(os.getenv("DATA_SAMPLE_ROWS", "10000"))
+# Size of the bottom-k samples behind quantiles, distinct counts and top values
+SKETCH_SIZE = int(os.getenv("DATA_SKETCH_SIZE", "4096"))
+
+NUMERIC_KINDS = ("int", "float")
+EXCEL_EXTENSIONS = (".xlsx", ".xlsm", ".xls")
+
+
+def _kind(series: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(series):
+        return "text"
+    if pd.api.types.is_integer_dtype(series):
+        return "int"
+    if pd.api.types.is_float_dtype(series):
+        return "float"
+    return "text"
+
+
+def _excel_rows(path: str) -> Iterator[tuple]:
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _excel_chunks(path: str, chunk_rows: int, nrows: int = None) -> Iterator[pd.DataFrame]:
+    rows = _excel_rows(path)
+    header = [str(c) if c is not None else f"column_{i}" for i, c in enumerate(next(rows, ()))]
+    batch, seen = [], 0
+    for row in rows:
+        batch.append(row)
+        seen += 1
+        if len(batch) >= chunk_rows or (nrows is not None and seen >= nrows):
+            yield pd.DataFrame(batch, columns=header)
+            batch = []
+            if nrows is not None and seen >= nrows:
+                return
+    if batch or seen == 0:
+        yield pd.DataFrame(batch, columns=header)
+
+
+def infer_kinds(path: str, sample_rows: int = None) -> Dict[str, str]:
+    """Column name -> "int", "float" or "text", from the first `sample_rows` rows only."""
+    sample_rows = sample_rows or SAMPLE_ROWS
+    if path.lower().endswith(EXCEL_EXTENSIONS):
+        sample = next(_excel_chunks(path, sample_rows, nrows=sample_rows)).infer_objects()
+    else:
+        sample = pd.read_csv(path, nrows=sample_rows)
+    return {str(name): _kind(sample[name]) for name in sample.columns}
+
+
+def _coerce(chunk: pd.DataFrame, kinds: Dict[str, str]) -> pd.DataFrame:
+    for name, kind in kinds.items():
+        if kind in NUMERIC_KINDS:
+            if chunk[name].dtype != np.float64:
+                chunk[name] = pd.to_numeric(chunk[name], errors="coerce").astype("float64")
+        elif pd.api.types.infer_dtype(chunk[name], skipna=True) not in ("string", "empty"):
+            # Excel cells and mixed CSV columns: keep missing values, stringify the rest
+            chunk[name] = chunk[name].where(chunk[name].isna(), chunk[name].astype(str))
+    return chunk
+
+
+def read_chunks(path: str, kinds: Dict[str, str], strict: bool = True,
+                chunk_rows: int = None) -> Iterator[pd.DataFrame]:
+    """Yield the file in DataFrame chunks with the columns in `kinds`, typed consistently across chunks.
+
+    Strict CSV reads let the C parser apply the sampled dtypes and raise ValueError when a
+    later row contradicts them; otherwise every value is read as text and numeric columns
+    are coerced, turning unparsable values into missing ones.
+    """
+    chunk_rows = chunk_rows or CHUNK_ROWS
+    columns = list(kinds)
+    if path.lower().endswith(EXCEL_EXTENSIONS):
+        for chunk in _excel_chunks(path, chunk_rows):
+            yield _coerce(chunk.reindex(columns=columns), kinds)
+        return
+
+    if strict:
+        # float64 rather than nullable Int64: the C parser handles it directly and missing values fit
+        dtypes = {name: "float64" for name, kind in kinds.items() if kind in NUMERIC_KINDS}
+        dtypes.update({name: object for name, kind in kinds.items() if kind == "text"})
+        for chunk in pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=chunk_rows):
+            yield _coerce(chunk, kinds)
+    else:
+        for chunk in pd.read_csv(path, usecols=columns, dtype=str, chunksize=chunk_rows):
+            yield _coerce(chunk, kinds)
+
+
+# ---- sketches ----
+
+class BottomKSample:
+    """Uniform sample of at most k values: each value gets a random key and the k smallest keys are kept."""
+    def __init__(self, k: int, rng: np.random.Generator):
+        self.k = k
+        self.rng = rng
+        self.keys = np.empty(0)
+        self.values = np.empty(0, dtype=object)
+
+    def update(self, values: np.ndarray) -> None:
+        if not len(values):
+            return
+        keys = self.rng.random(len(values))
+        if len(values) > self.k:
+            # Only a chunk's own k smallest keys can survive the merge
+            keep = np.argpartition(keys, self.k)[:self.k]
+            keys, values = keys[keep], values[keep]
+        keys = np.concatenate([self.keys, keys])
+        values = np.concatenate([self.values, np.asarray(values, dtype=self.values.dtype)])
+        if len(keys) > self.k:
+            keep = np.argpartition(keys, self.k)[:self.k]
+            keys, values = keys[keep], values[keep]
+        self.keys, self.values = keys, values
+
+
+class DistinctSketch:
+    """K-minimum-values estimate of the number of distinct values."""
+    def __init__(self, k: int):
+        self.k = k
+        self.minimums = np.empty(0, dtype=np.uint64)
+
+    def update(self, values: np.ndarray) -> None:
+        if not len(values):
+            return
+        hashes = pd.util.hash_array(np.asarray(values))
+        if len(self.minimums) >= self.k:
+            hashes = hashes[hashes < self.minimums[-1]]
+        merged = np.unique(np.concatenate([self.minimums, hashes]))
+        self.minimums = merged[:self.k]
+
+    def estimate(self) -> int:
+        if len(self.minimums) < self.k:
+            return len(self.minimums)
+        return int(round((self.k - 1) / (float(self.minimums[-1]) / 2.0 ** 64)))
+
+
+class ColumnStats:
+    """Single-pass statistics for one column, merged chunk by chunk."""
+    def __init__(self, kind: str, k: int, rng: np.random.Generator):
+        self.kind = kind
+        self.count = 0
+        self.missing = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.sample = BottomKSample(k, rng)
+        self.distinct = DistinctSketch(k)
+
+    def update(self, series: pd.Series) -> None:
+        present = series.dropna()
+        self.missing += len(series) - len(present)
+        if not len(present):
+            return
+        values = present.to_numpy()
+        if self.kind in NUMERIC_KINDS:
+            values = values.astype(np.float64)
+            n = len(values)
+            chunk_mean = float(values.mean())
+            chunk_m2 = float(((values - chunk_mean) ** 2).sum())
+            # Chan et al. parallel update of the running mean and sum of squared deviations
+            total = self.count + n
+            delta = chunk_mean - self.mean
+            self.mean += delta * n / total
+            self.m2 += chunk_m2 + delta * delta * self.count * n / total
+            self.count = total
+            self.min = float(values.min()) if self.min is None else min(self.min, float(values.min()))
+            self.max = float(values.max()) if self.max is None else max(self.max, float(values.max()))
+        else:
+            self.count += len(values)
+        self.sample.update(values)
+        self.distinct.update(values)
+
+    def summary(self) -> dict:
+        result = {"kind": self.kind, "count": self.count, "missing": self.missing,
+                  "distinct": self.distinct.estimate()}
+        sample = self.sample.values
+        if self.kind in NUMERIC_KINDS:
+            result["mean"] = self.mean if self.count else None
+            result["std"] = float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else None
+            result["min"], result["max"] = self.min, self.max
+            quantiles = np.quantile(sample.astype(np.float64), [0.25, 0.5, 0.75]) if len(sample) else [None] * 3
+            result["25%"], result["50%"], result["75%"] = [None if q is None else float(q) for q in quantiles]
+        elif len(sample):
+            counts = pd.Series(sample).value_counts()
+            result["top"] = str(counts.index[0])
+            result["freq"] = int(round(counts.iloc[0] / len(sample) * self.count))
+        return result
+
+
+def compute_stats(chunks: Iterator[pd.DataFrame], kinds: Dict[str, str], k: int = None,
+                  on_chunk=None) -> dict:
+    """Fold chunks into per-column summaries; `on_chunk` sees every chunk (e.g. to write it elsewhere)."""
+    rng = np.random.default_rng(0)
+    columns = {name: ColumnStats(kind, k or SKETCH_SIZE, rng) for name, kind in kinds.items()}
+    rows = 0
+    for chunk in chunks:
+        rows += len(chunk)
+        for name, stats in columns.items():
+            stats.update(chunk[name])
+        if on_chunk is not None:
+            on_chunk(chunk)
+    return {"rows": rows, "columns": {name: stats.summary() for name, stats in columns.items()}}
+
+
+# ---- cache ----
+
+def arrow_schema(kinds: Dict[str, str]) -> pa.Schema:
+    return pa.schema([(name, pa.float64() if kind in NUMERIC_KINDS else pa.string()) for name, kind in kinds.items()])
+
+
+class DataFileCache:
+    """Per-file summaries and Parquet copies, stored in a BuildCache keyed by the file's content hash."""
+    def __init__(self, cache: BuildCache):
+        self.cache = cache
+
+    @classmethod
+    def from_env(cls) -> "DataFileCache":
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        return cls(BuildCache(
+            os.getenv("DATA_CACHE_DIR", os.path.join(script_dir, "data_cache")),
+            max_bytes=int(os.getenv("DATA_CACHE_MAX_MB", "4096")) * 1024 * 1024,
+        ))
+
+    def load(self, path: str) -> Tuple[dict, str]:
+        """Return (summary, parquet_path) for a CSV/Excel file, scanning it once on first use."""
+        key = file_hash(path)
+        entry = self.cache.lookup(key)
+        if entry is None:
+            entry = self._build(path, key)
+        with open(os.path.join(entry, "stats.json")) as f:
+            return json.load(f), os.path.join(entry, "table.parquet")
+
+    def _build(self, path: str, key: str) -> str:
+        kinds = infer_kinds(path)
+        with self.cache.staging() as staging_dir:
+            for strict in (True, False):
+                start = time.perf_counter()
+                parquet_path = os.path.join(staging_dir, "table.parquet")
+                schema = arrow_schema(kinds)
+                writer = pq.ParquetWriter(parquet_path, schema)
+
+                def write(chunk: pd.DataFrame) -> None:
+                    writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+                try:
+                    summary = compute_stats(read_chunks(path, kinds, strict=strict), kinds, on_chunk=write)
+                except (ValueError, TypeError):
+                    if not strict:
+                        raise
+                    # A late row contradicts the sampled dtypes; rescan with coercion
+                    continue
+                finally:
+                    writer.close()
+                break
+            summary.update(kinds=kinds, scan_seconds=round(time.perf_counter() - start, 3))
+            with open(os.path.join(staging_dir, "stats.json"), "w") as f:
+                json.dump(summary, f)
+            return self.cache.store(key, staging_dir)
+
+
+_data_cache = None
+_data_cache_lock = threading.Lock()
+
+
+def get_data_cache() -> Optional[DataFileCache]:
+    """Return the process-wide data file cache, or None when DATA_CACHE_ENABLED is off."""
+    global _data_cache
+    if os.getenv("DATA_CACHE_ENABLED", "True").lower() != "true":
+        return None
+    if _data_cache is None:
+        with _data_cache_lock:
+            if _data_cache is None:
+                _data_cache = DataFileCache.from_env()
+    return _data_cache
+
+
+# ---- report ----
+
+def mentioned_columns(columns: List[str], query: str) -> List[str]:
+    """Columns whose names appear in the question, used to prune what is read and reported."""
+    text = (query or "").lower()
+    return [c for c in columns if re.search(r"(?<!\w)" + re.escape(c.lower()) + r"(?!\w)", text)]
+
+
+def summarize_file(path: str, query: str = "") -> Tuple[dict, List[str]]:
+    """Summary of a CSV/Excel file and the columns worth reporting for `query`.
+
+    With the cache, the whole file is scanned once and later calls read only the cached
+    summary. Without it, only the columns named in the query (or all, if none are) are read.
+    """
+    cache = get_data_cache()
+    if cache is not None:
+        summary, _ = cache.load(path)
+        focus = mentioned_columns(list(summary["columns"]), query)
+        return summary, focus
+
+    kinds = infer_kinds(path)
+    focus = mentioned_columns(list(kinds), query)
+    if focus:
+        kinds = {name: kinds[name] for name in focus}
+    try:
+        summary = compute_stats(read_chunks(path, kinds), kinds)
+    except (ValueError, TypeError):
+        summary = compute_stats(read_chunks(path, kinds, strict=False), kinds)
+    summary["all_columns"] = list(infer_kinds(path)) if focus else list(kinds)
+    return summary, focus
+
+
+def format_summary(summary: dict, focus: List[str], label: str) -> str:
+    """Render a summary in the shape of the former df.describe() output."""
+    all_columns = summary.get("all_columns") or list(summary["columns"])
+    result = f"{label} loaded with {summary['rows']} rows and {len(all_columns)} columns.\n"
+    result += f"Columns: {', '.join(all_columns)}\n\n"
+
+    columns = {name: stats for name, stats in summary["columns"].items() if not focus or name in focus}
+    if focus:
+        result += f"Showing the columns named in the question: {', '.join(focus)}\n"
+
+    numeric = {n: s for n, s in columns.items() if s["kind"] in NUMERIC_KINDS}
+    other = {n: s for n, s in columns.items() if s["kind"] not in NUMERIC_KINDS}
+    if numeric:
+        rows = ["count", "mean", "std", "min", "25%", "50%", "75%", "max", "missing", "distinct"]
+        result += "Summary statistics:\n"
+        result += str(pd.DataFrame({n: [s.get(r) for r in rows] for n, s in numeric.items()}, index=rows)) + "\n"
+    if other:
+        rows = ["count", "missing", "distinct", "top", "freq"]
+        result += "\nText columns:\n"
+        result += str(pd.DataFrame({n: [s.get(r) for r in rows] for n, s in other.items()}, index=rows)) + "\n"
+    result += "\n(Quartiles, distinct counts and top-value frequencies are estimated from samples.)"
+    return result
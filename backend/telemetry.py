@@ -0,0 +1,328 @@
+"""In-process spans and metrics for the agent graph, its tools and LLM calls, with Prometheus and OpenTelemetry output"""
+import bisect
+import contextvars
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Seconds, roughly x1.5 per bucket from 1 ms to 10 minutes
+DURATION_BUCKETS = tuple(round(0.001 * 1.5 ** i, 6) for i in range(33))
+# Characters or tokens, x4 per bucket from 64 to 16M
+SIZE_BUCKETS = tuple(64 * 4 ** i for i in range(10))
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of one labelled series, as Prometheus stores it.
+
+    Quantiles are interpolated within the bucket that holds them and clamped to the
+    observed range, so they are exact to the bucket width (about +-25% for durations).
+    """
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = max(self.buckets[i - 1] if i else 0.0, self.min)
+                upper = min(self.buckets[i] if i < len(self.buckets) else self.max, self.max)
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.max
+
+
+class Metrics:
+    """Named counters and histograms keyed by label values; thread-safe."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, str] = {}
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._histograms: Dict[str, Dict[tuple, Histogram]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+
+    def counter(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+        self._counters.setdefault(name, {})
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DURATION_BUCKETS) -> None:
+        self._help[name] = help_text
+        self._histograms.setdefault(name, {})
+        self._buckets[name] = buckets
+
+    def inc(self, name: str, value: float = 1, /, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, /, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms[name]
+            if key not in series:
+                series[key] = Histogram(self._buckets[name])
+            series[key].observe(value)
+
+    def reset(self) -> None:
+        """Drop every recorded series, keeping the metric definitions."""
+        with self._lock:
+            for series in list(self._counters.values()) + list(self._histograms.values()):
+                series.clear()
+
+    def summary(self) -> Dict[str, List[dict]]:
+        """Count, mean and p50/p95/p99 of every histogram series, and every counter value."""
+        with self._lock:
+            result = {}
+            for name, series in self._histograms.items():
+                result[name] = [
+                    dict(labels, count=h.count, mean=h.sum / h.count,
+                         **{f"p{round(q * 100)}": h.quantile(q) for q in QUANTILES})
+                    for labels, h in ((dict(key), h) for key, h in sorted(series.items())) if h.count
+                ]
+            for name, series in self._counters.items():
+                result[name] = [dict(dict(key), value=value) for key, value in sorted(series.items())]
+            return result
+
+    def render_prometheus(self) -> str:
+        """The text exposition format served on /metrics."""
+        lines = []
+        with self._lock:
+            for name, series in self._counters.items():
+                lines += [f"# HELP {name} {self._help[name]}", f"# TYPE {name} counter"]
+                lines += [f"{name}{_labels(key)} {_number(value)}" for key, value in sorted(series.items())]
+            for name, series in self._histograms.items():
+                lines += [f"# HELP {name} {self._help[name]}", f"# TYPE {name} histogram"]
+                for key, h in sorted(series.items()):
+                    cumulative = 0
+                    for bound, n in zip(h.buckets + (float("inf"),), h.counts):
+                        cumulative += n
+                        lines.append(f"{name}_bucket{_labels(key + (('le', _number(bound)),))} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(key)} {_number(h.sum)}")
+                    lines.append(f"{name}_count{_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(key: tuple) -> str:
+    if not key:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in key)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(key, escaped)) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Span:
+    """One timed operation; `attributes` can be added while it runs."""
+    __slots__ = ("name", "kind", "attributes", "start", "duration", "status", "_otel")
+
+    def __init__(self, name: str, kind: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.status = "ok"
+        self._otel = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+        if self._otel is not None:
+            self._otel.set_attribute(key, value)
+
+
+class Trace:
+    """The spans of one request, shared by every thread the request's context is copied to."""
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def format(self) -> str:
+        """One line per span, in the order they finished."""
+        lines = [f"trace {self.trace_id} ({self.name})"]
+        for span in self.spans:
+            extra = " ".join(f"{k}={v}" for k, v in span.attributes.items())
+            lines.append(f"  {span.kind:<7} {span.name:<24} {span.duration * 1000:9.1f} ms  {span.status}  {extra}")
+        return "\n".join(lines)
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+
+
+class Telemetry:
+    """Spans for graph nodes, tools and LLM calls, recorded as latency/size histograms and token counters.
+
+    With `otel` set and the opentelemetry package installed, every span is also started as
+    an OpenTelemetry span, so it nests under the caller's trace and is exported by whatever
+    tracer provider is configured (OTLP when OTEL_EXPORTER_OTLP_ENDPOINT is set and the SDK
+    and exporter packages are installed). `debug` prints each finished request trace and the
+    request's messages.
+    """
+    def __init__(self, enabled: bool = True, otel: bool = False, debug: bool = False):
+        self.enabled = enabled
+        self.debug = debug
+        self.metrics = Metrics()
+        self.metrics.histogram("agent_span_duration_seconds", "Duration of agent requests, graph nodes, tool calls and LLM calls")
+        self.metrics.histogram("agent_tool_output_chars", "Size of tool outputs in characters", SIZE_BUCKETS)
+        self.metrics.histogram("agent_llm_prompt_tokens", "Prompt tokens per LLM call", SIZE_BUCKETS)
+        self.metrics.counter("agent_spans_total", "Finished spans by outcome")
+        self.metrics.counter("agent_llm_tokens_total", "LLM tokens by model and direction")
+        self.metrics.counter("agent_tool_timeouts_total", "Tool calls abandoned at their timeout")
+        self.metrics.counter("agent_llm_routing_total", "LLM router fallbacks, hedges and providers skipped, by provider")
+        self._tracer = _otel_tracer() if otel else None
+
+    @classmethod
+    def from_env(cls) -> "Telemetry":
+        return cls(
+            enabled=os.getenv("TELEMETRY_ENABLED", "True").lower() == "true",
+            otel=os.getenv("OTEL_ENABLED", "False").lower() == "true",
+            debug=os.getenv("AGENT_DEBUG", "False").lower() == "true",
+        )
+
+    @contextmanager
+    def trace(self, name: str) -> Iterator[Optional[Trace]]:
+        """Collect the spans of one request; its own duration is recorded as a `request` span."""
+        if not self.enabled:
+            yield None
+            return
+        trace = Trace(name)
+        token = _current_trace.set(trace)
+        try:
+            with self.span(name, kind="request"):
+                yield trace
+        finally:
+            _current_trace.reset(token)
+            if self.debug:
+                print(trace.format())
+
+    @contextmanager
+    def span(self, name: str, kind: str, **attributes) -> Iterator[Optional[Span]]:
+        if not self.enabled:
+            yield None
+            return
+        span = Span(name, kind, attributes)
+        otel_context = None
+        if self._tracer is not None:
+            otel_context = self._tracer.start_as_current_span(f"{kind} {name}", attributes=attributes)
+            span._otel = otel_context.__enter__()
+        error = None
+        try:
+            yield span
+        except BaseException as e:
+            # Client disconnects and timeouts cancel the request rather than fail it
+            span.status = "error" if isinstance(e, Exception) else "cancelled"
+            error = e if isinstance(e, Exception) else None
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.start
+            if otel_context is not None:
+                # Passing the exception on records it and marks the OpenTelemetry span as failed
+                otel_context.__exit__(type(error) if error else None, error, error.__traceback__ if error else None)
+            self.metrics.observe("agent_span_duration_seconds", span.duration, kind=kind, name=name)
+            self.metrics.inc("agent_spans_total", kind=kind, name=name, status=span.status)
+            trace = _current_trace.get()
+            if trace is not None:
+                trace.add(span)
+
+    def record_llm_usage(self, span: Optional[Span], model: str, message) -> None:
+        """Token counts of an AI message, from its usage_metadata when the provider reports it."""
+        usage = getattr(message, "usage_metadata", None) or {}
+        prompt, completion = usage.get("input_tokens"), usage.get("output_tokens")
+        if not self.enabled or prompt is None:
+            return
+        self.metrics.inc("agent_llm_tokens_total", prompt, model=model, type="prompt")
+        self.metrics.inc("agent_llm_tokens_total", completion or 0, model=model, type="completion")
+        self.metrics.observe("agent_llm_prompt_tokens", prompt, model=model)
+        if span is not None:
+            span.set("prompt_tokens", prompt)
+            span.set("completion_tokens", completion or 0)
+
+    def record_tool_output(self, span: Optional[Span], name: str, chars: int) -> None:
+        if not self.enabled:
+            return
+        self.metrics.observe("agent_tool_output_chars", chars, tool=name)
+        if span is not None:
+            span.set("output_chars", chars)
+
+    def record_tool_timeout(self, name: str) -> None:
+        if self.enabled:
+            self.metrics.inc("agent_tool_timeouts_total", tool=name)
+
+    def record_routing(self, provider: str, event: str) -> None:
+        if self.enabled:
+            self.metrics.inc("agent_llm_routing_total", provider=provider, event=event)
+
+    def debug_messages(self, messages: list) -> None:
+        """Print messages in full, only when AGENT_DEBUG is set; large tool outputs make this slow."""
+        if self.debug:
+            for m in messages:
+                m.pretty_print()
+
+
+def _otel_tracer():
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        print("OTEL_ENABLED is set but opentelemetry is not installed; spans are not exported.")
+        return None
+    if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        except ImportError:
+            print("OTEL_EXPORTER_OTLP_ENDPOINT needs opentelemetry-sdk and opentelemetry-exporter-otlp-proto-http.")
+        else:
+            provider = TracerProvider(resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "rae-agent")}))
+            provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            trace.set_tracer_provider(provider)
+    return trace.get_tracer("rae-agent")
+
+
+_telemetry: Optional[Telemetry] = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry() -> Telemetry:
+    """Process-wide telemetry, configured from the environment on first use."""
+    global _telemetry
+    if _telemetry is None:
+        with _telemetry_lock:
+            if _telemetry is None:
+                _telemetry = Telemetry.from_env()
+    return _telemetry
+
+
+def output_chars(output) -> int:
+    """Length of a tool result as the LLM will see it."""
+    content = getattr(output, "content", output)
+    return len(content) if isinstance(content, str) else len(str(content))
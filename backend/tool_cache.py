@@ -0,0 +1,210 @@
+"""TTL result cache for the network-bound agent tools"""
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Seconds a result stays fresh, per tool
+DEFAULT_TTLS = {
+    "wiki_search": 24 * 3600,
+    "arxiv_search": 24 * 3600,
+    "web_search": 3600,
+    "scrape_website": 3600,
+    "scrape_youtube": 7 * 24 * 3600,
+}
+
+
+class MemoryBackend:
+    """In-process LRU store; entries are lost on restart."""
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at, _ = item
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, tool_name: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl, tool_name)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self, tool_name: str = None) -> None:
+        with self._lock:
+            if tool_name is None:
+                self._data.clear()
+                return
+            for key in [k for k, item in self._data.items() if item[2] == tool_name]:
+                del self._data[key]
+
+
+class SQLiteBackend:
+    """On-disk store that survives restarts and is shared by every process using the same file."""
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS tool_results ("
+                "key TEXT PRIMARY KEY, tool TEXT NOT NULL, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS tool_results_access ON tool_results (last_access)")
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM tool_results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM tool_results WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE tool_results SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key: str, tool_name: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tool_results (key, tool, value, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, tool_name, json.dumps(value), now + ttl, now),
+            )
+            # Evict expired rows first, then the least recently used ones
+            self._conn.execute("DELETE FROM tool_results WHERE expires_at < ?", (now,))
+            self._conn.execute(
+                "DELETE FROM tool_results WHERE key IN (SELECT key FROM tool_results "
+                "ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self, tool_name: str = None) -> None:
+        with self._lock, self._conn:
+            if tool_name is None:
+                self._conn.execute("DELETE FROM tool_results")
+            else:
+                self._conn.execute("DELETE FROM tool_results WHERE tool = ?", (tool_name,))
+
+
+def _normalize(name: str, value: Any) -> Any:
+    if isinstance(value, str):
+        value = " ".join(value.split())
+        # Search queries are case-insensitive; URLs and paths are not
+        return value.lower() if name == "query" else value
+    if isinstance(value, dict):
+        return {k: _normalize(k, v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(name, v) for v in value]
+    return value
+
+
+def cache_key(tool_name: str, arguments: Dict[str, Any]) -> str:
+    """Stable hash of a tool name and its normalized arguments."""
+    normalized = {k: _normalize(k, v) for k, v in sorted(arguments.items())}
+    payload = json.dumps({"tool": tool_name, "args": normalized}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ToolResultCache:
+    """Caches tool outputs by tool name + arguments with a TTL per tool and hit/miss counters."""
+    def __init__(self, backend, ttls: Dict[str, float] = None):
+        self.backend = backend
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    def wrap_tool(self, tool):
+        """Return a copy of `tool` whose results are cached; tools without a TTL are returned as is."""
+        ttl = self.ttls.get(tool.name)
+        if not ttl or getattr(tool, "func", None) is None:
+            return tool
+
+        func = tool.func
+        signature = inspect.signature(func)
+
+        def lookup(arguments: dict):
+            key = cache_key(tool.name, arguments)
+            value = self.backend.get(key)
+            if value is not None:
+                self.hits[tool.name] = self.hits.get(tool.name, 0) + 1
+            else:
+                self.misses[tool.name] = self.misses.get(tool.name, 0) + 1
+            return key, value
+
+        def store(key: str, value) -> None:
+            # Errors raise and are never cached; empty results are not worth keeping either
+            if value:
+                self.backend.set(key, tool.name, value, ttl)
+
+        @functools.wraps(func)
+        def cached_func(*args, **kwargs):
+            key, value = lookup(signature.bind(*args, **kwargs).arguments)
+            if value is None:
+                value = func(*args, **kwargs)
+                store(key, value)
+            return value
+
+        update = {"func": cached_func}
+        coroutine = getattr(tool, "coroutine", None)
+        if coroutine is not None:
+            @functools.wraps(coroutine)
+            async def cached_coroutine(*args, **kwargs):
+                # Same key as the sync path, so both share cached results
+                # The backend may block on SQLite locks and disk, so keep it off the event loop
+                key, value = await asyncio.to_thread(lookup, signature.bind(*args, **kwargs).arguments)
+                if value is None:
+                    value = await coroutine(*args, **kwargs)
+                    await asyncio.to_thread(store, key, value)
+                return value
+
+            update["coroutine"] = cached_coroutine
+        return tool.model_copy(update=update)
+
+    def wrap_tools(self, tools: list) -> list:
+        return [self.wrap_tool(t) for t in tools]
+
+    @property
+    def stats(self) -> dict:
+        return {
+            name: {"hits": self.hits.get(name, 0), "misses": self.misses.get(name, 0)}
+            for name in sorted(set(self.hits) | set(self.misses))
+        }
+
+
+def build_tool_cache() -> Optional[ToolResultCache]:
+    """Create the tool result cache from environment configuration, or None when disabled."""
+    if os.getenv("TOOL_CACHE_ENABLED", "True").lower() != "true":
+        return None
+    max_entries = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "10000"))
+    if os.getenv("TOOL_CACHE_BACKEND", "sqlite").lower() == "memory":
+        backend = MemoryBackend(max_entries=max_entries)
+    else:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        backend = SQLiteBackend(os.getenv("TOOL_CACHE_PATH", os.path.join(script_dir, "tool_cache.db")), max_entries)
+    ttls = dict(DEFAULT_TTLS)
+    ttls.update(json.loads(os.getenv("TOOL_CACHE_TTLS", "{}")))
+    return ToolResultCache(backend, ttls)
@@ -0,0 +1,66 @@
+"""Background warm-up of the slow-to-initialize parts of the backend, and the readiness it gates"""
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+DEFAULT_STEPS = "agent"
+
+
+class Warmup:
+    """Runs named warm-up steps one after another on a daemon thread.
+
+    The server answers liveness checks as soon as it listens; it is ready once every step
+    has finished. A failed step is reported in `status` (and `failed`) but does not hold
+    readiness back, since whatever it was warming is still built on first use.
+    """
+    def __init__(self, steps: Dict[str, Callable[[], object]]):
+        self.steps = steps
+        self.status: Dict[str, dict] = {name: {"state": "pending"} for name in steps}
+        self.started_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._done = threading.Event()
+
+    @classmethod
+    def from_env(cls, available: Dict[str, Callable[[], object]]) -> "Warmup":
+        """Pick the steps named in BACKEND_WARMUP (comma separated, in order) from `available`."""
+        names = [name.strip() for name in os.getenv("BACKEND_WARMUP", DEFAULT_STEPS).split(",") if name.strip()]
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            raise ValueError(f"unknown BACKEND_WARMUP steps {unknown}; choose from {sorted(available)}")
+        return cls({name: available[name] for name in names})
+
+    def start(self) -> None:
+        if self._thread is not None or self._done.is_set():
+            return
+        self.started_at = time.perf_counter()
+        if not self.steps:
+            self._done.set()
+            return
+        self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        for name, step in self.steps.items():
+            self.status[name] = {"state": "running"}
+            started = time.perf_counter()
+            try:
+                step()
+                self.status[name] = {"state": "done", "seconds": round(time.perf_counter() - started, 3)}
+            except Exception as e:
+                self.status[name] = {"state": "failed", "error": str(e),
+                                     "seconds": round(time.perf_counter() - started, 3)}
+                print(f"Warm-up step {name} failed: {e}")
+        self._done.set()
+        print(f"Warm-up finished in {time.perf_counter() - self.started_at:.2f} s: {self.status}")
+
+    @property
+    def failed(self) -> bool:
+        return any(step["state"] == "failed" for step in self.status.values())
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
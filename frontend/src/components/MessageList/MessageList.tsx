@@ -42,7 +42,7 @@ export const MessageList = ({ messages, loading }: MessageListProps) => {
             isTyping={loading && index === messages.length - 1}
           />
         ))}
-      {loading && <LoadingMessage />}
+      {loading && messages[messages.length - 1]?.role !== 'assistant' && <LoadingMessage />}
       <div ref={messagesEndRef} />
     </div>
   );
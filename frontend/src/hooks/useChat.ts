@@ -5,6 +5,7 @@ export const useChat = () => {
   const [messages, setMessages] = useState<Message[]>([]);
   const [input, setInput] = useState('');
   const [loading, setLoading] = useState(false);
+  const [conversationId, setConversationId] = useState<string | null>(null);
 
   const sendMessage = async () => {
     if (!input.trim() || loading) return;
@@ -19,32 +20,73 @@ export const useChat = () => {
     setInput('');
     setLoading(true);
 
+    const assistantId = (Date.now() + 1).toString();
+    const updateAssistant = (content: string) => {
+      setMessages(prev => {
+        const existing = prev.find(m => m.id === assistantId);
+        if (!existing) {
+          const assistantMessage: Message = { id: assistantId, role: 'assistant', content };
+          return [...prev, assistantMessage];
+        }
+        return prev.map(m => (m.id === assistantId ? { ...m, content } : m));
+      });
+    };
+
     try {
-      const response = await fetch('http://localhost:8000/chat', {
+      const response = await fetch('http://localhost:8000/chat/stream', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
+        // The backend keeps the transcript; only send history if it has not seen this conversation
         body: JSON.stringify({ 
           message: input,
-          conversation_history: messages 
+          conversation_id: conversationId,
+          conversation_history: conversationId ? [] : messages
         })
       });
 
-      const data = await response.json();
-      
-      const assistantMessage: Message = {
-        id: (Date.now() + 1).toString(),
-        role: 'assistant',
-        content: data.response || 'Sorry, I encountered an error.'
-      };
+      if (!response.ok || !response.body) {
+        throw new Error(`Request failed with status ${response.status}`);
+      }
+
+      // Parse server-sent events and render tokens as they arrive
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let content = '';
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        const events = buffer.split('\n\n');
+        buffer = events.pop() ?? '';
+
+        for (const raw of events) {
+          const eventLine = raw.split('\n').find(line => line.startsWith('event: '));
+          const dataLine = raw.split('\n').find(line => line.startsWith('data: '));
+          if (!eventLine || !dataLine) continue;
+
+          const event = eventLine.slice('event: '.length);
+          const data = JSON.parse(dataLine.slice('data: '.length));
 
-      setMessages(prev => [...prev, assistantMessage]);
+          if (event === 'token') {
+            content += data.content;
+            updateAssistant(content);
+          } else if (event === 'done') {
+            setConversationId(data.conversation_id);
+            content = data.response || content || 'Sorry, I encountered an error.';
+            updateAssistant(content);
+          } else if (event === 'error') {
+            // Only set when the server kept the conversation; otherwise the history is sent again
+            if (data.conversation_id) setConversationId(data.conversation_id);
+            updateAssistant(content || 'Sorry, I encountered an error.');
+          }
+        }
+      }
     } catch (error) {
       console.error('Error:', error);
-      setMessages(prev => [...prev, {
-        id: (Date.now() + 1).toString(),
-        role: 'assistant',
-        content: 'Error: Could not connect to server. Make sure the backend is running on port 8000.'
-      }]);
+      updateAssistant('Error: Could not connect to server. Make sure the backend is running on port 8000.');
     } finally {
       setLoading(false);
     }
@@ -1,6 +1,9 @@
+import json
 import os
 import subprocess
 import time
+import urllib.error
+import urllib.request
 
 print("Current working directory:", os.getcwd())
 
@@ -8,8 +11,43 @@ print("Current working directory:", os.getcwd())
 print("\n------------------------------Rae Backend------------------------------")
 backend_process = subprocess.Popen(['python', 'backend/backend.py'])
 
-# Optional: wait a bit to let backend initialize
-time.sleep(3)  # tweak if needed
+
+def read_json(response) -> dict:
+    try:
+        return json.loads(response.read() or b"{}")
+    except ValueError:
+        return {}  # not the backend's answer, e.g. another service on the port or a proxy page
+
+
+def wait_for_backend(process, timeout):
+    """Poll the backend's readiness endpoint until its warm-up finishes, it fails, or the timeout runs out."""
+    url = f"http://localhost:{os.getenv('BACKEND_PORT', '8000')}/health/ready"
+    started = time.perf_counter()
+    live = False
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            print(f"Backend exited with code {process.returncode} during startup.")
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                print(f"Backend ready after {time.perf_counter() - started:.1f} s.")
+                body = read_json(response)
+                if body.get("status") == "degraded":
+                    print(f"Some warm-up steps failed; they load on first use instead: {body.get('warmup')}")
+                return True
+        except urllib.error.HTTPError:
+            # 503: serving, still warming up
+            if not live:
+                live = True
+                print(f"Backend live after {time.perf_counter() - started:.1f} s, warming up...")
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            pass  # not listening yet
+        time.sleep(0.2)
+    print(f"Backend not ready after {timeout:.0f} s, continuing anyway.")
+    return False
+
+
+wait_for_backend(backend_process, float(os.getenv("BACKEND_STARTUP_TIMEOUT", "120")))
 
 # Change directory to frontend
 os.chdir('frontend')